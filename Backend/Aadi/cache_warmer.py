@@ -0,0 +1,216 @@
+"""
+Cache Warm-up
+=============
+Re-warms the journal fetcher after a deploy or restart, so the first
+users of popular subject areas do not pay for a cold pipeline.
+
+For the top subjects (configured ones first, then the most requested
+ones from the leaderboard store's request history) the warmer rebuilds
+both subject leaderboards, then probes the keywords live requests queued
+for it (see fetch_journals.LIVE_KEYWORD_PROBES).
+
+The warmer runs on the API server's in-process fetcher, while live
+requests run fetch_journals.py in a fresh process each (unless
+SPECULATIVE_SEARCH is set). What it warms for them is what crosses that
+process boundary:
+- the keyword selectivity table and the negative query cache, merged into
+  their shared files,
+- the local journal store and works index pages, through the OS page
+  cache, and
+- the subject leaderboards the API server answers provisional results
+  from.
+The fetcher's last-good response memory only serves in-process searches
+(SPECULATIVE_SEARCH and the leaderboards).
+
+Warm-up runs at low priority:
+- Every OpenAlex request it makes is charged to a shared "warmup" bucket
+  (WARMUP_REQUESTS_PER_MINUTE across all workers), taken before the
+  request queues for an upstream slot.
+- It waits while live traffic is busy. When traffic picks up mid-subject,
+  the subject is abandoned through its cancellation scope and retried
+  later.
+
+Usage:
+    python cache_warmer.py ["<subject>" ...]
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from cancellation import RequestCancelled, cancellation_scope
+from leaderboards import LeaderboardRefresher, LeaderboardStore
+from rate_limiter import charge_to
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """
+    Warm the fetcher's caches for the most popular subjects, yielding to live traffic.
+    """
+    
+    BUDGET_BUCKET = "warmup"
+    BUSY_POLL_INTERVAL = 0.5  # Seconds between live-traffic checks
+    MAX_ATTEMPTS = 3          # Tries per subject (preempted or failed)
+    MAX_KEYWORD_PROBES = 200  # Queued keywords probed per warm-up
+    
+    def __init__(self, fetcher, store: LeaderboardStore, subjects: Optional[List[str]] = None,
+                 top_n: int = 20, requests_per_minute: float = 30,
+                 is_busy: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            fetcher: OpenAlexJournalFetcher to warm
+            store: Leaderboard store (request history and leaderboards to rebuild)
+            subjects: Subjects always warmed first (e.g. from WARMUP_SUBJECTS)
+            top_n: Number of subjects warmed
+            requests_per_minute: OpenAlex request budget for warm-up (all workers)
+            is_busy: Returns True while live traffic should have the upstreams to itself
+        """
+        self.fetcher = fetcher
+        self.refresher = LeaderboardRefresher(fetcher, store, subjects, max_subjects=top_n)
+        self.is_busy = is_busy or (lambda: False)
+        fetcher.rate_limiter.add_bucket(self.BUDGET_BUCKET, requests_per_minute / 60, max(1.0, requests_per_minute / 6))
+        self._stop = threading.Event()
+        self._preempt = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {
+            "state": "idle", "subjects": 0, "warmed": 0, "preempted": 0, "failed": 0, "keywords": 0,
+            "started_at": None, "finished_at": None,
+        }
+    
+    def _wait_until_idle(self):
+        while self.is_busy() and not self._stop.is_set():
+            self._stop.wait(self.BUSY_POLL_INTERVAL)
+    
+    def _watch_traffic(self):
+        """Preempt the running subject as soon as live traffic is busy."""
+        while self.stats["state"] == "running" and not self._stop.is_set():
+            if self.is_busy():
+                self._preempt.set()
+            self._stop.wait(self.BUSY_POLL_INTERVAL)
+    
+    def warm_subject(self, subject: str) -> bool:
+        """
+        Warm one subject under the warm-up budget.
+        
+        Returns:
+            True if its leaderboards were rebuilt
+        
+        Raises:
+            RequestCancelled: if live traffic preempted it
+        """
+        with cancellation_scope(self._preempt), charge_to(self.BUDGET_BUCKET):
+            return self.refresher.refresh_subject(subject)
+    
+    def warm_keywords(self) -> int:
+        """
+        Probe the keywords live requests queued, under the warm-up budget.
+        
+        Returns:
+            Number of keywords probed
+        
+        Raises:
+            RequestCancelled: if live traffic preempted it (probes done so far are kept)
+        """
+        table = self.fetcher.selectivity
+        table.sync()  # Keywords are queued by the per-request fetcher processes
+        pending = table.pending_keywords(self.MAX_KEYWORD_PROBES)
+        try:
+            with cancellation_scope(self._preempt), charge_to(self.BUDGET_BUCKET):
+                table.refresh(pending, lambda keyword: self.fetcher.probe_query_count({}, keyword))
+        finally:
+            table.save()
+        return len(pending) - len(table.stale_keywords(pending))
+    
+    def warm_all(self) -> int:
+        """
+        Warm every scheduled subject, most important first.
+        
+        Returns:
+            Number of subjects warmed
+        """
+        queue = [(subject, 0) for subject in self.refresher.subjects_to_refresh()]
+        self.stats.update(state="running", subjects=len(queue), started_at=time.time(), finished_at=None)
+        watcher = threading.Thread(target=self._watch_traffic, name="cache-warmup-watch", daemon=True)
+        watcher.start()
+        warmed = 0
+        try:
+            while queue and not self._stop.is_set():
+                subject, attempts = queue.pop(0)
+                self._wait_until_idle()
+                self._preempt.clear()
+                try:
+                    if self.warm_subject(subject):
+                        warmed += 1
+                        self.stats["warmed"] = warmed
+                        continue
+                    self.stats["failed"] += 1
+                except RequestCancelled:
+                    self.stats["preempted"] += 1
+                    if attempts + 1 < self.MAX_ATTEMPTS:
+                        queue.append((subject, attempts + 1))
+                        logger.info(f"Cache warm-up of '{subject}' yielded to live traffic, retrying later")
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.warning(f"Cache warm-up failed for '{subject}': {e}")
+            
+            if not self._stop.is_set():
+                self._wait_until_idle()
+                self._preempt.clear()
+                try:
+                    self.stats["keywords"] = self.warm_keywords()
+                except RequestCancelled:
+                    self.stats["preempted"] += 1
+                    logger.info("Keyword probes yielded to live traffic, the rest stay queued")
+                except Exception as e:
+                    logger.warning(f"Queued keyword probes failed: {e}")
+        finally:
+            self.stats.update(state="done", finished_at=time.time())
+            self.refresher.store.save()
+        logger.info(f"Cache warm-up finished: {warmed}/{self.stats['subjects']} subjects in "
+                    f"{self.stats['finished_at'] - self.stats['started_at']:.0f}s")
+        return warmed
+    
+    def start(self, delay_seconds: float = 0):
+        """Warm up once on a daemon thread after delay_seconds."""
+        def run():
+            if not self._stop.wait(delay_seconds):
+                self.warm_all()
+        
+        self._thread = threading.Thread(target=run, name="cache-warmup", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop warming after the current subject."""
+        self._stop.set()
+    
+    def status(self) -> Dict[str, Any]:
+        """Progress of the warm-up."""
+        return dict(self.stats)
+
+
+def main():
+    """Command-line entry point: warm the given (or most requested) subjects."""
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print(__doc__)
+        return
+    
+    from fetch_journals import OpenAlexJournalFetcher
+    fetcher = OpenAlexJournalFetcher()
+    store = LeaderboardStore(subject_index=fetcher.subject_index)
+    configured = [s.strip() for s in os.getenv("WARMUP_SUBJECTS", "").split(",") if s.strip()]
+    warmer = CacheWarmer(
+        fetcher, store, sys.argv[1:] or configured,
+        top_n=int(os.getenv("WARMUP_TOP_N", "20")),
+        requests_per_minute=float(os.getenv("WARMUP_REQUESTS_PER_MINUTE", "30")),
+    )
+    warmer.warm_all()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
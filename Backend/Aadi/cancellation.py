@@ -0,0 +1,80 @@
+"""
+Request Cancellation
+====================
+Cooperative cancellation for pipeline runs. The API server gives each
+pipeline a threading.Event and sets it when the client disconnects; code
+running for that pipeline checks it before every upstream call and while
+waiting (rate-limit buckets, concurrency slots, retry backoff, hedged
+calls), so an abandoned request stops spending quota and worker slots
+instead of running to completion.
+
+The active events live in a context variable, so deep helpers such as
+make_request_with_retry see them without extra parameters. Scopes nest
+(a speculative search inside a request is cancelled by either event), and
+work handed to other threads keeps them when submitted through
+submit_in_context.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+_active_events: contextvars.ContextVar[Tuple[threading.Event, ...]] = contextvars.ContextVar(
+    "active_cancel_events", default=()
+)
+
+
+class RequestCancelled(Exception):
+    """The request this work belongs to was cancelled (e.g. the client disconnected)."""
+
+
+@contextmanager
+def cancellation_scope(event: Optional[threading.Event]) -> Iterator[None]:
+    """Make work in this block cancellable by event (no-op for None)."""
+    if event is None:
+        yield
+        return
+    token = _active_events.set(_active_events.get() + (event,))
+    try:
+        yield
+    finally:
+        _active_events.reset(token)
+
+
+def is_cancelled() -> bool:
+    """Whether any enclosing cancellation scope has been cancelled."""
+    return any(event.is_set() for event in _active_events.get())
+
+
+def raise_if_cancelled():
+    """Raise RequestCancelled if the current work was cancelled."""
+    if is_cancelled():
+        raise RequestCancelled("Request cancelled")
+
+
+def sleep(seconds: float, step: float = 0.1):
+    """
+    time.sleep that wakes up early when the current work is cancelled.
+    
+    Raises:
+        RequestCancelled: if cancelled before or during the sleep
+    """
+    events = _active_events.get()
+    if not events:
+        time.sleep(seconds)
+        return
+    remaining = seconds
+    while remaining > 0:
+        raise_if_cancelled()
+        wait = min(step, remaining)
+        events[-1].wait(wait)
+        remaining -= wait
+    raise_if_cancelled()
+
+
+def submit_in_context(executor: Executor, fn, *args, **kwargs) -> Future:
+    """executor.submit that carries the caller's cancellation scopes into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
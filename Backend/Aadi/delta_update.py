@@ -0,0 +1,305 @@
+"""
+Incremental Updates for the Local OpenAlex Data
+===============================================
+Applies only the records changed since the last sync instead of rebuilding
+the local journal store and works shards from scratch.
+
+Changed records come from either:
+- snapshot partitions newer than the store's last updated_date
+  (data/<entity>/updated_date=YYYY-MM-DD/part_*.gz), or
+- saved API pages fetched with filter=from_updated_date:... (JSON files
+  with a "results" list), replayed from a local directory.
+
+Sources are patched into a new journal store version that is published
+with an atomic CURRENT swap (see journal_store.py), so readers in
+api_server.py keep serving from the old version until they switch. New
+works partitions are ingested as additional shards; shards are read
+oldest first, so the newest copy of a work wins.
+
+Indexes derived from the works shards (works index, journal profiles,
+co-publication graph) and the subject index are rebuilt after a delta
+that changes their input, if they have been built before. Each input
+keeps its own watermark (shards/derived_watermarks.json), so a sync with
+no new works or subject partitions rebuilds nothing. Indexes are built
+into a staging directory and swapped in, so readers never open a
+half-written index; a running API server picks them up on restart, while
+fetcher subprocesses open the new ones on their next request.
+
+Usage:
+    python delta_update.py <snapshot_root> [--store DIR] [--shards DIR] [--workers N]
+    python delta_update.py --pages <pages_dir> [--store DIR]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ingest_snapshot import SnapshotIngester, discover_snapshot_partitions, project_source
+from journal_graph import JournalGraph
+from journal_profiles import JournalProfileIndex
+from journal_store import (
+    JournalStore, discover_partitions, iter_jsonl_records, publish_version, resolve_store_dir, version_dir
+)
+from state_files import write_json_atomic
+from subject_index import SubjectIndex, default_index_file, iter_snapshot_subjects
+from works_index import SHARDS_FILE, ShardedWorksIndex, WorksIndex
+
+logger = logging.getLogger(__name__)
+
+
+def partition_date(partition: Path) -> str:
+    """updated_date of a snapshot partition ('updated_date=2025-01-31' -> '2025-01-31')."""
+    return partition.parent.name.split("=", 1)[-1]
+
+
+def swap_in(target: Path, build: Callable[[Path], Any]):
+    """
+    Build an index into a staging path next to target, then move it into place.
+    
+    Args:
+        target: Index directory or file to replace
+        build: Writes the new index to the path it is given
+    """
+    staging = target.with_name(f"{target.name}.building")
+    retired = target.with_name(f"{target.name}.old")
+    for leftover in (staging, retired):
+        if leftover.is_dir():
+            shutil.rmtree(leftover, ignore_errors=True)
+        elif leftover.exists():
+            leftover.unlink()
+    
+    build(staging)
+    if target.is_dir():
+        os.replace(target, retired)  # Open memory maps keep reading the retired files
+        os.replace(staging, target)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.replace(staging, target)
+
+
+class DeltaUpdater:
+    """
+    Patch the versioned journal store with changed records.
+    """
+    
+    def __init__(self, store_root: Path, shards_dir: Optional[Path] = None, workers: Optional[int] = None,
+                 derived: Optional[Dict[str, Path]] = None):
+        """
+        Args:
+            store_root: Versioned journal store root (must already hold a built store)
+            shards_dir: Directory of projected snapshot shards (default: <store_root>/shards)
+            workers: Ingest worker processes (default: CPU count)
+            derived: Locations of the derived indexes ('works_index', 'profiles',
+                'graph', 'subject_index'; default: default_derived_paths())
+        """
+        self.store_root = Path(store_root)
+        self.shards_dir = Path(shards_dir) if shards_dir else self.store_root / "shards"
+        self.workers = workers
+        self.derived = derived if derived is not None else default_derived_paths()
+    
+    def current_store(self) -> JournalStore:
+        """Open the current store version."""
+        return JournalStore(resolve_store_dir(self.store_root))
+    
+    def apply(self, records: Iterator[Dict[str, Any]]) -> int:
+        """
+        Patch changed source records into a new store version and publish it.
+        
+        Args:
+            records: Changed source records
+        
+        Returns:
+            New data version number
+        """
+        store = self.current_store()
+        version = store.data_version + 1
+        new_dir = version_dir(self.store_root, version)
+        store.patch(records, new_dir, version)
+        publish_version(self.store_root, new_dir)
+        return version
+    
+    def sync_snapshot(self, snapshot_root: Path) -> Optional[int]:
+        """
+        Apply snapshot partitions newer than the store's last sync.
+        
+        Args:
+            snapshot_root: Snapshot directory containing data/<entity>/
+        
+        Returns:
+            New data version, or None if nothing changed
+        """
+        last_sync = self.current_store().meta.get("last_updated_date", "")[:10]
+        watermarks = self.derived_watermarks()
+        ingester = SnapshotIngester(snapshot_root, self.shards_dir, self.workers)
+        
+        # Works only need their new partitions ingested as extra shards. The
+        # works watermark moves only after the rebuild, so shards ingested by a
+        # run whose rebuild did not finish are still picked up.
+        works_sync = watermarks.get("works", last_sync)
+        works_partitions = [
+            partition for partition in discover_snapshot_partitions(snapshot_root, "works")
+            if partition_date(partition) > works_sync
+        ]
+        new_shards = ingester.ingest("works", works_partitions)
+        if works_partitions:
+            logger.info(f"works: {len(new_shards)} new shards since {works_sync or 'the initial build'}")
+            self.rebuild_works_indexes()
+            self.advance_watermark("works", works_partitions)
+        
+        subjects_sync = watermarks.get("subjects", last_sync)
+        subject_partitions = [
+            partition for entity in ("domains", "fields", "subfields", "topics")
+            for partition in discover_snapshot_partitions(snapshot_root, entity)
+            if partition_date(partition) > subjects_sync
+        ]
+        if subject_partitions:
+            self.rebuild_subject_index(snapshot_root)
+            self.advance_watermark("subjects", subject_partitions)
+        
+        partitions = [
+            partition for partition in discover_snapshot_partitions(snapshot_root, "sources")
+            if partition_date(partition) > last_sync
+        ]
+        if not partitions:
+            logger.info(f"Journal store is up to date (last sync {last_sync or 'never'})")
+            return None
+        
+        logger.info(f"Applying {len(partitions)} source partitions newer than {last_sync or 'the initial build'}")
+        ingester.ingest("sources", partitions)
+        shards = [ingester.shard_path("sources", partition) for partition in partitions]
+        return self.apply(iter_jsonl_records(shards))
+    
+    @property
+    def watermark_file(self) -> Path:
+        """Newest snapshot partition date each derived index was rebuilt from."""
+        return self.shards_dir / "derived_watermarks.json"
+    
+    def derived_watermarks(self) -> Dict[str, str]:
+        """Watermarks per derived input ('works', 'subjects'); empty before the first sync."""
+        try:
+            with open(self.watermark_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def advance_watermark(self, name: str, partitions: List[Path]):
+        """
+        Record that a derived input has been rebuilt from the given partitions.
+        
+        Args:
+            name: Watermark name ('works' or 'subjects')
+            partitions: Snapshot partitions the rebuild covered
+        """
+        watermarks = self.derived_watermarks()
+        watermarks[name] = max([watermarks.get(name, "")] + [partition_date(p) for p in partitions])
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.watermark_file, watermarks, indent=2)
+    
+    def sync_pages(self, pages_dir: Path) -> Optional[int]:
+        """
+        Replay saved from_updated_date API pages newer than the last sync.
+        
+        Args:
+            pages_dir: Directory of JSON pages ({"results": [...]}), applied in name order
+        
+        Returns:
+            New data version, or None if nothing changed
+        """
+        last_sync = self.current_store().meta.get("last_updated_date", "")
+        
+        def changed_records() -> Iterator[Dict[str, Any]]:
+            for page in sorted(Path(pages_dir).glob("*.json")):
+                with open(page, "r", encoding="utf-8") as f:
+                    results = json.load(f).get("results", [])
+                for record in results:
+                    if (record.get("updated_date") or "") > last_sync:
+                        projected = project_source(record)
+                        if projected:
+                            yield projected
+        
+        records: List[Dict[str, Any]] = list(changed_records())
+        if not records:
+            logger.info("No source records changed since the last sync")
+            return None
+        return self.apply(records)
+    
+    def rebuild_works_indexes(self):
+        """Rebuild the existing indexes derived from the works shards."""
+        shards = discover_partitions(self.shards_dir / "works")
+        
+        works_index = self.derived.get("works_index")
+        if works_index and ((works_index / "meta.json").exists() or (works_index / SHARDS_FILE).exists()):
+            num_shards = 1
+            if (works_index / SHARDS_FILE).exists():
+                with open(works_index / SHARDS_FILE, "r", encoding="utf-8") as f:
+                    num_shards = len(json.load(f)["shards"])
+            logger.info(f"Rebuilding works index ({num_shards} shard(s)) from {len(shards)} works shards")
+            if num_shards > 1:
+                swap_in(works_index, lambda staging: ShardedWorksIndex.build(
+                    iter_jsonl_records(shards), staging, num_shards))
+            else:
+                swap_in(works_index, lambda staging: WorksIndex.build(iter_jsonl_records(shards), staging))
+        
+        profiles = self.derived.get("profiles")
+        if profiles and (profiles / "meta.json").exists():
+            logger.info("Rebuilding journal profile index")
+            swap_in(profiles, lambda staging: JournalProfileIndex.build(
+                iter_jsonl_records(list(reversed(shards))), staging))
+        
+        graph = self.derived.get("graph")
+        if graph and (graph / "meta.json").exists():
+            logger.info("Rebuilding journal co-publication graph")
+            swap_in(graph, lambda staging: JournalGraph.build(shards, staging))
+    
+    def rebuild_subject_index(self, snapshot_root: Path):
+        """Rebuild the subject index from the snapshot's topic hierarchy, if one exists."""
+        index_file = self.derived.get("subject_index")
+        if not index_file or not index_file.exists():
+            return
+        logger.info("Rebuilding subject index")
+        entries = list(iter_snapshot_subjects(snapshot_root))
+        swap_in(index_file, lambda staging: SubjectIndex.save(entries, staging))
+
+
+def default_derived_paths() -> Dict[str, Path]:
+    """Derived index locations from the same settings the fetcher opens them with."""
+    here = Path(__file__).parent
+    return {
+        "works_index": Path(os.getenv("WORKS_INDEX_DIR", here / "works_index")),
+        "profiles": Path(os.getenv("JOURNAL_PROFILES_DIR", here / "journal_profiles")),
+        "graph": Path(os.getenv("JOURNAL_GRAPH_DIR", here / "journal_graph")),
+        "subject_index": default_index_file(),
+    }
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Apply incremental OpenAlex updates to the local store")
+    parser.add_argument("snapshot_root", nargs="?", help="Snapshot directory containing data/<entity>/")
+    parser.add_argument("--pages", help="Directory of saved from_updated_date API pages")
+    parser.add_argument("--store", default=os.getenv("JOURNAL_STORE_DIR", str(Path(__file__).parent / "journal_store")),
+                        help="Journal store root (default: JOURNAL_STORE_DIR or ./journal_store)")
+    parser.add_argument("--shards", default=None, help="Projected shards directory")
+    parser.add_argument("--workers", type=int, default=None, help="Ingest worker processes")
+    args = parser.parse_args()
+    
+    if not args.snapshot_root and not args.pages:
+        parser.error("give a snapshot directory or --pages")
+    
+    updater = DeltaUpdater(Path(args.store), Path(args.shards) if args.shards else None, args.workers)
+    if args.pages:
+        version = updater.sync_pages(Path(args.pages))
+    else:
+        version = updater.sync_snapshot(Path(args.snapshot_root))
+    
+    if version is not None:
+        logger.info(f"Journal store data version is now {version}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
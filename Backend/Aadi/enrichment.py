@@ -0,0 +1,258 @@
+"""
+Journal Enrichment Table
+========================
+APC and DOAJ data for journals, loaded from CSV dumps on disk and joined
+by ISSN while formatting results, because OpenAlex often has no apc_usd
+or is_in_doaj for a source.
+
+Supported dumps (detected from the CSV header):
+- DOAJ journal CSV (https://doaj.org/csv): every listed journal is in DOAJ;
+  "APC amount" gives the charge ("1500 USD"), "APC" = No means no charge.
+- APC tables with an ISSN column and an amount column (e.g. OpenAPC:
+  issn / issn_l / issn_print / issn_electronic + euro). Per-article rows
+  are aggregated to the median charge per journal.
+
+Rows are stored in a sorted array of ISSN keys (journal_store.issn_key)
+with parallel value columns, so a lookup is a binary search.
+
+Usage:
+    python enrichment.py <csv_dir> <ISSN>
+"""
+
+import csv
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from journal_store import issn_key
+
+logger = logging.getLogger(__name__)
+
+# Approximate conversion rates to USD for APC amounts
+USD_RATES = {"USD": 1.0, "EUR": 1.08, "GBP": 1.27, "CHF": 1.13, "CAD": 0.73, "AUD": 0.66, "JPY": 0.0067, "INR": 0.012}
+AMOUNT_PATTERN = re.compile(r"(\d[\d,.]*)\s*([A-Z]{3})")
+# A dump that fails with one of these is skipped; the other dumps still load
+DUMP_ERRORS = (OSError, csv.Error, UnicodeDecodeError, ValueError, IndexError)
+
+
+def to_usd(amount: float, currency: str) -> Optional[float]:
+    rate = USD_RATES.get(currency.upper())
+    return round(amount * rate, 2) if rate is not None else None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Parse a DOAJ-style amount ("1500 USD", "2000 EUR; 1800 GBP") into USD.
+    
+    Returns:
+        The first convertible amount in USD, or None
+    """
+    for value, currency in AMOUNT_PATTERN.findall(text or ""):
+        try:
+            usd = to_usd(float(value.replace(",", "")), currency)
+        except ValueError:
+            continue
+        if usd is not None:
+            return usd
+    return None
+
+
+def find_columns(header: List[str], *needles: str) -> List[int]:
+    """Indexes of columns whose lowercased name contains any of the needles."""
+    return [i for i, name in enumerate(header) if any(needle in name.lower() for needle in needles)]
+
+
+def is_doaj_dump(header: List[str]) -> bool:
+    """DOAJ journal CSVs link every row to its DOAJ page."""
+    return bool(find_columns(header, "url in doaj"))
+
+
+def read_header(path: Path) -> List[str]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def complete_rows(reader, columns: List[int]):
+    """Rows long enough to hold every used column (blank and truncated lines are skipped)."""
+    width = max(columns) + 1
+    return (record for record in reader if len(record) >= width)
+
+
+class EnrichmentTable:
+    """
+    Sorted-array ISSN table of APC and DOAJ data.
+    """
+    
+    def __init__(self, rows: Dict[int, Dict[str, Any]]):
+        """
+        Args:
+            rows: ISSN key -> {'apc_usd', 'in_doaj', 'license'}
+        """
+        keys = sorted(rows)
+        self.keys = np.array(keys, dtype=np.int64)
+        self.apc_usd = np.array(
+            [rows[k]["apc_usd"] if rows[k].get("apc_usd") is not None else np.nan for k in keys], dtype=np.float32
+        )
+        self.in_doaj = np.array([bool(rows[k].get("in_doaj")) for k in keys], dtype=np.uint8)
+        licenses = sorted({rows[k].get("license") or "" for k in keys})
+        self.licenses = licenses
+        license_ids = {name: i for i, name in enumerate(licenses)}
+        self.license = np.array([license_ids[rows[k].get("license") or ""] for k in keys], dtype=np.int16)
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def _row(self, issn: str) -> Optional[int]:
+        key = issn_key(issn or "")
+        if not key or not len(self.keys):
+            return None
+        row = int(np.searchsorted(self.keys, key))
+        return row if row < len(self.keys) and self.keys[row] == key else None
+    
+    def lookup(self, issn_l: Optional[str], issns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Enrichment data for a journal, trying ISSN-L first, then each ISSN.
+        
+        Returns:
+            {'apc_usd', 'is_in_doaj', 'license'} or None if no ISSN is known
+        """
+        for issn in [issn_l] + list(issns or []):
+            row = self._row(issn) if issn else None
+            if row is not None:
+                apc = float(self.apc_usd[row])
+                return {
+                    "apc_usd": None if np.isnan(apc) else apc,
+                    "is_in_doaj": bool(self.in_doaj[row]),
+                    "license": self.licenses[self.license[row]] or None,
+                }
+        return None
+    
+    @staticmethod
+    def read_csv(path: Path, rows: Dict[int, Dict[str, Any]]):
+        """
+        Merge one DOAJ or APC CSV dump into rows.
+        
+        Rows too short for the columns in use (e.g. a trailing empty line)
+        are skipped.
+        
+        Args:
+            path: CSV file
+            rows: ISSN key -> row values, updated in place
+        """
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            issn_columns = find_columns(header, "issn")
+            if not issn_columns:
+                logger.warning(f"Skipping {path.name}: no ISSN column")
+                return
+            
+            if is_doaj_dump(header):
+                amount_columns = find_columns(header, "apc amount")
+                has_apc_columns = [i for i in find_columns(header, "apc") if header[i].strip().lower() == "apc"]
+                license_columns = find_columns(header, "journal license")
+                used = issn_columns + amount_columns[:1] + has_apc_columns[:1] + license_columns[:1]
+                for record in complete_rows(reader, used):
+                    apc = parse_amount(record[amount_columns[0]]) if amount_columns else None
+                    if apc is None and has_apc_columns and record[has_apc_columns[0]].strip().lower() == "no":
+                        apc = 0.0
+                    license_name = record[license_columns[0]].strip() if license_columns else ""
+                    for column in issn_columns:
+                        key = issn_key(record[column])
+                        if key:
+                            previous = rows.get(key, {}).get("apc_usd")
+                            rows[key] = {
+                                "apc_usd": apc if apc is not None else previous,
+                                "in_doaj": True,
+                                "license": license_name,
+                            }
+                return
+            
+            # APC table: median charge per ISSN, in USD
+            usd_columns = find_columns(header, "apc_usd", "usd")
+            euro_columns = find_columns(header, "euro")
+            amounts: Dict[int, List[float]] = {}
+            if usd_columns:
+                amount_column, currency = usd_columns[0], "USD"
+            elif euro_columns:
+                amount_column, currency = euro_columns[0], "EUR"
+            else:
+                logger.warning(f"Skipping {path.name}: no APC amount column")
+                return
+            for record in complete_rows(reader, issn_columns + [amount_column]):
+                value = record[amount_column]
+                try:
+                    usd = to_usd(float(value), currency)
+                except ValueError:
+                    continue
+                for column in issn_columns:
+                    key = issn_key(record[column])
+                    if key:
+                        amounts.setdefault(key, []).append(usd)
+            
+            for key, values in amounts.items():
+                row = rows.setdefault(key, {"apc_usd": None, "in_doaj": False, "license": ""})
+                row["apc_usd"] = round(median(values), 2)
+    
+    @classmethod
+    def load(cls, csv_dir: Path) -> "EnrichmentTable":
+        """
+        Load every *.csv dump in a directory (DOAJ dumps applied last, so their amounts win).
+        
+        A dump that cannot be read is logged and skipped.
+        """
+        rows: Dict[int, Dict[str, Any]] = {}
+        headers: Dict[Path, List[str]] = {}
+        for path in Path(csv_dir).glob("*.csv"):
+            try:
+                headers[path] = read_header(path)
+            except DUMP_ERRORS as e:
+                logger.warning(f"Skipping enrichment dump {path.name}: {e}")
+        for path in sorted(headers, key=lambda path: (is_doaj_dump(headers[path]), path.name)):
+            try:
+                cls.read_csv(path, rows)
+            except DUMP_ERRORS as e:
+                logger.warning(f"Skipping enrichment dump {path.name}: {e}")
+        return cls(rows)
+
+
+def open_default_enrichment() -> Optional[EnrichmentTable]:
+    """
+    Load dumps from ENRICHMENT_DIR (default: ./enrichment) if the directory exists.
+    
+    Returns:
+        EnrichmentTable, or None when there are no dumps
+    """
+    csv_dir = Path(os.getenv("ENRICHMENT_DIR", Path(__file__).parent / "enrichment"))
+    if not csv_dir.is_dir():
+        return None
+    try:
+        table = EnrichmentTable.load(csv_dir)
+    except DUMP_ERRORS as e:
+        logger.warning(f"Could not load enrichment dumps from {csv_dir}: {e}")
+        return None
+    if not len(table):
+        return None
+    logger.info(f"Loaded enrichment table ({len(table)} ISSNs)")
+    return table
+
+
+def main():
+    """Command-line entry point: look up an ISSN."""
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return
+    table = EnrichmentTable.load(Path(sys.argv[1]))
+    print(f"{len(table)} ISSNs loaded")
+    print(table.lookup(sys.argv[2]) or f"{sys.argv[2]} not found")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -8,15 +8,39 @@ Author: Aadi (Optimized)
 Date: October 3, 2025
 """
 
+import argparse
 import requests
 import json
 import os
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 import logging
 from pathlib import Path
 
+from keyword_selectivity import KeywordSelectivity
+from negative_cache import NegativeQueryCache
+from subject_index import open_default_subject_index
+from rate_limiter import backoff_delay, parse_retry_after, shared_limiter
+from stale_cache import StaleResponseCache
+from upstream_guard import CircuitOpenError, QueueTimeoutError, get_guard
+from cancellation import RequestCancelled, cancellation_scope, submit_in_context, sleep as cancellable_sleep
+
+try:
+    from journal_store import open_default_store
+    from works_index import open_default_works_index
+    from journal_profiles import open_default_profile_index
+    from journal_graph import open_default_graph
+    from enrichment import open_default_enrichment
+except ImportError:  # numpy not installed: works and journal details always come from the API
+    open_default_store = None
+    open_default_works_index = None
+    open_default_profile_index = None
+    open_default_graph = None
+    open_default_enrichment = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -44,12 +68,31 @@ class OpenAlexJournalFetcher:
     SOURCES_BASE_URL = "https://api.openalex.org/sources"
     REQUEST_TIMEOUT = 30  # seconds
     MAX_RETRIES = 3
-    RETRY_DELAY = 2  # seconds
+    RETRY_DELAY = 2  # seconds, base of the jittered exponential backoff
+    STALE_CACHE_SIZE = 512  # Last good responses kept (on disk, shared) as fallbacks while OpenAlex is failing
     
     # Search Configuration
     TOP_WORKS_COUNT = 30  # Papers to analyze for journal extraction
     TOP_JOURNALS_COUNT = 5  # Final journals to return
     
+    # Query Relaxation Configuration
+    MIN_WORKS_FOR_SHAPE = 10  # A query shape must match at least this many works
+    RELAXED_KEYWORD_COUNT = 3  # Keywords kept in the "top-3 AND" shape
+    CANDIDATE_KEYWORD_COUNT = 10  # Keywords considered by the selectivity ranking
+    LIVE_KEYWORD_PROBES = 2  # New keywords probed per request; the rest are queued for warm-up
+    
+    # Fan-out Configuration (one works query per keyword facet)
+    FACET_SIZE = 3  # Keywords ANDed together in each facet query
+    MAX_FACETS = 5  # Upper bound on parallel facet queries
+    RRF_K = 60  # Reciprocal rank fusion damping constant
+    MAX_FANOUT_JOURNALS = 50  # Fused candidates kept for the details lookup
+    MAX_PROFILE_JOURNALS = 20  # Candidates from the journal profile index
+    
+    # Related-journal Configuration (co-publication graph)
+    NEIGHBOUR_SEEDS = 3  # Top candidates whose neighbours pad the candidate list
+    NEIGHBOURS_PER_SEED = 5
+    DIVERSITY_PENALTY = 0.2  # Score discount per unit similarity to an already chosen journal
+    
     # Scoring Weights (must sum to 100)
     WEIGHT_RELEVANCE = 40  # How often journal appears in top works
     WEIGHT_H_INDEX = 30    # Journal impact factor
@@ -60,6 +103,18 @@ class OpenAlexJournalFetcher:
         """Initialize the fetcher with API credentials from environment."""
         self.api_key = os.getenv('OPENALEX_API_KEY', '')
         self.email = os.getenv('OPENALEX_EMAIL', '')
+        self.fanout_mode = os.getenv('OPENALEX_FANOUT_MODE', '').lower() in ('1', 'true', 'yes')
+        self.selectivity = KeywordSelectivity()
+        self.negative_cache = NegativeQueryCache()
+        self.journal_store = open_default_store() if open_default_store else None
+        self.works_index = open_default_works_index() if open_default_works_index else None
+        self.profile_index = open_default_profile_index() if open_default_profile_index else None
+        self.subject_index = open_default_subject_index()
+        self.journal_graph = open_default_graph() if open_default_graph else None
+        self.enrichment = open_default_enrichment() if open_default_enrichment else None
+        self.rate_limiter = shared_limiter()
+        self.openalex_guard = get_guard('openalex')
+        self.stale_responses = StaleResponseCache(max_entries=self.STALE_CACHE_SIZE)
         
         if not self.email:
             logger.warning("OPENALEX_EMAIL not set. Using default rate limits.")
@@ -153,32 +208,159 @@ class OpenAlexJournalFetcher:
         Args:
             criteria: Search criteria with subjectArea and keywords
         
+        Returns:
+            Search query string
+        """
+        # Use AND between 5 keywords for stricter, more relevant results
+        # This ensures journals MUST match the subject AND core keywords
+        keywords = self.select_query_keywords(criteria)
+        query = self._compose_query(self._query_subject(criteria), keywords, 'AND')
+        logger.debug(f"Built search query: {query[:100]}...")
+        return query
+    
+    def select_query_keywords(self, criteria: Dict[str, Any]) -> List[str]:
+        """
+        Choose the keywords to AND into the search query.
+        
+        Ranks the first CANDIDATE_KEYWORD_COUNT keywords by selectivity using
+        the local document-frequency table, preferring discriminative terms
+        over generic ones ("artificial intelligence", "automation"). Falls
+        back to Gemini's first 5 keywords when the table lacks the data.
+        
+        Args:
+            criteria: Search criteria with subjectArea and keywords
+        
+        Returns:
+            Up to 5 keywords
+        """
+        candidates = criteria.get('keywords', [])[:self.CANDIDATE_KEYWORD_COUNT]
+        subject = criteria.get('subjectArea', '')
+        subject_count = self.selectivity.document_frequency(subject) if subject else None
+        
+        return self.selectivity.select_keywords(
+            candidates,
+            max_keywords=5,
+            min_expected=self.TOP_WORKS_COUNT,
+            base_count=subject_count
+        )
+    
+    def subject_filter(self, criteria: Dict[str, Any]) -> Optional[str]:
+        """
+        OpenAlex topic/field filter for the subject area (see subject_index.py).
+        
+        Only used for API searches: the local works index has no topic data.
+        
+        Args:
+            criteria: Search criteria with subjectArea
+        
+        Returns:
+            Filter expression, or None if the subject did not resolve confidently
+        """
+        subject = criteria.get('subjectArea', '')
+        if not subject or self.subject_index is None or self.works_index is not None:
+            return None
+        return self.subject_index.works_filter(subject)
+    
+    def _query_subject(self, criteria: Dict[str, Any]) -> str:
+        """Subject text for the search string ('' when it is applied as a filter)."""
+        return '' if self.subject_filter(criteria) else criteria.get('subjectArea', '')
+    
+    def _probe_keyword(self, keyword: str):
+        """Record a keyword's work count in the selectivity table."""
+        count = self.probe_query_count({}, keyword)
+        if count is not None:
+            self.selectivity.record(keyword, count)
+    
+    def _compose_query(self, subject: str, keywords: List[str], operator: str) -> str:
+        """
+        Join the subject area and keywords into an OpenAlex search string.
+        
+        Args:
+            subject: Subject area (required term, may be empty)
+            keywords: Keywords to combine
+            operator: Boolean operator between keywords ('AND' or 'OR')
+        
         Returns:
             Search query string
         """
         query_parts = []
         
         # Add subject area as REQUIRED with AND logic (not just optional)
-        if criteria.get('subjectArea'):
-            subject = criteria['subjectArea']
-            query_parts.append(f"{subject} AND")
-        
-        # Add top 10 keywords with AND between them for stricter matching
-        if criteria.get('keywords'):
-            keywords = criteria['keywords'][:10]
-            # Use AND between first 5 keywords for stricter, more relevant results
-            # This ensures journals MUST match the subject AND core keywords
-            keywords_query = ' AND '.join(keywords[:5])
+        if subject:
+            query_parts.append(f"{subject} AND" if keywords else subject)
+        
+        if keywords:
+            keywords_query = f' {operator} '.join(keywords)
             query_parts.append(f"({keywords_query})")
         
-        query = ' '.join(query_parts)
-        logger.debug(f"Built search query: {query[:100]}...")
-        return query
+        return ' '.join(query_parts)
+    
+    def build_query_ladder(self, criteria: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        Build the ordered relaxation ladder of query shapes, strictest first.
+        
+        Shapes:
+        1. strict: subject AND all 5 selected keywords
+        2. top3: subject AND the 3 most selective keywords
+        3. any_keyword: subject AND any of the selected keywords
+        4. subject_only: subject area alone
+        
+        When the subject area resolves confidently to OpenAlex topics (see
+        subject_filter), it is applied as a filter and left out of the
+        search text, so subject_only becomes the filter with no search.
+        
+        Args:
+            criteria: Search criteria with subjectArea and keywords
+        
+        Returns:
+            List of (shape_name, query) tuples with duplicate queries removed
+        """
+        subject = self._query_subject(criteria)
+        keywords = self.select_query_keywords(criteria)
+        
+        candidates = [
+            ('strict', self.build_search_query(criteria)),
+            ('top3', self._compose_query(subject, keywords[:self.RELAXED_KEYWORD_COUNT], 'AND')),
+            ('any_keyword', self._compose_query(subject, keywords, 'OR')),
+            ('subject_only', self._compose_query(subject, [], 'AND')),
+        ]
+        
+        # With a subject filter, the subject-only shape is the filter alone (empty search)
+        has_filter = bool(self.subject_filter(criteria))
+        ladder = []
+        seen = set()
+        for shape, query in candidates:
+            if (query or has_filter) and query not in seen:
+                ladder.append((shape, query))
+                seen.add(query)
+        return ladder
+    
+    def _get_once(self, url: str, params: Dict[str, Any]) -> requests.Response:
+        """One GET. Server errors other than 503 raise, so the circuit breaker counts them."""
+        response = requests.get(
+            url, 
+            params=params, 
+            timeout=self.REQUEST_TIMEOUT
+        )
+        if response.status_code >= 500 and response.status_code != 503:
+            response.raise_for_status()
+        return response
     
     def make_request_with_retry(self, url: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Make API request with retry logic and error handling.
         
+        Every attempt takes a token from the shared 'openalex' bucket, so all
+        workers on the host share one request budget. 429/503 responses
+        pause the bucket for Retry-After; other failures back off with
+        jittered exponential delays.
+        
+        Attempts are hedged at the observed p95 latency and go through the
+        OpenAlex circuit breaker and adaptive concurrency limit. While the circuit is open, or when every
+        attempt failed, the last good response to the same request is
+        returned if there is one (kept on disk and shared by every fetcher
+        process, see stale_cache.py).
+        
         Args:
             url: API endpoint URL
             params: Request parameters
@@ -186,48 +368,85 @@ class OpenAlexJournalFetcher:
         Returns:
             Response JSON data or None if all retries failed
         """
+        cache_key = url + '?' + json.dumps(params, sort_keys=True)
+        params = dict(params)
+        if self.api_key:
+            params['api_key'] = self.api_key
+        if self.email:
+            params.setdefault('mailto', self.email)
+        
         for attempt in range(self.MAX_RETRIES):
+            last_attempt = attempt == self.MAX_RETRIES - 1
             try:
-                response = requests.get(
-                    url, 
-                    params=params, 
-                    timeout=self.REQUEST_TIMEOUT
+                self.rate_limiter.acquire_charged()  # Background budget (cache warm-up), before queueing for a slot
+                response = self.openalex_guard.call(
+                    lambda: self._get_once(url, params),
+                    timeout=self.REQUEST_TIMEOUT,
+                    prepare=lambda: self.rate_limiter.take('openalex', self.REQUEST_TIMEOUT)
                 )
+                if response.status_code in (429, 503):
+                    self.openalex_guard.concurrency.backoff()
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    delay = retry_after if retry_after is not None else backoff_delay(attempt, self.RETRY_DELAY)
+                    logger.warning(f"OpenAlex returned {response.status_code} "
+                                   f"(attempt {attempt + 1}/{self.MAX_RETRIES}), retrying in {delay:.1f}s")
+                    if last_attempt:
+                        break
+                    self.rate_limiter.block('openalex', delay)
+                    continue
                 response.raise_for_status()
-                return response.json()
+                data = response.json()
+                self.stale_responses.put(cache_key, data)
+                return data
                 
-            except requests.exceptions.Timeout:
+            except CircuitOpenError:
+                logger.warning("OpenAlex circuit open, skipping request")
+                break
+                
+            except QueueTimeoutError as e:
+                logger.warning(f"OpenAlex overloaded, skipping request: {e}")
+                break
+                
+            except (requests.exceptions.Timeout, TimeoutError):
                 logger.warning(f"Request timeout (attempt {attempt + 1}/{self.MAX_RETRIES})")
-                if attempt < self.MAX_RETRIES - 1:
-                    time.sleep(self.RETRY_DELAY)
+                if not last_attempt:
+                    cancellable_sleep(backoff_delay(attempt, self.RETRY_DELAY))
                     
             except requests.exceptions.RequestException as e:
                 logger.error(f"Request failed (attempt {attempt + 1}/{self.MAX_RETRIES}): {e}")
-                if attempt < self.MAX_RETRIES - 1:
-                    time.sleep(self.RETRY_DELAY)
+                if not last_attempt:
+                    cancellable_sleep(backoff_delay(attempt, self.RETRY_DELAY))
         
-        return None
+        stale = self.stale_responses.get(cache_key)
+        if stale is not None:
+            logger.info("Using the last good response for this request")
+        return stale
     
-    def fetch_top_works(self, criteria: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _build_works_params(self, criteria: Dict[str, Any], search_query: str,
+                            per_page: int) -> Dict[str, Any]:
         """
-        Fetch top research works matching the search criteria.
+        Build /works request parameters for a search query.
         
         Args:
-            criteria: Search criteria
+            criteria: Search criteria (used for the open access filter)
+            search_query: Full-text search string
+            per_page: Number of works to request
         
         Returns:
-            List of top works (papers)
+            Request parameters dictionary
         """
-        logger.info(f"Fetching top {self.TOP_WORKS_COUNT} research works...")
-        
-        search_query = self.build_search_query(criteria)
-        
         params = {
-            'search': search_query,
-            'per_page': self.TOP_WORKS_COUNT,
+            'per_page': per_page,
             'sort': 'cited_by_count:desc',
             'filter': 'primary_location.source.type:journal'
         }
+        if search_query:
+            params['search'] = search_query
+        
+        # Filter on the resolved subject instead of searching for its text
+        subject_filter = self.subject_filter(criteria)
+        if subject_filter:
+            params['filter'] += f',{subject_filter}'
         
         # Add email for polite pool (better rate limits)
         if self.email:
@@ -238,16 +457,336 @@ class OpenAlexJournalFetcher:
             # Extend existing filter
             params['filter'] += ',is_oa:true'
         
-        data = self.make_request_with_retry(self.WORKS_BASE_URL, params)
+        return params
+    
+    def search_works(self, criteria: Dict[str, Any], search_query: str,
+                     per_page: int) -> Optional[Dict[str, Any]]:
+        """
+        Run a works search against the local index if one is loaded, else the API.
+        
+        Args:
+            criteria: Search criteria
+            search_query: Full-text search string
+            per_page: Number of works to return
+        
+        Returns:
+            Response data ({'meta': {'count'}, 'results'}) or None if the request failed
+        """
+        if self.works_index is not None:
+            works, count = self.works_index.search(
+                search_query, top_n=per_page, open_access_only=criteria.get('openAccess') == 1
+            )
+            return {'meta': {'count': count}, 'results': works}
+        
+        params = self._build_works_params(criteria, search_query, per_page)
+        return self.make_request_with_retry(self.WORKS_BASE_URL, params)
+    
+    def probe_query_count(self, criteria: Dict[str, Any], search_query: str) -> Optional[int]:
+        """
+        Count works matching a query with a cheap per_page=1 request.
+        
+        Args:
+            criteria: Search criteria
+            search_query: Full-text search string
+        
+        Returns:
+            Total matching works, or None if the probe failed
+        """
+        if self.works_index is not None:
+            return self.works_index.count(search_query, open_access_only=criteria.get('openAccess') == 1)
+        
+        data = self.search_works(criteria, search_query, per_page=1)
+        if not data:
+            return None
+        return data.get('meta', {}).get('count', len(data.get('results', [])))
+    
+    def fetch_top_works(self, criteria: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Fetch top research works matching the search criteria.
+        
+        Walks the query relaxation ladder (see build_query_ladder). The strict
+        shape is fetched in full while the relaxed shapes are probed
+        concurrently with per_page=1 count requests, so a strict query that
+        matches enough works returns at once, without waiting for the probes.
+        Otherwise the strictest shape with at least MIN_WORKS_FOR_SHAPE works
+        is fetched.
+        
+        Up to LIVE_KEYWORD_PROBES keywords missing from the selectivity table
+        are probed in the same parallel round so later queries can rank them;
+        the others are queued for the cache warm-up. Shapes that came back
+        with too few works go into the negative cache, and later requests
+        start from the first shape not known to be too narrow.
+        
+        With a local works index (WORKS_INDEX_DIR) every search and probe is
+        answered from the index, so no request reaches OpenAlex.
+        
+        Args:
+            criteria: Search criteria
+        
+        Returns:
+            List of top works (papers)
+        """
+        logger.info(f"Fetching top {self.TOP_WORKS_COUNT} research works...")
+        
+        ladder = [
+            (shape, query, self._build_works_params(criteria, query, self.TOP_WORKS_COUNT))
+            for shape, query in self.build_query_ladder(criteria)
+        ]
+        
+        # Skip shapes recently seen to return too few works (always keep the broadest)
+        viable = [rung for rung in ladder if not self.negative_cache.is_negative(rung[2])] or ladder[-1:]
+        if len(viable) < len(ladder):
+            logger.info(f"Skipping {len(ladder) - len(viable)} query shape(s) known to return too few works")
+        
+        strict_shape, strict_query, strict_params = viable[0]
+        relaxed = viable[1:]
+        
+        unprobed = self.selectivity.stale_keywords(
+            [criteria.get('subjectArea', '')] + criteria.get('keywords', [])[:self.CANDIDATE_KEYWORD_COUNT]
+        )
+        unprobed = [keyword for keyword in unprobed if keyword]
+        if self.works_index is None and len(unprobed) > self.LIVE_KEYWORD_PROBES:
+            # Each probe is an OpenAlex request: keep most of them off the request path
+            self.selectivity.queue_probes(unprobed[self.LIVE_KEYWORD_PROBES:])
+            unprobed = unprobed[:self.LIVE_KEYWORD_PROBES]
+        
+        executor = ThreadPoolExecutor(max_workers=len(viable) + len(unprobed))
+        try:
+            strict_future = submit_in_context(
+                executor, self.search_works, criteria, strict_query, self.TOP_WORKS_COUNT
+            )
+            keyword_futures = [submit_in_context(executor, self._probe_keyword, keyword) for keyword in unprobed]
+            probe_futures = [
+                (shape, query, params, submit_in_context(executor, self.probe_query_count, criteria, query))
+                for shape, query, params in relaxed
+            ]
+            
+            data = strict_future.result()
+            strict_works = data.get('results', []) if data else []
+            strict_count = data.get('meta', {}).get('count', len(strict_works)) if data else 0
+            if len(strict_works) >= self.MIN_WORKS_FOR_SHAPE or not relaxed:
+                # Enough works: do not wait for the relaxed probes
+                counts = [(shape, query, params, future.result()) for shape, query, params, future in probe_futures
+                          if future.done() and not future.cancelled() and future.exception() is None]
+            else:
+                counts = [(shape, query, params, future.result()) for shape, query, params, future in probe_futures]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Keyword probes still running save their counts when they finish
+        self.selectivity.save()
+        for future in keyword_futures:
+            if not future.done():
+                future.add_done_callback(lambda _: self.selectivity.save())
+        
+        # Remember shapes that came back too narrow so later requests skip them (finished probes only)
+        if data and strict_count < self.MIN_WORKS_FOR_SHAPE:
+            self.negative_cache.record(strict_params, strict_count)
+        for shape, query, params, count in counts:
+            if count is not None and count < self.MIN_WORKS_FOR_SHAPE:
+                self.negative_cache.record(params, count)
+        self.negative_cache.save()
+        
+        if len(strict_works) >= self.MIN_WORKS_FOR_SHAPE or not relaxed:
+            if data:
+                logger.info(f"Query shape '{strict_shape}' matched {strict_count} works")
+                logger.info(f"Retrieved {len(strict_works)} research works")
+            else:
+                logger.error("Failed to fetch works from OpenAlex")
+            return strict_works
+        
+        logger.info(f"Query shape '{strict_shape}' matched only {strict_count} works, relaxing...")
+        
+        # Strictest relaxed shape with enough works, else the one with the most works
+        chosen = next(
+            ((shape, query, count) for shape, query, params, count in counts
+             if count is not None and count >= self.MIN_WORKS_FOR_SHAPE),
+            None
+        )
+        if chosen is None:
+            chosen = max(((shape, query, count) for shape, query, params, count in counts),
+                         key=lambda c: c[2] or 0)
+        
+        shape, query, count = chosen
+        if not count or count <= len(strict_works):
+            logger.warning("No relaxed query shape matched more works")
+            return strict_works
+        
+        logger.info(f"Using query shape '{shape}' ({count} matching works)")
+        data = self.search_works(criteria, query, self.TOP_WORKS_COUNT)
         
         if not data:
             logger.error("Failed to fetch works from OpenAlex")
-            return []
+            return strict_works
         
         works = data.get('results', [])
         logger.info(f"Retrieved {len(works)} research works")
         return works
     
+    def group_keyword_facets(self, keywords: List[str]) -> List[List[str]]:
+        """
+        Group keywords into facets for fan-out search.
+        
+        Gemini returns keywords roughly ordered by relevance with related
+        terms next to each other, so consecutive runs of FACET_SIZE keywords
+        form one facet each.
+        
+        Args:
+            keywords: Refined keyword list
+        
+        Returns:
+            List of keyword facets (at most MAX_FACETS)
+        """
+        facets = [
+            keywords[i:i + self.FACET_SIZE]
+            for i in range(0, len(keywords), self.FACET_SIZE)
+        ]
+        return facets[:self.MAX_FACETS]
+    
+    def fetch_facet_works(self, criteria: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """
+        Issue one works query per keyword facet in parallel.
+        
+        Args:
+            criteria: Search criteria
+        
+        Returns:
+            One list of works per facet (empty for failed facets)
+        """
+        subject = self._query_subject(criteria)
+        facets = self.group_keyword_facets(criteria.get('keywords', []))
+        if not facets:
+            return []
+        
+        logger.info(f"Fan-out search over {len(facets)} keyword facets...")
+        
+        def fetch_facet(facet: List[str]) -> List[Dict[str, Any]]:
+            query = self._compose_query(subject, facet, 'AND')
+            params = self._build_works_params(criteria, query, self.TOP_WORKS_COUNT)
+            if self.negative_cache.is_negative(params):
+                return []
+            data = self.search_works(criteria, query, self.TOP_WORKS_COUNT)
+            if not data:
+                return []
+            works = data.get('results', [])
+            if not works:
+                self.negative_cache.record(params, 0)
+            return works
+        
+        with ThreadPoolExecutor(max_workers=len(facets)) as executor:
+            futures = [submit_in_context(executor, fetch_facet, facet) for facet in facets]
+            result_sets = [future.result() for future in futures]
+        self.negative_cache.save()
+        
+        for facet, works in zip(facets, result_sets):
+            logger.debug(f"Facet {facet}: {len(works)} works")
+        return result_sets
+    
+    def dedupe_works(self, result_sets: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Merge per-facet result sets, dropping works already seen by id or DOI.
+        
+        Args:
+            result_sets: Lists of works, one per facet
+        
+        Returns:
+            Unique works in first-seen order
+        """
+        unique_works = []
+        seen = set()
+        
+        for works in result_sets:
+            for work in works:
+                keys = {k for k in (work.get('id'), work.get('doi')) if k}
+                if keys & seen:
+                    continue
+                seen.update(keys)
+                unique_works.append(work)
+        
+        logger.info(f"Deduplicated {sum(map(len, result_sets))} works to {len(unique_works)}")
+        return unique_works
+    
+    def journal_ranking(self, works: List[Dict[str, Any]]) -> List[str]:
+        """
+        Rank the journals of a result set by how many of its works they published.
+        
+        Ties keep first-appearance order, i.e. are broken by the best-cited work.
+        
+        Args:
+            works: List of works
+        
+        Returns:
+            Journal IDs, best first
+        """
+        counts = {}
+        for work in works:
+            source = (work.get('primary_location') or {}).get('source') or {}
+            journal_id = source.get('id')
+            if journal_id:
+                counts[journal_id] = counts.get(journal_id, 0) + 1
+        
+        # sorted() is stable, so equal counts keep first-appearance order
+        return sorted(counts, key=lambda jid: counts[jid], reverse=True)
+    
+    def fuse_rankings(self, rankings: List[List[str]]) -> Dict[str, float]:
+        """
+        Fuse journal rankings with reciprocal rank fusion.
+        
+        Each journal scores sum(1 / (RRF_K + rank)) over the rankings it
+        appears in, normalized so that ranking first everywhere scores 1.0.
+        
+        Args:
+            rankings: Lists of journal IDs, best first
+        
+        Returns:
+            Dictionary mapping journal_id -> fused score (0-1), best first
+        """
+        fused = {}
+        answered = [ranking for ranking in rankings if ranking]
+        if not answered:
+            return fused
+        max_fused = len(answered) / (self.RRF_K + 1)
+        
+        for ranking in answered:
+            for rank, journal_id in enumerate(ranking, 1):
+                fused[journal_id] = fused.get(journal_id, 0.0) + 1.0 / (self.RRF_K + rank)
+        
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        return {journal_id: score / max_fused for journal_id, score in ranked}
+    
+    def fuse_journal_rankings(self, result_sets: List[List[Dict[str, Any]]]) -> Dict[str, float]:
+        """
+        Fuse per-facet journal rankings with reciprocal rank fusion.
+        
+        Args:
+            result_sets: Lists of works, one per facet
+        
+        Returns:
+            Dictionary mapping journal_id -> fused score (0-1), best first
+        """
+        return self.fuse_rankings([self.journal_ranking(works) for works in result_sets])
+    
+    def match_journal_profiles(self, criteria: Dict[str, Any]) -> List[str]:
+        """
+        Journals whose topic profiles are closest to the refined keywords.
+        
+        This candidate generator does not depend on which works the keyword
+        search surfaces (see journal_profiles.py).
+        
+        Args:
+            criteria: Search criteria
+        
+        Returns:
+            Journal IDs, best first (empty without a profile index)
+        """
+        if self.profile_index is None:
+            return []
+        matches = self.profile_index.search(
+            criteria.get('keywords', []), criteria.get('subjectArea', ''), top_k=self.MAX_PROFILE_JOURNALS
+        )
+        logger.info(f"Journal profile index matched {len(matches)} journals")
+        return [journal_id for journal_id, _ in matches]
+    
     def extract_journal_ids(self, works: List[Dict[str, Any]]) -> Dict[str, int]:
         """
         Extract unique journal IDs and count their occurrences.
@@ -261,7 +800,7 @@ class OpenAlexJournalFetcher:
         journal_counts = {}
         
         for work in works:
-            source = work.get('primary_location', {}).get('source', {})
+            source = (work.get('primary_location') or {}).get('source') or {}
             journal_id = source.get('id')
             
             if journal_id:
@@ -272,7 +811,11 @@ class OpenAlexJournalFetcher:
     
     def fetch_journal_details(self, journal_ids: List[str]) -> List[Dict[str, Any]]:
         """
-        Fetch detailed information for journals from OpenAlex /sources endpoint.
+        Fetch detailed information for journals.
+        
+        Journals found in the local journal store (see journal_store.py) are
+        read from it; only the remaining IDs go to the OpenAlex /sources
+        endpoint.
         
         Args:
             journal_ids: List of OpenAlex journal IDs
@@ -284,6 +827,20 @@ class OpenAlexJournalFetcher:
             logger.warning("No journal IDs to fetch")
             return []
         
+        journals = []
+        if self.journal_store is not None:
+            missing_ids = []
+            for journal_id in journal_ids:
+                journal = self.journal_store.get(journal_id)
+                if journal:
+                    journals.append(journal)
+                else:
+                    missing_ids.append(journal_id)
+            logger.info(f"Journal store had details for {len(journals)}/{len(journal_ids)} journals")
+            journal_ids = missing_ids
+            if not journal_ids:
+                return journals
+        
         logger.info(f"Fetching details for {len(journal_ids)} journals...")
         
         # Extract OpenAlex ID (remove URL prefix)
@@ -304,11 +861,11 @@ class OpenAlexJournalFetcher:
         
         if not data:
             logger.error("Failed to fetch journal details from OpenAlex")
-            return []
+            return journals
         
-        journals = data.get('results', [])
-        logger.info(f"Retrieved details for {len(journals)} journals")
-        return journals
+        fetched = data.get('results', [])
+        logger.info(f"Retrieved details for {len(fetched)} journals")
+        return journals + fetched
     
     def calculate_journal_score(self, journal: Dict[str, Any], relevance_count: int) -> float:
         """
@@ -358,13 +915,21 @@ class OpenAlexJournalFetcher:
         return round(score, 2)
     
     def rank_journals(self, journals: List[Dict[str, Any]], 
-                     journal_counts: Dict[str, int]) -> List[Dict[str, Any]]:
+                     journal_counts: Dict[str, int],
+                     fused_scores: Optional[Dict[str, float]] = None,
+                     neighbour_scores: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
         """
         Rank journals by calculated score.
         
         Args:
             journals: List of journal details
             journal_counts: Dictionary of journal_id -> occurrence_count
+            fused_scores: Optional journal_id -> normalized fusion score from
+                fan-out search and/or the journal profile index (see
+                fuse_rankings). When given, it replaces the occurrence count
+                in the relevance component.
+            neighbour_scores: Optional journal_id -> relevance inherited from
+                related candidates (see expand_with_neighbours)
         
         Returns:
             Sorted list of journals with scores
@@ -376,8 +941,18 @@ class OpenAlexJournalFetcher:
             journal_id = journal.get('id')
             relevance_count = journal_counts.get(journal_id, 0)
             
+            if fused_scores:
+                fused = fused_scores.get(journal_id, 0.0)
+                effective_relevance = fused * 10  # 10 appearances = full points
+                journal['rrf_score'] = round(fused, 4)
+            else:
+                effective_relevance = relevance_count
+            
+            if neighbour_scores and journal_id in neighbour_scores:
+                effective_relevance = max(effective_relevance, neighbour_scores[journal_id])
+            
             # Calculate score
-            score = self.calculate_journal_score(journal, relevance_count)
+            score = self.calculate_journal_score(journal, effective_relevance)
             
             # Add metadata
             journal['relevance_count'] = relevance_count
@@ -394,6 +969,9 @@ class OpenAlexJournalFetcher:
         """
         Format journal data for final output.
         
+        Missing APC and DOAJ data is filled in from the local enrichment
+        table (DOAJ/APC dumps joined by ISSN, see enrichment.py).
+        
         Args:
             journal: Raw journal data from OpenAlex
             rank: Journal ranking (1, 2, 3, etc.)
@@ -401,6 +979,11 @@ class OpenAlexJournalFetcher:
         Returns:
             Formatted journal dictionary
         """
+        extra = {}
+        if self.enrichment is not None:
+            extra = self.enrichment.lookup(journal.get('issn_l'), journal.get('issn')) or {}
+        apc_usd = journal.get('apc_usd')
+        
         return {
             "rank": rank,
             "journal_name": journal.get('display_name', 'N/A'),
@@ -413,8 +996,9 @@ class OpenAlexJournalFetcher:
             "cited_by_count": journal.get('cited_by_count', 0),
             "works_count": journal.get('works_count', 0),
             "is_open_access": journal.get('is_oa', False),
-            "is_in_doaj": journal.get('is_in_doaj', False),
-            "apc_usd": journal.get('apc_usd'),
+            "is_in_doaj": bool(journal.get('is_in_doaj') or extra.get('is_in_doaj')),
+            "apc_usd": apc_usd if apc_usd is not None else extra.get('apc_usd'),
+            "license": extra.get('license'),
             "societies": journal.get('societies', []),
             "relevance_count": journal.get('relevance_count', 0),
             "calculated_score": journal.get('calculated_score', 0.0),
@@ -476,6 +1060,10 @@ class OpenAlexJournalFetcher:
         1. Fetch top works (papers) matching criteria
         2. Extract journals and rank by quality score
         
+        With OPENALEX_FANOUT_MODE enabled, step 1 runs one query per keyword
+        facet in parallel and journal relevance comes from reciprocal rank
+        fusion of the per-facet rankings.
+        
         Args:
             criteria: Search criteria from Vraj's refined output
         
@@ -490,32 +1078,197 @@ class OpenAlexJournalFetcher:
                 logger.error(f"  - {error}")
             return []
         
-        # Step 1: Fetch top research works
-        works = self.fetch_top_works(criteria)
-        if not works:
-            logger.error("No works found")
+        candidates = self.gather_candidates(criteria)
+        if not candidates:
             return []
         
+        return self.rank_candidates(candidates)
+    
+    def gather_candidates(self, criteria: Dict[str, Any],
+                          cancel_event: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run the network half of the search: fetch works and journal details.
+        
+        Does not validate criteria, so it can also run on provisional
+        criteria (e.g. speculative searches on raw input).
+        
+        Args:
+            criteria: Search criteria
+            cancel_event: Optional event; when set, in-flight waits and the
+                next upstream call are abandoned and None is returned
+        
+        Returns:
+            Dictionary with journals, journal_counts, fused_scores and neighbour_scores,
+            or None if nothing was found or the search was cancelled
+        
+        Raises:
+            RequestCancelled: if an enclosing cancellation scope (the request) was cancelled
+        """
+        try:
+            with cancellation_scope(cancel_event):
+                return self._gather_candidates(criteria, cancel_event)
+        except RequestCancelled:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Search cancelled")
+                return None
+            raise
+    
+    def _gather_candidates(self, criteria: Dict[str, Any],
+                           cancel_event: Optional[threading.Event]) -> Optional[Dict[str, Any]]:
+        # Step 1: Fetch top research works (one query, or one per facet)
+        fused_scores = None
+        if self.fanout_mode and criteria.get('keywords'):
+            result_sets = self.fetch_facet_works(criteria)
+            works = self.dedupe_works(result_sets)
+            fused_scores = self.fuse_journal_rankings(result_sets)
+        else:
+            result_sets = None
+            works = self.fetch_top_works(criteria)
+        
+        # Second candidate generator: journal topic profiles, fused with the works ranking(s)
+        profile_ranking = self.match_journal_profiles(criteria)
+        if profile_ranking:
+            rankings = [self.journal_ranking(works) for works in (result_sets or [works])]
+            fused_scores = self.fuse_rankings(rankings + [profile_ranking])
+        
+        if not works and not profile_ranking:
+            logger.error("No works found")
+            return None
+        
         # Step 2: Extract unique journal IDs
         journal_counts = self.extract_journal_ids(works)
-        if not journal_counts:
+        if not journal_counts and not fused_scores:
             logger.error("No journals extracted from works")
-            return []
+            return None
+        
+        if cancel_event is not None and cancel_event.is_set():
+            logger.info("Search cancelled before fetching journal details")
+            return None
         
         # Step 3: Fetch journal details
-        journal_ids = list(journal_counts.keys())
+        if fused_scores:
+            journal_ids = list(fused_scores.keys())[:self.MAX_FANOUT_JOURNALS]
+        else:
+            journal_ids = list(journal_counts.keys())
         journals = self.fetch_journal_details(journal_ids)
         if not journals:
             logger.error("Failed to fetch journal details")
-            return []
+            return None
         
-        # Step 4: Rank journals by score
-        ranked_journals = self.rank_journals(journals, journal_counts)
+        # Pad thin candidate lists with related journals
+        neighbour_scores = self.expand_with_neighbours(journals, journal_counts, fused_scores)
         
-        # Step 5: Format top N journals
+        return {
+            "journals": journals,
+            "journal_counts": journal_counts,
+            "fused_scores": fused_scores,
+            "neighbour_scores": neighbour_scores
+        }
+    
+    def expand_with_neighbours(self, journals: List[Dict[str, Any]], journal_counts: Dict[str, int],
+                               fused_scores: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Pad a thin candidate list with related journals from the co-publication graph.
+        
+        When the top works concentrate in a few journals, the neighbours of
+        the NEIGHBOUR_SEEDS most relevant candidates are added (details are
+        fetched like any other candidate). Each neighbour inherits the
+        seed's relevance scaled by their similarity.
+        
+        Args:
+            journals: Candidate journal details (extended in place)
+            journal_counts: Dictionary of journal_id -> occurrence_count
+            fused_scores: Optional fused relevance scores
+        
+        Returns:
+            Dictionary mapping added journal_id -> inherited relevance
+        """
+        if self.journal_graph is None or len(journals) >= 2 * self.TOP_JOURNALS_COUNT:
+            return {}
+        
+        def relevance(journal_id: str) -> float:
+            if fused_scores:
+                return fused_scores.get(journal_id, 0.0) * 10
+            return journal_counts.get(journal_id, 0)
+        
+        present = {journal.get('id') for journal in journals}
+        seeds = sorted(present, key=relevance, reverse=True)[:self.NEIGHBOUR_SEEDS]
+        
+        neighbour_scores = {}
+        related_to = {}
+        for seed in seeds:
+            for neighbour, similarity in self.journal_graph.neighbours(seed, self.NEIGHBOURS_PER_SEED):
+                if neighbour in present:
+                    continue
+                inherited = relevance(seed) * similarity
+                if inherited > neighbour_scores.get(neighbour, 0.0):
+                    neighbour_scores[neighbour] = inherited
+                    related_to[neighbour] = seed
+        if not neighbour_scores:
+            return {}
+        
+        logger.info(f"Adding {len(neighbour_scores)} related journals from the co-publication graph")
+        for journal in self.fetch_journal_details(list(neighbour_scores)):
+            journal['related_to'] = related_to.get(journal.get('id'))
+            journals.append(journal)
+        return neighbour_scores
+    
+    def diversify(self, ranked_journals: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+        """
+        Pick the top journals, discounting near-duplicates of journals already picked.
+        
+        Greedy selection on calculated_score * (1 - DIVERSITY_PENALTY * s),
+        where s is the highest graph similarity to an already picked
+        journal. Without a graph this is the plain top N.
+        
+        Args:
+            ranked_journals: Journals sorted by calculated_score
+            count: Number of journals to pick
+        
+        Returns:
+            Selected journals in pick order
+        """
+        if self.journal_graph is None:
+            return ranked_journals[:count]
+        
+        remaining = list(ranked_journals)
+        selected = []
+        similar_to_selected: Dict[str, float] = {}
+        
+        def discounted(journal: Dict[str, Any]) -> float:
+            similarity = similar_to_selected.get(journal.get('id'), 0.0)
+            return journal['calculated_score'] * (1 - self.DIVERSITY_PENALTY * similarity)
+        
+        while remaining and len(selected) < count:
+            best = max(remaining, key=discounted)
+            remaining.remove(best)
+            selected.append(best)
+            for neighbour, similarity in self.journal_graph.neighbours(best.get('id', '')):
+                similar_to_selected[neighbour] = max(similar_to_selected.get(neighbour, 0.0), similarity)
+        return selected
+    
+    def rank_candidates(self, candidates: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Rank gathered candidates and format the top N journals.
+        
+        Args:
+            candidates: Output of gather_candidates
+        
+        Returns:
+            List of top journals (formatted)
+        """
+        # Step 4: Rank journals by score
+        ranked_journals = self.rank_journals(
+            candidates["journals"],
+            candidates["journal_counts"],
+            candidates.get("fused_scores"),
+            candidates.get("neighbour_scores")
+        )
+        
+        # Step 5: Format top N journals (diversified when the journal graph is available)
         top_journals = [
             self.format_journal_output(journal, rank)
-            for rank, journal in enumerate(ranked_journals[:self.TOP_JOURNALS_COUNT], 1)
+            for rank, journal in enumerate(self.diversify(ranked_journals, self.TOP_JOURNALS_COUNT), 1)
         ]
         
         return top_journals
@@ -523,14 +1276,19 @@ class OpenAlexJournalFetcher:
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description="Find top journals for refined search criteria")
+    parser.add_argument("--input", help="Search criteria JSON (default: format.json or Vraj's refined output)")
+    parser.add_argument("--output", default="journal_results.json", help="Results file (default: journal_results.json)")
+    args = parser.parse_args()
+    
     logger.info("Starting OpenAlex Journal Fetcher (Optimized)")
     logger.info("="*80)
     
     # Initialize fetcher
     fetcher = OpenAlexJournalFetcher()
     
-    # Load search criteria from Vraj's output
-    criteria = fetcher.load_search_criteria()
+    # Load search criteria (per-request file from api_server, else Vraj's output)
+    criteria = fetcher.load_search_criteria(args.input) if args.input else fetcher.load_search_criteria()
     if not criteria:
         logger.error("Failed to load search criteria. Exiting.")
         return
@@ -555,7 +1313,7 @@ def main():
     fetcher.print_results(top_journals)
     
     # Save results
-    output_file = 'journal_results.json'
+    output_file = args.output
     fetcher.save_results(top_journals, output_file)
     
     logger.info(f"\n[SUCCESS] Found {len(top_journals)} top journals")
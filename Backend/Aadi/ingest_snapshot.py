@@ -0,0 +1,276 @@
+"""
+OpenAlex Snapshot Ingester
+==========================
+Parses OpenAlex snapshot partitions (data/<entity>/updated_date=*/part_*.gz)
+with a process pool, keeps only the fields the journal fetcher and local
+indexes use, and writes one projected gzipped JSONL shard per partition.
+
+Progress is checkpointed after every partition in <out_dir>/_checkpoint.json,
+so an interrupted ingest resumes where it stopped. Partitions are
+independent, so throughput scales with the number of worker processes.
+
+Usage:
+    python ingest_snapshot.py <snapshot_root> <out_dir> [--entities works,sources] [--workers N]
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from journal_store import SOURCE_FIELDS, openalex_key
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "_checkpoint.json"
+SUPPORTED_ENTITIES = ("works", "sources")
+
+
+def rebuild_abstract(inverted_index: Optional[Dict[str, List[int]]]) -> str:
+    """
+    Rebuild abstract text from OpenAlex's abstract_inverted_index.
+    
+    Args:
+        inverted_index: Mapping word -> list of positions
+    
+    Returns:
+        Abstract text ('' if missing)
+    """
+    if not inverted_index:
+        return ""
+    positions = {}
+    for word, indexes in inverted_index.items():
+        for index in indexes:
+            positions[index] = word
+    return " ".join(positions[i] for i in sorted(positions))
+
+
+def project_work(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Keep the work fields used for journal search and the journal graph.
+    
+    Author and referenced work IDs are stored as integer keys
+    (journal_store.openalex_key) to keep shards small.
+    
+    Returns:
+        Flat work record, or None for works without a primary source
+    """
+    source = (record.get("primary_location") or {}).get("source") or {}
+    if not source.get("id"):
+        return None
+    return {
+        "id": record.get("id"),
+        "doi": record.get("doi"),
+        "title": record.get("title") or record.get("display_name") or "",
+        "abstract": rebuild_abstract(record.get("abstract_inverted_index")),
+        "publication_year": record.get("publication_year"),
+        "cited_by_count": record.get("cited_by_count") or 0,
+        "is_oa": bool((record.get("open_access") or {}).get("is_oa")),
+        "source_id": source.get("id"),
+        "source_type": source.get("type"),
+        "keywords": [k.get("display_name") for k in record.get("keywords") or [] if k.get("display_name")],
+        "topics": [
+            {"id": t.get("id"), "display_name": t.get("display_name")}
+            for t in record.get("topics") or [] if t.get("id")
+        ],
+        "author_ids": [
+            key for key in (
+                openalex_key((a.get("author") or {}).get("id") or "") for a in record.get("authorships") or []
+            ) if key
+        ],
+        "referenced_works": [key for key in map(openalex_key, record.get("referenced_works") or []) if key],
+        "updated_date": record.get("updated_date"),
+    }
+
+
+def project_source(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Keep the source fields stored in the local journal store."""
+    return {field: record.get(field) for field in SOURCE_FIELDS} if record.get("id") else None
+
+
+PROJECTIONS: Dict[str, Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = {
+    "works": project_work,
+    "sources": project_source,
+}
+
+
+def discover_snapshot_partitions(snapshot_root: Path, entity: str) -> List[Path]:
+    """
+    Find partition files for an entity, oldest updated_date first.
+    
+    Accepts either the snapshot root (containing data/) or data/ itself.
+    
+    Args:
+        snapshot_root: Snapshot directory
+        entity: Entity name ('works' or 'sources')
+    
+    Returns:
+        Sorted list of partition paths
+    """
+    snapshot_root = Path(snapshot_root)
+    entity_dir = snapshot_root / "data" / entity
+    if not entity_dir.exists():
+        entity_dir = snapshot_root / entity
+    if not entity_dir.exists():
+        return []
+    return sorted(entity_dir.glob("updated_date=*/*.gz"))
+
+
+def ingest_partition(entity: str, partition: str, output: str) -> Tuple[str, int, int]:
+    """
+    Project one partition into a gzipped JSONL shard (runs in a worker process).
+    
+    The shard is written to a temporary file and renamed, so a shard only
+    exists once it is complete.
+    
+    Args:
+        entity: Entity name
+        partition: Input partition path
+        output: Output shard path
+    
+    Returns:
+        Tuple of (partition, records read, records written)
+    """
+    project = PROJECTIONS[entity]
+    read = written = 0
+    tmp_output = output + ".tmp"
+    
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(partition, "rt", encoding="utf-8") as src, \
+            gzip.open(tmp_output, "wt", encoding="utf-8", compresslevel=3) as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            read += 1
+            projected = project(json.loads(line))
+            if projected is not None:
+                dst.write(json.dumps(projected, ensure_ascii=False, separators=(",", ":")))
+                dst.write("\n")
+                written += 1
+    
+    os.replace(tmp_output, output)
+    return partition, read, written
+
+
+class SnapshotIngester:
+    """
+    Ingest snapshot partitions into projected shards with resumable progress.
+    """
+    
+    def __init__(self, snapshot_root: Path, out_dir: Path, workers: Optional[int] = None):
+        """
+        Args:
+            snapshot_root: Snapshot directory (containing data/<entity>/...)
+            out_dir: Output directory for shards and the checkpoint
+            workers: Worker processes (default: CPU count)
+        """
+        self.snapshot_root = Path(snapshot_root)
+        self.out_dir = Path(out_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_path = self.out_dir / CHECKPOINT_FILE
+        self.checkpoint = self._load_checkpoint()
+    
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"completed": {}}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {e}")
+            return {"completed": {}}
+    
+    def _save_checkpoint(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f, indent=1)
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def shard_path(self, entity: str, partition: Path) -> Path:
+        """Output shard for a partition: <out_dir>/<entity>/updated_date=.../part_N.jsonl.gz"""
+        name = partition.name[:-len(".gz")] + ".jsonl.gz"
+        return self.out_dir / entity / partition.parent.name / name
+    
+    def pending_partitions(self, entity: str, partitions: Optional[List[Path]] = None) -> List[Path]:
+        """Partitions not yet recorded as completed (or whose shard is missing)."""
+        if partitions is None:
+            partitions = discover_snapshot_partitions(self.snapshot_root, entity)
+        completed = self.checkpoint["completed"]
+        return [
+            partition for partition in partitions
+            if str(partition) not in completed or not self.shard_path(entity, partition).exists()
+        ]
+    
+    def ingest(self, entity: str, partitions: Optional[List[Path]] = None) -> List[Path]:
+        """
+        Ingest all pending partitions of an entity in parallel.
+        
+        Args:
+            entity: Entity name ('works' or 'sources')
+            partitions: Partitions to ingest (default: all in the snapshot)
+        
+        Returns:
+            Shard paths written by this run
+        """
+        pending = self.pending_partitions(entity, partitions)
+        if not pending:
+            logger.info(f"{entity}: nothing to ingest")
+            return []
+        
+        logger.info(f"{entity}: ingesting {len(pending)} partitions with {self.workers} workers...")
+        started = time.time()
+        total_read = 0
+        written_shards = []
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(ingest_partition, entity, str(partition),
+                                str(self.shard_path(entity, partition))): partition
+                for partition in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                partition = futures[future]
+                _, read, written = future.result()
+                total_read += read
+                written_shards.append(self.shard_path(entity, partition))
+                self.checkpoint["completed"][str(partition)] = {
+                    "entity": entity,
+                    "records": written,
+                    "finished_at": time.time(),
+                }
+                self._save_checkpoint()
+                
+                elapsed = max(time.time() - started, 1e-6)
+                logger.info(f"{entity}: {done}/{len(pending)} partitions, "
+                            f"{total_read:,} records ({total_read / elapsed:,.0f}/s)")
+        
+        return sorted(written_shards)
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Ingest OpenAlex snapshot partitions")
+    parser.add_argument("snapshot_root", help="Snapshot directory containing data/<entity>/")
+    parser.add_argument("out_dir", help="Output directory for projected shards")
+    parser.add_argument("--entities", default=",".join(SUPPORTED_ENTITIES),
+                        help="Comma-separated entities to ingest")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    
+    ingester = SnapshotIngester(Path(args.snapshot_root), Path(args.out_dir), args.workers)
+    for entity in args.entities.split(","):
+        if entity not in PROJECTIONS:
+            logger.error(f"Unsupported entity: {entity}")
+            continue
+        ingester.ingest(entity)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,285 @@
+"""
+Journal Co-publication Graph
+============================
+Offline-built journal similarity graph for "related journals" expansion.
+Each journal keeps its TOP_NEIGHBOURS most similar journals, scored from
+three signals in the projected works shards (see ingest_snapshot.py):
+
+- shared authors: authors publishing in both journals, normalized by
+  sqrt(authors_a * authors_b)
+- shared topics: dot product of the journals' topic shares, taken over the
+  top TOPIC_FANOUT journals of each topic
+- citations: works in one journal citing works in the other (both
+  directions), normalized by sqrt(references_a * references_b)
+
+The graph is stored as CSR arrays (row offsets, neighbour rows, weights)
+plus an open-addressing hash table from OpenAlex source ID to row (the
+journal_store helpers), so a neighbour lookup is one hash probe and a
+slice of memory-mapped arrays.
+
+Usage:
+    python journal_graph.py build <shards/works> [graph_dir]
+    python journal_graph.py neighbours <graph_dir> <S123456>
+"""
+
+import json
+import logging
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from journal_store import (
+    OPENALEX_PREFIX, build_hash_index, discover_partitions, hash_lookup, iter_jsonl_records, openalex_key
+)
+
+logger = logging.getLogger(__name__)
+
+
+class JournalGraph:
+    """
+    Memory-mapped top-N journal neighbour lists in CSR form.
+    """
+    
+    TOP_NEIGHBOURS = 20  # Neighbours kept per journal
+    MAX_AUTHOR_JOURNALS = 50  # Authors spread over more journals carry no signal
+    TOPIC_FANOUT = 100  # Journals per topic considered for topic similarity
+    WEIGHT_AUTHORS = 0.4
+    WEIGHT_TOPICS = 0.3
+    WEIGHT_CITATIONS = 0.3
+    
+    def __init__(self, graph_dir: Path):
+        """
+        Memory-map a graph directory written by JournalGraph.build.
+        
+        Args:
+            graph_dir: Graph directory
+        """
+        self.graph_dir = Path(graph_dir)
+        with open(self.graph_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        
+        def load(name: str) -> np.ndarray:
+            return np.load(self.graph_dir / f"{name}.npy", mmap_mode="r")
+        
+        self.journal_ids = load("journal_ids")
+        self.offsets = load("offsets")
+        self.neighbour_rows = load("neighbours")
+        self.weights = load("weights")
+        self.index_keys = load("index_keys")
+        self.index_rows = load("index_rows")
+    
+    def __len__(self) -> int:
+        return len(self.journal_ids)
+    
+    def neighbours(self, journal_id: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Most similar journals.
+        
+        Args:
+            journal_id: OpenAlex source ID (URL or 'S123')
+            limit: Maximum neighbours (default: all stored)
+        
+        Returns:
+            List of (journal ID, similarity 0-1), most similar first
+        """
+        row = hash_lookup(self.index_keys, self.index_rows, openalex_key(journal_id))
+        if row is None:
+            return []
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        return [
+            (f"{OPENALEX_PREFIX}S{int(self.journal_ids[neighbour])}", round(float(weight), 4))
+            for neighbour, weight in zip(self.neighbour_rows[start:end], self.weights[start:end])
+        ]
+    
+    def similarity(self, journal_a: str, journal_b: str) -> float:
+        """Stored similarity between two journals (0 if b is not among a's neighbours)."""
+        for neighbour, weight in self.neighbours(journal_a):
+            if neighbour == journal_b:
+                return weight
+        return 0.0
+    
+    @classmethod
+    def build(cls, shard_paths: List[Path], graph_dir: Path) -> int:
+        """
+        Build the graph from projected works shards.
+        
+        Reads the shards twice (newest first, skipping older copies of a
+        work): once for journals, authors and topics, once for citations,
+        which need every work's journal first.
+        
+        Args:
+            shard_paths: Works shards, oldest first (as discovered)
+            graph_dir: Output directory
+        
+        Returns:
+            Number of journals in the graph
+        """
+        graph_dir = Path(graph_dir)
+        graph_dir.mkdir(parents=True, exist_ok=True)
+        newest_first = list(reversed(shard_paths))
+        
+        # Pass 1: work -> journal, journal authors and topic counts
+        work_journal: Dict[int, int] = {}
+        author_journals: Dict[int, set] = {}
+        journal_topics: Dict[int, Dict[str, int]] = {}
+        for record in iter_jsonl_records(newest_first):
+            work_key = openalex_key(record.get("id") or "")
+            source_key = openalex_key(record.get("source_id") or "")
+            if not work_key or work_key in work_journal or record.get("source_type") != "journal" or not source_key:
+                continue
+            work_journal[work_key] = source_key
+            for author in record.get("author_ids") or []:
+                author_journals.setdefault(author, set()).add(source_key)
+            topics = journal_topics.setdefault(source_key, {})
+            for topic in record.get("topics") or []:
+                topic_id = topic.get("id")
+                if topic_id:
+                    topics[topic_id] = topics.get(topic_id, 0) + 1
+        
+        journal_keys = sorted(set(work_journal.values()))
+        row_of = {key: row for row, key in enumerate(journal_keys)}
+        num_journals = len(journal_keys)
+        edges: Dict[Tuple[int, int], float] = {}
+        
+        def add(signal: Dict[Tuple[int, int], float], a: int, b: int, weight: float):
+            if a != b:
+                pair = (a, b) if a < b else (b, a)
+                signal[pair] = signal.get(pair, 0.0) + weight
+        
+        # Shared authors
+        shared_authors: Dict[Tuple[int, int], float] = {}
+        author_counts = np.zeros(num_journals, dtype=np.int64)
+        for journals in author_journals.values():
+            rows = sorted(row_of[key] for key in journals)
+            author_counts[rows] += 1
+            if len(rows) > cls.MAX_AUTHOR_JOURNALS:
+                continue
+            for i, a in enumerate(rows):
+                for b in rows[i + 1:]:
+                    add(shared_authors, a, b, 1.0)
+        for (a, b), shared in shared_authors.items():
+            add(edges, a, b, cls.WEIGHT_AUTHORS * shared / math.sqrt(author_counts[a] * author_counts[b]))
+        del author_journals, shared_authors
+        
+        # Shared topics: each topic's top journals by topic share
+        topic_journals: Dict[str, List[Tuple[float, int]]] = {}
+        for key, topics in journal_topics.items():
+            total = sum(topics.values())
+            for topic_id, count in topics.items():
+                topic_journals.setdefault(topic_id, []).append((count / total, row_of[key]))
+        topic_similarity: Dict[Tuple[int, int], float] = {}
+        for members in topic_journals.values():
+            members = sorted(members, reverse=True)[:cls.TOPIC_FANOUT]
+            for i, (share_a, a) in enumerate(members):
+                for share_b, b in members[i + 1:]:
+                    add(topic_similarity, a, b, share_a * share_b)
+        for (a, b), similarity in topic_similarity.items():
+            add(edges, a, b, cls.WEIGHT_TOPICS * min(similarity, 1.0))
+        del topic_journals, topic_similarity
+        
+        # Pass 2: citations between journals
+        citations: Dict[Tuple[int, int], float] = {}
+        reference_counts = np.zeros(num_journals, dtype=np.int64)
+        seen = set()
+        for record in iter_jsonl_records(newest_first):
+            work_key = openalex_key(record.get("id") or "")
+            if work_key in seen or work_key not in work_journal:
+                continue
+            seen.add(work_key)
+            citing = row_of[work_journal[work_key]]
+            for reference in record.get("referenced_works") or []:
+                cited = work_journal.get(reference)
+                if cited is not None:
+                    reference_counts[citing] += 1
+                    reference_counts[row_of[cited]] += 1
+                    add(citations, citing, row_of[cited], 1.0)
+        for (a, b), count in citations.items():
+            add(edges, a, b, cls.WEIGHT_CITATIONS * count / math.sqrt(reference_counts[a] * reference_counts[b]))
+        del citations, seen
+        
+        # Top-N neighbours per journal, in CSR form
+        adjacency: List[List[Tuple[float, int]]] = [[] for _ in range(num_journals)]
+        for (a, b), weight in edges.items():
+            adjacency[a].append((weight, b))
+            adjacency[b].append((weight, a))
+        
+        offsets = np.zeros(num_journals + 1, dtype=np.int64)
+        neighbour_rows: List[int] = []
+        weights: List[float] = []
+        for row, candidates in enumerate(adjacency):
+            top = sorted(candidates, key=lambda item: (-item[0], item[1]))[:cls.TOP_NEIGHBOURS]
+            neighbour_rows.extend(neighbour for _, neighbour in top)
+            weights.extend(min(weight, 1.0) for weight, _ in top)
+            offsets[row + 1] = len(neighbour_rows)
+        
+        index_keys, index_rows = build_hash_index(journal_keys, list(range(num_journals)))
+        arrays = {
+            "journal_ids": np.array(journal_keys, dtype=np.int64),
+            "offsets": offsets,
+            "neighbours": np.array(neighbour_rows, dtype=np.int32),
+            "weights": np.array(weights, dtype=np.float32),
+            "index_keys": index_keys,
+            "index_rows": index_rows,
+        }
+        for name, values in arrays.items():
+            np.save(graph_dir / f"{name}.npy", values)
+        
+        meta = {
+            "journals": num_journals,
+            "edges": len(neighbour_rows),
+            "works": len(work_journal),
+            "built_at": time.time(),
+        }
+        with open(graph_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        
+        logger.info(f"Built journal graph: {num_journals} journals, {len(neighbour_rows)} neighbour links")
+        return num_journals
+
+
+def open_default_graph() -> Optional[JournalGraph]:
+    """
+    Open the graph at JOURNAL_GRAPH_DIR (default: ./journal_graph) if it exists.
+    
+    Returns:
+        JournalGraph, or None if no graph has been built
+    """
+    graph_dir = Path(os.getenv("JOURNAL_GRAPH_DIR", Path(__file__).parent / "journal_graph"))
+    if not (graph_dir / "meta.json").exists():
+        return None
+    try:
+        graph = JournalGraph(graph_dir)
+        logger.info(f"Loaded journal graph ({len(graph)} journals)")
+        return graph
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not open journal graph at {graph_dir}: {e}")
+        return None
+
+
+def main():
+    """Command-line entry point: build the graph or list a journal's neighbours."""
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "neighbours"):
+        print(__doc__)
+        return
+    
+    if sys.argv[1] == "build":
+        shards = discover_partitions(Path(sys.argv[2]))
+        graph_dir = Path(sys.argv[3]) if len(sys.argv) > 3 else Path(__file__).parent / "journal_graph"
+        logger.info(f"Building journal graph from {len(shards)} shards...")
+        JournalGraph.build(shards, graph_dir)
+    else:
+        graph = JournalGraph(Path(sys.argv[2]))
+        for journal_id, weight in graph.neighbours(sys.argv[3]):
+            print(f"{weight:.4f}  {journal_id}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
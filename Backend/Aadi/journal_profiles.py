@@ -0,0 +1,332 @@
+"""
+Journal Profile Index
+=====================
+One topic-profile vector per journal, searched with an approximate nearest
+neighbour index, as a second candidate generator next to the works search.
+
+- Profiles are hashed TF-IDF vectors over the journal's works: topic IDs,
+  topic names, keyword phrases and their words. Features hash into
+  NUM_BUCKETS buckets.
+- Each bucket has a fixed pseudo-random +/-1 projection row (seeded by the
+  bucket number), so the sparse vector is compressed to DIMENSIONS float32
+  values without materializing the projection matrix. Vectors are
+  L2-normalized, so dot products are cosine similarities.
+- An IVF index (spherical k-means in NumPy) groups journals into lists;
+  queries scan only the NPROBE lists closest to the query vector.
+
+Queries are the refined keywords and subject area, projected the same way.
+
+Usage:
+    python journal_profiles.py build <shards/works> [profiles_dir]
+    python journal_profiles.py search <profiles_dir> "<keyword>" ["<keyword>" ...]
+"""
+
+import json
+import logging
+import math
+import os
+import sys
+import time
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from journal_store import discover_partitions, iter_jsonl_records, openalex_key
+from works_index import OPENALEX_PREFIX, tokenize
+
+logger = logging.getLogger(__name__)
+
+NUM_BUCKETS = 1 << 20
+DIMENSIONS = 256
+
+
+def profile_features(keywords: List[str], topics: List[Dict[str, Any]]) -> List[str]:
+    """
+    Features for one work (or query): keyword phrases, their words, topic IDs and topic name words.
+    
+    Args:
+        keywords: Keyword phrases
+        topics: Topic records ({'id', 'display_name'})
+    
+    Returns:
+        List of feature strings (may repeat)
+    """
+    features = []
+    for keyword in keywords:
+        words = tokenize(keyword)
+        if len(words) > 1:
+            features.append("kw:" + " ".join(words))
+        features.extend("w:" + word for word in words)
+    for topic in topics:
+        if topic.get("id"):
+            features.append("topic:" + str(topic["id"]).rsplit("/", 1)[-1])
+        features.extend("w:" + word for word in tokenize(topic.get("display_name") or ""))
+    return features
+
+
+def feature_bucket(feature: str) -> int:
+    """Hash a feature into its bucket (stable across processes)."""
+    return zlib.crc32(feature.encode("utf-8")) % NUM_BUCKETS
+
+
+@lru_cache(maxsize=65536)
+def projection_row(bucket: int) -> np.ndarray:
+    """Deterministic +/-1 random projection row of a bucket."""
+    signs = np.random.default_rng(bucket).integers(0, 2, DIMENSIONS, dtype=np.int8)
+    return (signs * 2 - 1).astype(np.float32)
+
+
+def project(weights: Dict[int, float]) -> np.ndarray:
+    """Project sparse bucket weights to a normalized dense vector."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for bucket, weight in weights.items():
+        vector += weight * projection_row(bucket)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def spherical_kmeans(vectors: np.ndarray, num_lists: int, iterations: int = 10,
+                     seed: int = 0) -> np.ndarray:
+    """
+    Cluster unit vectors by cosine similarity.
+    
+    Args:
+        vectors: Normalized vectors (n x d)
+        num_lists: Number of centroids
+        iterations: Lloyd iterations
+        seed: Random seed for the initial centroids
+    
+    Returns:
+        Normalized centroids (num_lists x d)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), num_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for list_id in range(num_lists):
+            members = vectors[assignment == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+
+class JournalProfileIndex:
+    """
+    Memory-mapped journal profile vectors with an IVF index.
+    """
+    
+    NPROBE = 8  # IVF lists scanned per query
+    TRAINING_SAMPLE = 50000  # Vectors used to train the IVF centroids
+    
+    def __init__(self, index_dir: Path):
+        """
+        Memory-map an index directory written by JournalProfileIndex.build.
+        
+        Args:
+            index_dir: Index directory
+        """
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        
+        def load(name: str) -> np.ndarray:
+            return np.load(self.index_dir / f"{name}.npy", mmap_mode="r")
+        
+        self.vectors = load("vectors")
+        self.source_ids = load("source_ids")
+        self.work_counts = load("work_counts")
+        self.idf = load("idf")
+        self.centroids = np.asarray(load("centroids"))
+        self.list_offsets = load("list_offsets")
+        self.list_members = load("list_members")
+    
+    def __len__(self) -> int:
+        return len(self.source_ids)
+    
+    def query_vector(self, keywords: List[str], subject: str = "") -> np.ndarray:
+        """
+        Project refined keywords and subject area into profile space.
+        
+        Features no journal has are dropped; if none are left the vector is all zeros.
+        """
+        weights: Dict[int, float] = {}
+        for feature in profile_features(keywords + ([subject] if subject else []), []):
+            bucket = feature_bucket(feature)
+            if self.idf[bucket] > 0:
+                weights[bucket] = float(self.idf[bucket])
+        return project(weights)
+    
+    def search(self, keywords: List[str], subject: str = "", top_k: int = 20,
+               nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Journals whose profiles are closest to the query.
+        
+        Args:
+            keywords: Refined keywords
+            subject: Subject area
+            top_k: Number of journals to return
+            nprobe: IVF lists to scan (default: NPROBE)
+        
+        Returns:
+            List of (journal ID, cosine similarity), best first
+        """
+        query = self.query_vector(keywords, subject)
+        if not query.any() or not len(self):
+            return []
+        
+        nprobe = min(nprobe or self.NPROBE, len(self.centroids))
+        closest_lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        candidates = np.concatenate([
+            self.list_members[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+            for list_id in closest_lists
+        ])
+        if not len(candidates):
+            return []
+        
+        similarities = np.asarray(self.vectors[candidates]) @ query
+        top = np.argsort(-similarities)[:top_k]
+        return [
+            (f"{OPENALEX_PREFIX}S{int(self.source_ids[candidates[i]])}", round(float(similarities[i]), 4))
+            for i in top if similarities[i] > 0
+        ]
+    
+    @classmethod
+    def build(cls, records: Iterator[Dict[str, Any]], index_dir: Path) -> int:
+        """
+        Build journal profiles from projected works.
+        
+        Pass records newest first: a work seen again later (an older copy) is
+        skipped, so each work counts once with its latest data.
+        
+        Args:
+            records: Projected works (see ingest_snapshot.project_work), newest first
+            index_dir: Output directory
+        
+        Returns:
+            Number of journal profiles
+        """
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        
+        seen_works = set()
+        term_counts: Dict[int, Dict[int, int]] = {}
+        work_counts: Dict[int, int] = {}
+        for record in records:
+            work_key = openalex_key(record.get("id") or "")
+            source_key = openalex_key(record.get("source_id") or "")
+            if not work_key or not source_key or work_key in seen_works:
+                continue
+            seen_works.add(work_key)
+            if record.get("source_type") != "journal":
+                continue
+            
+            counts = term_counts.setdefault(source_key, {})
+            for feature in profile_features(record.get("keywords") or [], record.get("topics") or []):
+                bucket = feature_bucket(feature)
+                counts[bucket] = counts.get(bucket, 0) + 1
+            work_counts[source_key] = work_counts.get(source_key, 0) + 1
+        
+        source_keys = sorted(key for key, counts in term_counts.items() if counts)
+        num_journals = len(source_keys)
+        
+        document_frequency = np.zeros(NUM_BUCKETS, dtype=np.int32)
+        for key in source_keys:
+            document_frequency[list(term_counts[key])] += 1
+        idf = np.log((1 + num_journals) / (1 + document_frequency)).astype(np.float32) + 1
+        idf[document_frequency == 0] = 0  # Features no journal has carry no evidence
+        
+        vectors = np.zeros((num_journals, DIMENSIONS), dtype=np.float32)
+        for row, key in enumerate(source_keys):
+            vectors[row] = project({
+                bucket: (1 + math.log(count)) * float(idf[bucket])
+                for bucket, count in term_counts[key].items()
+            })
+        
+        # IVF: sqrt(n) lists trained on a sample, every journal assigned to its closest list
+        num_lists = max(1, int(math.sqrt(num_journals)))
+        if num_journals:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(num_journals, min(num_journals, cls.TRAINING_SAMPLE), replace=False)]
+            centroids = spherical_kmeans(sample, min(num_lists, len(sample)))
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+        else:
+            centroids = np.zeros((1, DIMENSIONS), dtype=np.float32)
+            assignment = np.zeros(0, dtype=np.int64)
+        list_members = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+        
+        arrays = {
+            "vectors": vectors,
+            "source_ids": np.array(source_keys, dtype=np.int64),
+            "work_counts": np.array([work_counts[key] for key in source_keys], dtype=np.int32),
+            "idf": idf,
+            "centroids": centroids.astype(np.float32),
+            "list_offsets": list_offsets,
+            "list_members": list_members,
+        }
+        for name, values in arrays.items():
+            np.save(index_dir / f"{name}.npy", values)
+        
+        meta = {
+            "journals": num_journals,
+            "works": len(seen_works),
+            "lists": len(centroids),
+            "dimensions": DIMENSIONS,
+            "buckets": NUM_BUCKETS,
+            "built_at": time.time(),
+        }
+        with open(index_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        
+        logger.info(f"Built {num_journals} journal profiles ({len(centroids)} IVF lists) in {index_dir}")
+        return num_journals
+
+
+def open_default_profile_index() -> Optional[JournalProfileIndex]:
+    """
+    Open the index at JOURNAL_PROFILES_DIR (default: ./journal_profiles) if it exists.
+    
+    Returns:
+        JournalProfileIndex, or None if no index has been built
+    """
+    index_dir = Path(os.getenv("JOURNAL_PROFILES_DIR", Path(__file__).parent / "journal_profiles"))
+    if not (index_dir / "meta.json").exists():
+        return None
+    try:
+        index = JournalProfileIndex(index_dir)
+        logger.info(f"Loaded journal profile index ({len(index)} journals)")
+        return index
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not open journal profile index at {index_dir}: {e}")
+        return None
+
+
+def main():
+    """Command-line entry point: build or query the profile index."""
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "search"):
+        print(__doc__)
+        return
+    
+    if sys.argv[1] == "build":
+        shards = discover_partitions(Path(sys.argv[2]))
+        index_dir = Path(sys.argv[3]) if len(sys.argv) > 3 else Path(__file__).parent / "journal_profiles"
+        logger.info(f"Building journal profiles from {len(shards)} shards...")
+        JournalProfileIndex.build(iter_jsonl_records(list(reversed(shards))), index_dir)
+    else:
+        index = JournalProfileIndex(Path(sys.argv[2]))
+        started = time.perf_counter()
+        matches = index.search(sys.argv[3:])
+        elapsed = (time.perf_counter() - started) * 1000
+        for journal_id, similarity in matches:
+            print(f"{similarity:.4f}  {journal_id}")
+        print(f"{len(matches)} journals in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,652 @@
+"""
+Local Journal Store
+===================
+Columnar, memory-mapped store of OpenAlex sources built from the sources
+snapshot (gzipped JSONL partitions), so journal details can be looked up
+without calling the /sources endpoint.
+
+Layout of a store (version) directory:
+- meta.json              version, row count, columns, last updated_date
+- <column>.npy           numeric columns (memory-mapped on load)
+- str_<column>.npy       int32 ids into the interned string table
+- strings.bin            interned UTF-8 strings, back to back
+- string_offsets.npy     int64 offsets into strings.bin (len = strings + 1)
+- index_<name>_keys.npy  open-addressing hash tables (int64 key -> int32 row)
+- index_<name>_rows.npy
+
+Opening a store only maps files, so it loads in milliseconds; lookups by
+OpenAlex ID or ISSN are O(1) probes into the hash tables.
+
+Stores are versioned: a store root holds v000001/, v000002/, ... and a
+CURRENT file naming the live version. Delta updates (delta_update.py)
+write a patched copy as a new version and swap CURRENT atomically.
+
+Usage:
+    python journal_store.py build <snapshot/data/sources> [store_dir]
+    python journal_store.py get <store_dir> <S123456|ISSN>
+"""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OPENALEX_PREFIX = "https://openalex.org/"
+LIST_SEPARATOR = "\x1f"  # Joins list values (ISSNs) inside one interned string
+CURRENT_FILE = "CURRENT"  # Names the live version directory under a store root
+KEEP_VERSIONS = 3  # Store versions kept on disk after publishing a new one
+
+NUMERIC_COLUMNS = {
+    "h_index": np.int32,
+    "i10_index": np.int32,
+    "two_yr_mean_citedness": np.float32,
+    "cited_by_count": np.int64,
+    "works_count": np.int64,
+    "apc_usd": np.float32,  # NaN when unknown
+    "is_oa": np.uint8,
+    "is_in_doaj": np.uint8,
+}
+
+STRING_COLUMNS = ["display_name", "host_organization_name", "homepage_url", "issn_l", "issn", "type"]
+
+# Fields of a snapshot source record that the store keeps
+SOURCE_FIELDS = [
+    "id", "display_name", "issn_l", "issn", "host_organization_name", "homepage_url",
+    "summary_stats", "cited_by_count", "works_count", "is_oa", "is_in_doaj", "apc_usd", "type",
+    "updated_date"
+]
+
+
+def openalex_key(openalex_id: str) -> int:
+    """Convert 'https://openalex.org/S123' or 'S123' to the integer 123 (0 if invalid)."""
+    short_id = openalex_id.replace(OPENALEX_PREFIX, "")
+    digits = short_id[1:] if short_id[:1].isalpha() else short_id
+    return int(digits) if digits.isdigit() else 0
+
+
+def issn_key(issn: str) -> int:
+    """Convert '1234-567X' to a positive integer key (0 if invalid)."""
+    compact = issn.replace("-", "").strip().upper()
+    if len(compact) != 8 or not compact[:7].isdigit() or not (compact[7].isdigit() or compact[7] == "X"):
+        return 0
+    check = 10 if compact[7] == "X" else int(compact[7])
+    return int(compact[:7]) * 11 + check + 1
+
+
+def _slot(key: int, mask: int) -> int:
+    # Fibonacci hashing spreads sequential ids over the table
+    return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 20 & mask
+
+
+def _hash_insert(table_keys: np.ndarray, table_rows: np.ndarray, key: int, row: int) -> bool:
+    """Insert a key unless present. Returns True if inserted."""
+    if key <= 0:
+        return False
+    mask = len(table_keys) - 1
+    slot = _slot(key, mask)
+    while table_keys[slot] != 0 and table_keys[slot] != key:
+        slot = (slot + 1) & mask
+    if table_keys[slot] != 0:
+        return False
+    table_keys[slot] = key
+    table_rows[slot] = row
+    return True
+
+
+def _hash_delete(table_keys: np.ndarray, table_rows: np.ndarray, key: int) -> bool:
+    """Remove a key. Returns True if it was present."""
+    if key <= 0:
+        return False
+    mask = len(table_keys) - 1
+    slot = _slot(key, mask)
+    while table_keys[slot] != key:
+        if table_keys[slot] == 0:
+            return False
+        slot = (slot + 1) & mask
+    
+    # Backward-shift deletion: pull later keys of the probe run into the hole
+    # so lookups never stop early at it
+    hole = slot
+    slot = (slot + 1) & mask
+    while table_keys[slot] != 0:
+        home = _slot(int(table_keys[slot]), mask)
+        if (slot - home) & mask >= (slot - hole) & mask:
+            table_keys[hole] = table_keys[slot]
+            table_rows[hole] = table_rows[slot]
+            hole = slot
+        slot = (slot + 1) & mask
+    table_keys[hole] = 0
+    table_rows[hole] = -1
+    return True
+
+
+def build_hash_index(keys: List[int], rows: List[int]):
+    """
+    Build an open-addressing hash table (linear probing, key 0 = empty).
+    
+    Duplicate keys keep the first row.
+    
+    Args:
+        keys: Positive integer keys
+        rows: Row number for each key
+    
+    Returns:
+        Tuple of (keys array, rows array) with power-of-two capacity
+    """
+    capacity = 1
+    while capacity < max(2 * len(keys), 16):
+        capacity <<= 1
+    
+    table_keys = np.zeros(capacity, dtype=np.int64)
+    table_rows = np.full(capacity, -1, dtype=np.int32)
+    
+    for key, row in zip(keys, rows):
+        _hash_insert(table_keys, table_rows, key, row)
+    
+    return table_keys, table_rows
+
+
+def hash_lookup(table_keys: np.ndarray, table_rows: np.ndarray, key: int) -> Optional[int]:
+    """
+    Look up a key in a table built by build_hash_index.
+    
+    Returns:
+        Row number, or None if absent
+    """
+    if key <= 0:
+        return None
+    mask = len(table_keys) - 1
+    slot = _slot(key, mask)
+    while True:
+        stored = int(table_keys[slot])
+        if stored == key:
+            return int(table_rows[slot])
+        if stored == 0:
+            return None
+        slot = (slot + 1) & mask
+
+
+def iter_jsonl_records(paths: List[Path]) -> Iterator[Dict[str, Any]]:
+    """Yield JSON records from gzipped (or plain) JSONL files."""
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def discover_partitions(root: Path) -> List[Path]:
+    """Find snapshot partition files (*.gz / *.jsonl) under a directory, sorted."""
+    root = Path(root)
+    if root.is_file():
+        return [root]
+    return sorted(p for p in root.rglob("*") if p.is_file() and p.suffix in (".gz", ".jsonl"))
+
+
+class JournalStore:
+    """
+    Read-only view over a built store directory.
+    """
+    
+    def __init__(self, store_dir: Path):
+        """
+        Memory-map a store directory.
+        
+        Args:
+            store_dir: Directory written by JournalStore.build
+        """
+        self.store_dir = Path(store_dir)
+        with open(self.store_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        
+        def load(name: str) -> np.ndarray:
+            return np.load(self.store_dir / f"{name}.npy", mmap_mode="r")
+        
+        self.openalex_ids = load("openalex_id")
+        self.numeric = {column: load(column) for column in NUMERIC_COLUMNS}
+        self.string_ids = {column: load(f"str_{column}") for column in STRING_COLUMNS}
+        self.string_offsets = load("string_offsets")
+        self.strings = np.memmap(self.store_dir / "strings.bin", dtype=np.uint8, mode="r") \
+            if self.string_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        self.id_index = (load("index_openalex_keys"), load("index_openalex_rows"))
+        self.issn_index = (load("index_issn_keys"), load("index_issn_rows"))
+    
+    def __len__(self) -> int:
+        return len(self.openalex_ids)
+    
+    @property
+    def data_version(self) -> int:
+        """Version number of the loaded data."""
+        return int(self.meta.get("version", 0))
+    
+    def _string(self, string_id: int) -> str:
+        start, end = int(self.string_offsets[string_id]), int(self.string_offsets[string_id + 1])
+        return bytes(self.strings[start:end]).decode("utf-8")
+    
+    def row_for_id(self, openalex_id: str) -> Optional[int]:
+        """Row number for an OpenAlex source ID (full URL or short form)."""
+        return hash_lookup(*self.id_index, openalex_key(openalex_id))
+    
+    def row_for_issn(self, issn: str) -> Optional[int]:
+        """Row number for an ISSN-L or any ISSN of the source."""
+        return hash_lookup(*self.issn_index, issn_key(issn))
+    
+    def record(self, row: int) -> Dict[str, Any]:
+        """
+        Rebuild a source record in the OpenAlex /sources response shape.
+        
+        Args:
+            row: Row number
+        
+        Returns:
+            Source dictionary usable by rank_journals / format_journal_output
+        """
+        strings = {column: self._string(int(self.string_ids[column][row])) for column in STRING_COLUMNS}
+        numeric = {column: values[row] for column, values in self.numeric.items()}
+        apc = float(numeric["apc_usd"])
+        
+        return {
+            "id": f"{OPENALEX_PREFIX}S{int(self.openalex_ids[row])}",
+            "display_name": strings["display_name"],
+            "issn_l": strings["issn_l"] or None,
+            "issn": strings["issn"].split(LIST_SEPARATOR) if strings["issn"] else [],
+            "host_organization_name": strings["host_organization_name"] or None,
+            "homepage_url": strings["homepage_url"] or None,
+            "summary_stats": {
+                "h_index": int(numeric["h_index"]),
+                "i10_index": int(numeric["i10_index"]),
+                "2yr_mean_citedness": float(numeric["two_yr_mean_citedness"]),
+            },
+            "cited_by_count": int(numeric["cited_by_count"]),
+            "works_count": int(numeric["works_count"]),
+            "is_oa": bool(numeric["is_oa"]),
+            "is_in_doaj": bool(numeric["is_in_doaj"]),
+            "apc_usd": None if np.isnan(apc) else apc,
+            "type": strings["type"] or "journal",
+            "societies": [],
+        }
+    
+    def get(self, openalex_id: str) -> Optional[Dict[str, Any]]:
+        """Source record for an OpenAlex ID, or None if not in the store."""
+        row = self.row_for_id(openalex_id)
+        return self.record(row) if row is not None else None
+    
+    def get_by_issn(self, issn: str) -> Optional[Dict[str, Any]]:
+        """Source record for an ISSN, or None if not in the store."""
+        row = self.row_for_issn(issn)
+        return self.record(row) if row is not None else None
+    
+    @staticmethod
+    def _row_values(record: Dict[str, Any]):
+        """Split a source record into numeric values, string values and ISSNs."""
+        stats = record.get("summary_stats") or {}
+        numeric = {
+            "h_index": stats.get("h_index") or 0,
+            "i10_index": stats.get("i10_index") or 0,
+            "two_yr_mean_citedness": stats.get("2yr_mean_citedness") or 0.0,
+            "cited_by_count": record.get("cited_by_count") or 0,
+            "works_count": record.get("works_count") or 0,
+            "apc_usd": record["apc_usd"] if record.get("apc_usd") is not None else np.nan,
+            "is_oa": bool(record.get("is_oa")),
+            "is_in_doaj": bool(record.get("is_in_doaj")),
+        }
+        issns = [issn for issn in (record.get("issn") or []) if issn]
+        strings = {
+            "display_name": record.get("display_name") or "",
+            "host_organization_name": record.get("host_organization_name") or "",
+            "homepage_url": record.get("homepage_url") or "",
+            "issn_l": record.get("issn_l") or "",
+            "issn": LIST_SEPARATOR.join(issns),
+            "type": record.get("type") or "",
+        }
+        # ISSN-L first so it wins over another source listing the same ISSN
+        return numeric, strings, [strings["issn_l"]] + issns
+    
+    @staticmethod
+    def _write(store_dir: Path, ids: np.ndarray, numeric: Dict[str, np.ndarray],
+               string_ids: Dict[str, np.ndarray], encoded: List[bytes], offsets: np.ndarray,
+               id_index, issn_index, meta: Dict[str, Any]):
+        """Write all store files; meta.json goes last and marks the store complete."""
+        store_dir.mkdir(parents=True, exist_ok=True)
+        np.save(store_dir / "openalex_id.npy", ids)
+        for column, values in numeric.items():
+            np.save(store_dir / f"{column}.npy", values)
+        for column, values in string_ids.items():
+            np.save(store_dir / f"str_{column}.npy", values)
+        np.save(store_dir / "string_offsets.npy", offsets)
+        with open(store_dir / "strings.bin", "wb") as f:
+            for value in encoded:
+                f.write(value)
+        np.save(store_dir / "index_openalex_keys.npy", id_index[0])
+        np.save(store_dir / "index_openalex_rows.npy", id_index[1])
+        np.save(store_dir / "index_issn_keys.npy", issn_index[0])
+        np.save(store_dir / "index_issn_rows.npy", issn_index[1])
+        
+        meta.update({
+            "rows": len(ids),
+            "strings": len(offsets) - 1,
+            "numeric_columns": list(NUMERIC_COLUMNS),
+            "string_columns": STRING_COLUMNS,
+        })
+        with open(store_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+    
+    @staticmethod
+    def build(records: Iterator[Dict[str, Any]], store_dir: Path, version: int = 1) -> int:
+        """
+        Write a store directory from OpenAlex source records.
+        
+        Later records with the same OpenAlex ID replace earlier ones, so
+        partitions can be passed oldest first.
+        
+        Args:
+            records: Source records (raw snapshot or projected)
+            store_dir: Output directory (created if needed)
+            version: Data version number recorded in meta.json
+        
+        Returns:
+            Number of sources written
+        """
+        # Only the projected columns of the newest record per ID are kept, never whole records
+        rows_by_id: Dict[int, Tuple[Dict[str, Any], Dict[str, str], List[str]]] = {}
+        last_updated_date = ""
+        for record in records:
+            key = openalex_key(record.get("id") or "")
+            if key:
+                rows_by_id[key] = JournalStore._row_values(record)
+                last_updated_date = max(last_updated_date, record.get("updated_date") or "")
+        
+        ids = sorted(rows_by_id)
+        count = len(ids)
+        
+        interned: Dict[str, int] = {"": 0}
+        numeric = {column: np.zeros(count, dtype=dtype) for column, dtype in NUMERIC_COLUMNS.items()}
+        string_ids = {column: np.zeros(count, dtype=np.int32) for column in STRING_COLUMNS}
+        issn_keys, issn_rows = [], []
+        
+        for row, key in enumerate(ids):
+            numeric_values, string_values, issns = rows_by_id.pop(key)
+            for column, value in numeric_values.items():
+                numeric[column][row] = value
+            for column, value in string_values.items():
+                string_ids[column][row] = interned.setdefault(value, len(interned))
+            for issn in issns:
+                issn_keys.append(issn_key(issn))
+                issn_rows.append(row)
+        
+        encoded = [value.encode("utf-8") for value in interned]  # dicts keep insertion order
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        
+        meta = {
+            "version": version,
+            "built_at": time.time(),
+            "last_updated_date": last_updated_date,
+        }
+        JournalStore._write(
+            Path(store_dir), np.array(ids, dtype=np.int64), numeric, string_ids, encoded, offsets,
+            build_hash_index(ids, list(range(count))), build_hash_index(issn_keys, issn_rows), meta
+        )
+        
+        logger.info(f"Built journal store with {count} sources ({len(encoded)} unique strings) in {store_dir}")
+        return count
+    
+    def patch(self, records: Iterator[Dict[str, Any]], store_dir: Path, version: int) -> Tuple[int, int]:
+        """
+        Write a new store version with changed records applied.
+        
+        Existing rows are overwritten in place and new sources are appended,
+        so the cost is a copy of the columns plus O(changed records); the
+        string table only grows by the delta's new strings and the hash
+        tables are extended rather than rebuilt (unless they fill up). ISSNs
+        an updated source no longer lists are removed from the ISSN table. This
+        store is left untouched, so readers keep using it until the new
+        version is published.
+        
+        Args:
+            records: Changed source records (later records win)
+            store_dir: Output directory for the new version
+            version: Version number of the new store
+        
+        Returns:
+            Tuple of (rows updated, rows added)
+        """
+        changed: Dict[int, Dict[str, Any]] = {}
+        for record in records:
+            key = openalex_key(record.get("id") or "")
+            if key:
+                changed[key] = record
+        
+        id_keys, id_rows = np.array(self.id_index[0]), np.array(self.id_index[1])
+        issn_keys, issn_rows = np.array(self.issn_index[0]), np.array(self.issn_index[1])
+        
+        count = len(self)
+        rows = {}
+        appended = []
+        for key in changed:
+            row = hash_lookup(id_keys, id_rows, key)
+            if row is None:
+                row = count + len(appended)
+                appended.append(key)
+            rows[key] = row
+        total = count + len(appended)
+        
+        # Forget the old ISSNs of updated sources; their current ones are re-added below
+        for key in changed:
+            row = rows[key]
+            if row < count:
+                old = self.record(row)
+                for issn in [old["issn_l"] or ""] + old["issn"]:
+                    if hash_lookup(issn_keys, issn_rows, issn_key(issn)) == row:
+                        _hash_delete(issn_keys, issn_rows, issn_key(issn))
+        
+        def grow(values: np.ndarray, fill) -> np.ndarray:
+            grown = np.full(total, fill, dtype=values.dtype)
+            grown[:count] = values
+            return grown
+        
+        ids = grow(np.asarray(self.openalex_ids), 0)
+        ids[count:] = appended
+        numeric = {column: grow(values, np.nan if column == "apc_usd" else 0)
+                   for column, values in self.numeric.items()}
+        string_ids = {column: grow(values, 0) for column, values in self.string_ids.items()}
+        
+        first_new = len(self.string_offsets) - 1
+        interned: Dict[str, int] = {}
+        new_issns = []
+        for key, record in changed.items():
+            row = rows[key]
+            numeric_values, string_values, issns = self._row_values(record)
+            for column, value in numeric_values.items():
+                numeric[column][row] = value
+            for column, value in string_values.items():
+                string_ids[column][row] = interned.setdefault(value, first_new + len(interned))
+            new_issns.extend((issn_key(issn), row) for issn in issns)
+        
+        encoded = [value.encode("utf-8") for value in interned]
+        offsets = np.empty(first_new + len(encoded) + 1, dtype=np.int64)
+        offsets[:first_new + 1] = self.string_offsets
+        offsets[first_new + 1:] = self.string_offsets[-1] + np.cumsum([len(value) for value in encoded])
+        
+        # Extend the hash tables, rebuilding them only past 50% load
+        if 2 * total > len(id_keys):
+            id_keys, id_rows = build_hash_index(ids.tolist(), list(range(total)))
+        else:
+            for key in appended:
+                _hash_insert(id_keys, id_rows, key, rows[key])
+        if 2 * (np.count_nonzero(issn_keys) + len(new_issns)) > len(issn_keys):
+            all_issns = [(int(k), int(r)) for k, r in zip(issn_keys, issn_rows) if k] + new_issns
+            issn_keys, issn_rows = build_hash_index([k for k, _ in all_issns], [r for _, r in all_issns])
+        else:
+            for key, row in new_issns:
+                _hash_insert(issn_keys, issn_rows, key, row)
+        
+        last_updated = max([self.meta.get("last_updated_date", "")] +
+                           [r.get("updated_date") or "" for r in changed.values()])
+        meta = {
+            "version": version,
+            "built_at": self.meta.get("built_at"),
+            "patched_at": time.time(),
+            "last_updated_date": last_updated,
+        }
+        
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        # Old strings are copied as one block; the new ones follow
+        self._write(store_dir, ids, numeric, string_ids, [bytes(self.strings)] + encoded, offsets,
+                    (id_keys, id_rows), (issn_keys, issn_rows), meta)
+        
+        updated = len(changed) - len(appended)
+        logger.info(f"Patched journal store v{version}: {updated} updated, {len(appended)} added")
+        return updated, len(appended)
+
+
+def resolve_store_dir(root: Path) -> Path:
+    """
+    Directory of the current store version under a store root.
+    
+    A versioned root holds v000001/, v000002/, ... and a CURRENT file naming
+    the live version; a plain store directory resolves to itself.
+    """
+    root = Path(root)
+    current = root / CURRENT_FILE
+    if current.exists():
+        return root / current.read_text(encoding="utf-8").strip()
+    return root
+
+
+def version_dir(root: Path, version: int) -> Path:
+    """Directory for a given store version under a store root."""
+    return Path(root) / f"v{version:06d}"
+
+
+def publish_version(root: Path, store_dir: Path):
+    """
+    Atomically make a store version current and prune old versions.
+    
+    CURRENT is replaced with os.replace, so readers see either the old or
+    the new version, never a partial one. Pruned versions stay readable by
+    processes that still have them mapped.
+    """
+    root = Path(root)
+    tmp_current = root / (CURRENT_FILE + ".tmp")
+    tmp_current.write_text(Path(store_dir).name, encoding="utf-8")
+    os.replace(tmp_current, root / CURRENT_FILE)
+    logger.info(f"Published journal store version {Path(store_dir).name}")
+    
+    versions = sorted(p for p in root.glob("v[0-9]*") if p.is_dir())
+    for old in versions[:-KEEP_VERSIONS]:
+        if old.name != Path(store_dir).name:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+class JournalStoreHandle:
+    """
+    Reader handle that follows the current version of a store root.
+    
+    Lookups never wait on an update: every REFRESH_INTERVAL seconds the
+    handle re-reads CURRENT and, if a new version was published, maps it
+    and swaps its reference. In-flight lookups finish on the old mapping.
+    """
+    
+    REFRESH_INTERVAL = 5.0  # seconds between CURRENT checks
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.store = JournalStore(resolve_store_dir(self.root))
+        self._checked_at = time.monotonic()
+        self._refresh_lock = threading.Lock()
+    
+    def _maybe_refresh(self):
+        if time.monotonic() - self._checked_at < self.REFRESH_INTERVAL:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # Another thread is already refreshing
+        try:
+            self._checked_at = time.monotonic()
+            target = resolve_store_dir(self.root)
+            if target != self.store.store_dir:
+                self.store = JournalStore(target)
+                logger.info(f"Switched to journal store version {self.store.data_version}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not switch journal store version: {e}")
+        finally:
+            self._refresh_lock.release()
+    
+    def __len__(self) -> int:
+        return len(self.store)
+    
+    @property
+    def data_version(self) -> int:
+        self._maybe_refresh()
+        return self.store.data_version
+    
+    def get(self, openalex_id: str) -> Optional[Dict[str, Any]]:
+        self._maybe_refresh()
+        return self.store.get(openalex_id)
+    
+    def get_by_issn(self, issn: str) -> Optional[Dict[str, Any]]:
+        self._maybe_refresh()
+        return self.store.get_by_issn(issn)
+
+
+def open_default_store() -> Optional[JournalStoreHandle]:
+    """
+    Open the store at JOURNAL_STORE_DIR (default: ./journal_store) if it exists.
+    
+    Returns:
+        JournalStoreHandle, or None if no store has been built
+    """
+    store_root = Path(os.getenv("JOURNAL_STORE_DIR", Path(__file__).parent / "journal_store"))
+    if not (resolve_store_dir(store_root) / "meta.json").exists():
+        return None
+    try:
+        started = time.perf_counter()
+        handle = JournalStoreHandle(store_root)
+        logger.info(f"Loaded journal store v{handle.store.data_version} ({len(handle)} sources) "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return handle
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not open journal store at {store_root}: {e}")
+        return None
+
+
+def main():
+    """Command-line entry point: build a store or look up a source."""
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "get"):
+        print(__doc__)
+        return
+    
+    if sys.argv[1] == "build":
+        source_dir = Path(sys.argv[2])
+        store_root = Path(sys.argv[3]) if len(sys.argv) > 3 else Path(__file__).parent / "journal_store"
+        partitions = discover_partitions(source_dir)
+        logger.info(f"Building journal store from {len(partitions)} partitions...")
+        store_root.mkdir(parents=True, exist_ok=True)
+        current = resolve_store_dir(store_root)
+        version = JournalStore(current).data_version + 1 if (current / "meta.json").exists() else 1
+        store_dir = version_dir(store_root, version)
+        JournalStore.build(iter_jsonl_records(partitions), store_dir, version)
+        publish_version(store_root, store_dir)
+    else:
+        store = JournalStore(resolve_store_dir(Path(sys.argv[2])))
+        key = sys.argv[3]
+        record = store.get_by_issn(key) if "-" in key else store.get(key)
+        print(json.dumps(record, indent=2, ensure_ascii=False) if record else f"{key} not found")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,319 @@
+"""
+Keyword Selectivity Table
+=========================
+Ranks candidate search keywords by how selective they are, using a local
+document-frequency table (keyword -> number of OpenAlex works matching it).
+
+The table is a JSON file that can be built offline with this script and is
+refreshed from cheap OpenAlex count probes (per_page=1) as new keywords are
+seen. Probe results are cached for PROBE_TTL seconds.
+
+Live requests only probe a few new keywords themselves and queue the rest;
+the queue is drained by the startup cache warm-up or with --pending. The
+table is shared by concurrent fetcher processes, so saves merge into the
+file under a lock (see state_files.py).
+
+Usage:
+    python keyword_selectivity.py format.json [more_criteria.json ...]
+    python keyword_selectivity.py --pending
+"""
+
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from state_files import update_json
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordSelectivity:
+    """
+    Choose the keyword subset most likely to give a tight, non-empty query.
+    
+    Keywords are ANDed, but keywords from one abstract are strongly
+    correlated, so the expected result size uses exponential backoff rather
+    than full independence: N * s1 * s2^(1/2) * s3^(1/4) ... with s_i = df_i / N
+    sorted most selective first. Keywords are added in that order while the
+    estimate stays above a floor.
+    """
+    
+    DEFAULT_TABLE_FILE = Path(__file__).parent / "keyword_df.json"
+    PROBE_TTL = 7 * 24 * 3600  # seconds before a probed count is refreshed
+    DEFAULT_TOTAL_WORKS = 250_000_000  # Approximate size of the OpenAlex works corpus
+    GENERIC_FRACTION = 0.002  # Keywords matching more than this share of the corpus are generic
+    MAX_PENDING = 500  # Queued keywords awaiting a probe
+    
+    def __init__(self, table_file: Optional[Path] = None):
+        """
+        Load the document-frequency table (an empty table if missing).
+        
+        Args:
+            table_file: Path to the JSON table (default: keyword_df.json)
+        """
+        self.table_file = Path(table_file) if table_file else self.DEFAULT_TABLE_FILE
+        self.total_works = self.DEFAULT_TOTAL_WORKS
+        self.terms: Dict[str, Dict[str, float]] = {}
+        self.pending: Dict[str, float] = {}  # keyword -> time it was queued for a probe
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+    
+    @staticmethod
+    def normalize(keyword: str) -> str:
+        """Normalize a keyword for table lookups."""
+        return ' '.join(keyword.lower().split())
+    
+    def load(self):
+        """Load the table from disk, ignoring a missing or corrupt file."""
+        try:
+            with open(self.table_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.total_works = data.get('total_works', self.DEFAULT_TOTAL_WORKS)
+            self.terms = data.get('terms', {})
+            self.pending = data.get('pending', {})
+            logger.debug(f"Loaded {len(self.terms)} keyword frequencies from {self.table_file}")
+        except FileNotFoundError:
+            logger.debug(f"No keyword frequency table at {self.table_file}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load keyword frequency table: {e}")
+    
+    def _merge(self, data: Optional[Dict]) -> Dict:
+        """Merge this process's table into the file's contents (newest probe wins)."""
+        data = data or {}
+        terms = dict(data.get('terms', {}))
+        with self._lock:
+            for keyword, entry in self.terms.items():
+                if entry.get('updated', 0) >= terms.get(keyword, {}).get('updated', 0):
+                    terms[keyword] = entry
+            pending = {**data.get('pending', {}), **self.pending}
+        # Drop queued keywords that some process has probed since they were queued
+        pending = {
+            keyword: queued for keyword, queued in pending.items()
+            if terms.get(keyword, {}).get('updated', 0) < queued
+        }
+        pending = dict(sorted(pending.items(), key=lambda item: item[1])[:self.MAX_PENDING])
+        return {'total_works': data.get('total_works', self.total_works), 'terms': terms, 'pending': pending}
+    
+    def save(self):
+        """Merge the table into the shared file if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+        self.sync()
+    
+    def sync(self):
+        """Merge the table with the shared file, picking up other processes' probes and queued keywords."""
+        with self._lock:
+            self._dirty = False
+        
+        try:
+            data = update_json(self.table_file, self._merge, indent=1, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"Could not save keyword frequency table: {e}")
+            with self._lock:
+                self._dirty = True
+            return
+        # Pick up other processes' probes without dropping any recorded meanwhile
+        with self._lock:
+            self.total_works = data['total_works']
+            for keyword, entry in data['terms'].items():
+                if entry.get('updated', 0) >= self.terms.get(keyword, {}).get('updated', 0):
+                    self.terms[keyword] = entry
+            self.pending = {
+                keyword: queued for keyword, queued in {**data['pending'], **self.pending}.items()
+                if self.terms.get(keyword, {}).get('updated', 0) < queued
+            }
+    
+    def document_frequency(self, keyword: str) -> Optional[int]:
+        """
+        Look up the number of works matching a keyword.
+        
+        Args:
+            keyword: Keyword to look up
+        
+        Returns:
+            Work count, or None if unknown
+        """
+        entry = self.terms.get(self.normalize(keyword))
+        return int(entry['count']) if entry else None
+    
+    def stale_keywords(self, keywords: List[str]) -> List[str]:
+        """
+        Return keywords that are missing from the table or older than PROBE_TTL.
+        
+        Args:
+            keywords: Candidate keywords
+        
+        Returns:
+            Keywords that should be (re)probed
+        """
+        now = time.time()
+        stale = []
+        for keyword in keywords:
+            entry = self.terms.get(self.normalize(keyword))
+            if entry is None or now - entry.get('updated', 0) > self.PROBE_TTL:
+                stale.append(keyword)
+        return stale
+    
+    def record(self, keyword: str, count: int):
+        """
+        Store a probed work count for a keyword.
+        
+        Args:
+            keyword: Probed keyword
+            count: Number of matching works
+        """
+        keyword = self.normalize(keyword)
+        with self._lock:
+            self.terms[keyword] = {'count': int(count), 'updated': time.time()}
+            self.pending.pop(keyword, None)
+            self._dirty = True
+    
+    def queue_probes(self, keywords: List[str]):
+        """
+        Queue stale keywords to be probed later (off the request path).
+        
+        Args:
+            keywords: Keywords missing from the table or older than PROBE_TTL
+        """
+        now = time.time()
+        with self._lock:
+            for keyword in keywords:
+                keyword = self.normalize(keyword)
+                if keyword and keyword not in self.pending and len(self.pending) < self.MAX_PENDING:
+                    self.pending[keyword] = now
+                    self._dirty = True
+    
+    def pending_keywords(self, limit: Optional[int] = None) -> List[str]:
+        """
+        Queued keywords, oldest first.
+        
+        Args:
+            limit: Maximum number returned (None = all)
+        
+        Returns:
+            Keywords awaiting a probe
+        """
+        with self._lock:
+            queued = sorted(self.pending, key=self.pending.get)
+        return queued[:limit] if limit is not None else queued
+    
+    def refresh(self, keywords: List[str], probe: Callable[[str], Optional[int]]):
+        """
+        Probe stale keywords and cache the results.
+        
+        Args:
+            keywords: Candidate keywords
+            probe: Function returning the work count for a keyword (None on failure)
+        """
+        for keyword in self.stale_keywords(keywords):
+            count = probe(keyword)
+            if count is not None:
+                self.record(keyword, count)
+        self.save()
+    
+    def select_keywords(self, keywords: List[str], max_keywords: int = 5,
+                        min_expected: int = 30, base_count: Optional[int] = None) -> List[str]:
+        """
+        Choose the keyword subset most likely to return a tight, non-empty set.
+        
+        Args:
+            keywords: Candidate keywords (Gemini order)
+            max_keywords: Maximum number of keywords to AND together
+            min_expected: Floor on the estimated number of matching works
+            base_count: Estimated works matching the rest of the query
+                (e.g. the subject area), if known
+        
+        Returns:
+            Selected keywords, most selective first. Falls back to
+            keywords[:max_keywords] when the table knows too few of them.
+        """
+        known = []
+        for position, keyword in enumerate(keywords):
+            df = self.document_frequency(keyword)
+            if df is not None:
+                known.append((df, position, keyword))
+        
+        if not known or len(known) < min(max_keywords, len(keywords)):
+            return keywords[:max_keywords]
+        
+        total = max(self.total_works, 1)
+        generic_limit = total * self.GENERIC_FRACTION
+        
+        # Most selective first; Gemini's order breaks ties
+        ranked = sorted(known)
+        specific = [item for item in ranked if item[0] <= generic_limit]
+        generic = [item for item in ranked if item[0] > generic_limit]
+        
+        floor = math.log(max(min_expected, 1))
+        start = math.log(base_count if base_count else total)
+        
+        def pick(pool):
+            expected = start
+            chosen = []
+            for df, _, keyword in pool:
+                if len(chosen) >= max_keywords:
+                    break
+                if df < min_expected:
+                    continue  # Too rare to match anything when ANDed with the rest
+                # Exponential backoff: the k-th term counts with weight 1/2^k
+                narrowed = expected + math.log(df / total) / (2 ** len(chosen))
+                if narrowed < floor:
+                    continue
+                chosen.append(keyword)
+                expected = narrowed
+            return chosen, expected
+        
+        # Generic terms are only ANDed in when no specific keyword fits
+        selected, expected = pick(specific)
+        if not selected:
+            selected, expected = pick(generic)
+        if not selected:
+            # Nothing fits above the floor: keep the best-populated keyword
+            selected = [max(known)[2]]
+        
+        logger.debug(f"Selected keywords (est. {math.exp(expected):.0f} works): {selected}")
+        return selected
+
+
+def main():
+    """Build or refresh the keyword frequency table from criteria files."""
+    from fetch_journals import OpenAlexJournalFetcher
+    
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    
+    fetcher = OpenAlexJournalFetcher()
+    table = KeywordSelectivity()
+    
+    if sys.argv[1] == '--pending':
+        pending = table.pending_keywords()
+        logger.info(f"Probing {len(pending)} queued keywords...")
+        table.refresh(pending, lambda keyword: fetcher.probe_query_count({}, keyword))
+        logger.info(f"Keyword frequency table now holds {len(table.terms)} keywords: {table.table_file}")
+        return
+    
+    keywords = []
+    for criteria_file in sys.argv[1:]:
+        criteria = fetcher.load_search_criteria(criteria_file)
+        if criteria:
+            keywords.extend(criteria.get('keywords', []))
+            if criteria.get('subjectArea'):
+                keywords.append(criteria['subjectArea'])
+    
+    stale = table.stale_keywords(keywords)
+    logger.info(f"Probing {len(stale)} of {len(keywords)} keywords...")
+    table.refresh(stale, lambda keyword: fetcher.probe_query_count({}, keyword))
+    logger.info(f"Keyword frequency table now holds {len(table.terms)} keywords: {table.table_file}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
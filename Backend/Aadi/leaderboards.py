@@ -0,0 +1,248 @@
+"""
+Subject Leaderboards
+====================
+Materialized top journals per subject area, with and without the open
+access filter, ranked by the fetcher's calculate_journal_score weights.
+
+The API server serves these instantly as provisional results when the
+personalized pipeline misses its deadline or an upstream is down, then
+upgrades to the full result. Leaderboards are refreshed in the background
+for the configured subjects plus the most requested ones.
+
+Subjects are keyed by their OpenAlex topic/field filter when the subject
+index resolves them ("CV" and "computer vision" share a leaderboard), else
+by the normalized text.
+
+Usage:
+    python leaderboards.py refresh ["<subject>" ...]
+    python leaderboards.py show "<subject>"
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from subject_index import normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderboardStore:
+    """
+    Leaderboards and subject request counts, persisted to one JSON file.
+    """
+
+    DEFAULT_FILE = Path(__file__).parent / "leaderboards.json"
+    MAX_TRACKED_SUBJECTS = 500  # Request counters kept (least requested dropped first)
+
+    def __init__(self, path: Optional[Path] = None, subject_index=None):
+        """
+        Args:
+            path: Leaderboard file (default: LEADERBOARD_FILE or ./leaderboards.json)
+            subject_index: Optional SubjectIndex used to key subjects by topic
+        """
+        self.path = Path(path or os.getenv("LEADERBOARD_FILE", self.DEFAULT_FILE))
+        self.subject_index = subject_index
+        self._lock = threading.Lock()
+        self.boards: Dict[str, Dict[str, Any]] = {}
+        self.requests: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def subject_key(self, subject: str) -> str:
+        """Leaderboard key of a subject area."""
+        if self.subject_index is not None:
+            subject_filter = self.subject_index.works_filter(subject)
+            if subject_filter:
+                return subject_filter
+        return normalize_name(subject)
+
+    def get(self, subject: str, open_access: bool) -> Optional[Dict[str, Any]]:
+        """
+        Leaderboard of a subject.
+
+        Args:
+            subject: Free-text subject area
+            open_access: Whether only open access journals were requested
+
+        Returns:
+            {'journals': [...], 'refreshed_at': ...} or None if not materialized
+        """
+        board = self.boards.get(self.subject_key(subject))
+        if not board:
+            return None
+        journals = board.get("oa" if open_access else "any")
+        if not journals:
+            return None
+        return {"journals": journals, "refreshed_at": board.get("refreshed_at")}
+
+    def record_request(self, subject: str):
+        """Count a request for a subject (drives which leaderboards are refreshed)."""
+        key = self.subject_key(subject)
+        if not key:
+            return
+        with self._lock:
+            entry = self.requests.setdefault(key, {"subject": subject, "count": 0})
+            entry["count"] += 1
+            if len(self.requests) > self.MAX_TRACKED_SUBJECTS:
+                least = min(self.requests, key=lambda k: self.requests[k]["count"])
+                del self.requests[least]
+
+    def popular_subjects(self, limit: int) -> List[str]:
+        """Most requested subjects, as originally typed."""
+        with self._lock:
+            ranked = sorted(self.requests.values(), key=lambda entry: entry["count"], reverse=True)
+        return [entry["subject"] for entry in ranked[:limit]]
+
+    def put(self, subject: str, any_journals: List[Dict[str, Any]], oa_journals: List[Dict[str, Any]]):
+        """Store a refreshed leaderboard."""
+        with self._lock:
+            self.boards[self.subject_key(subject)] = {
+                "subject": subject,
+                "any": any_journals,
+                "oa": oa_journals,
+                "refreshed_at": time.time(),
+            }
+
+    def load(self):
+        """Load persisted leaderboards (empty if missing or corrupt)."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.boards = state.get("boards", {})
+            self.requests = state.get("requests", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load leaderboards: {e}")
+
+    def save(self):
+        """Persist leaderboards atomically."""
+        with self._lock:
+            state = {"boards": self.boards, "requests": self.requests}
+            tmp_path = self.path.with_suffix(".tmp")
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not save leaderboards: {e}")
+
+
+class LeaderboardRefresher:
+    """
+    Rebuild leaderboards with the journal fetcher, on demand or on a schedule.
+    """
+
+    def __init__(self, fetcher, store: LeaderboardStore, subjects: Optional[List[str]] = None,
+                 max_subjects: int = 40):
+        """
+        Args:
+            fetcher: OpenAlexJournalFetcher
+            store: Leaderboard store to update
+            subjects: Subjects always kept fresh (e.g. from LEADERBOARD_SUBJECTS)
+            max_subjects: Upper bound on subjects refreshed per round
+        """
+        self.fetcher = fetcher
+        self.store = store
+        self.subjects = subjects or []
+        self.max_subjects = max_subjects
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def build_leaderboard(self, subject: str, open_access: bool) -> List[Dict[str, Any]]:
+        """
+        Top journals for a subject alone (no paper keywords).
+
+        Args:
+            subject: Subject area
+            open_access: Restrict to open access works
+
+        Returns:
+            Formatted journals (fetcher output format), best first
+        """
+        criteria = {"subjectArea": subject, "keywords": [], "openAccess": 1 if open_access else 0}
+        candidates = self.fetcher.gather_candidates(criteria)
+        return self.fetcher.rank_candidates(candidates) if candidates else []
+
+    def refresh_subject(self, subject: str) -> bool:
+        """Rebuild both leaderboards of a subject. Returns True if anything was found."""
+        any_journals = self.build_leaderboard(subject, open_access=False)
+        oa_journals = self.build_leaderboard(subject, open_access=True)
+        if not any_journals and not oa_journals:
+            logger.warning(f"No leaderboard journals found for '{subject}'")
+            return False
+        self.store.put(subject, any_journals, oa_journals)
+        return True
+
+    def subjects_to_refresh(self) -> List[str]:
+        """Configured subjects first, then the most requested ones (one per leaderboard key)."""
+        subjects, keys = [], set()
+        for subject in self.subjects + self.store.popular_subjects(self.max_subjects):
+            key = self.store.subject_key(subject)
+            if key and key not in keys:
+                keys.add(key)
+                subjects.append(subject)
+        return subjects[:self.max_subjects]
+
+    def refresh_all(self) -> int:
+        """
+        Refresh every scheduled subject.
+
+        Returns:
+            Number of subjects refreshed
+        """
+        refreshed = 0
+        for subject in self.subjects_to_refresh():
+            if self._stop.is_set():
+                break
+            try:
+                refreshed += self.refresh_subject(subject)
+            except Exception as e:
+                logger.warning(f"Leaderboard refresh failed for '{subject}': {e}")
+        self.store.save()
+        logger.info(f"Refreshed {refreshed} subject leaderboards")
+        return refreshed
+
+    def start(self, interval_seconds: float):
+        """Refresh now and then every interval_seconds on a daemon thread."""
+        def run():
+            while not self._stop.is_set():
+                self.refresh_all()
+                self._stop.wait(interval_seconds)
+
+        self._thread = threading.Thread(target=run, name="leaderboard-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh after the current subject."""
+        self._stop.set()
+
+
+def main():
+    """Command-line entry point: refresh or show leaderboards."""
+    if len(sys.argv) < 2 or sys.argv[1] not in ("refresh", "show"):
+        print(__doc__)
+        return
+
+    from fetch_journals import OpenAlexJournalFetcher
+    fetcher = OpenAlexJournalFetcher()
+    store = LeaderboardStore(subject_index=fetcher.subject_index)
+
+    if sys.argv[1] == "refresh":
+        configured = [s.strip() for s in os.getenv("LEADERBOARD_SUBJECTS", "").split(",") if s.strip()]
+        LeaderboardRefresher(fetcher, store, sys.argv[2:] or configured).refresh_all()
+    elif len(sys.argv) > 2:
+        for open_access in (False, True):
+            board = store.get(sys.argv[2], open_access)
+            label = "open access" if open_access else "any"
+            print(f"{label}: " + (", ".join(j["journal_name"] for j in board["journals"]) if board else "none"))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
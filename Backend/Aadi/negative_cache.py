@@ -0,0 +1,242 @@
+"""
+Negative Query Cache
+====================
+Remembers OpenAlex query shapes that recently returned zero or too few
+works, so the fetcher can skip straight to a broader shape instead of
+paying a round trip to rediscover an empty result.
+
+Two structures share the job:
+- A small TTL map holds the most recent fingerprints exactly.
+- A pair of Bloom filters (current + previous generation) holds the long
+  tail in constant memory. Generations last half the TTL on a clock shared
+  by all processes, so a Bloom entry is forgotten within TTL_SECONDS as
+  well and queries recover once the OpenAlex corpus has been updated.
+  An expired TTL entry is never answered from the Bloom filters.
+
+State is persisted to a small file because the fetcher usually runs as a
+short-lived subprocess. Concurrent processes merge their entries into it
+under a lock (see state_files.py).
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from state_files import update_json
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over string keys (double hashing on BLAKE2b)."""
+    
+    def __init__(self, num_bits: int, num_hashes: int, bits: Optional[bytes] = None):
+        """
+        Args:
+            num_bits: Filter size in bits (multiple of 8)
+            num_hashes: Bit positions set per key
+            bits: Existing filter contents to restore
+        """
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits) if bits else bytearray(num_bits // 8)
+    
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+    
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+
+class NegativeQueryCache:
+    """
+    Bloom filter + TTL map of query fingerprints known to return too little.
+    """
+    
+    DEFAULT_STATE_FILE = Path(__file__).parent / "negative_cache.json"
+    NUM_BITS = 1 << 16  # 8 KB per generation, ~5k entries at 1% false positives
+    NUM_HASHES = 7
+    TTL_SECONDS = 3600  # entries expire after this long
+    ROTATION_INTERVAL = TTL_SECONDS // 2  # seconds per Bloom generation
+    MAX_TTL_ENTRIES = 256
+    
+    def __init__(self, state_file: Optional[Path] = None):
+        """
+        Load persisted state (a fresh cache if missing or corrupt).
+        
+        Args:
+            state_file: Path to the persisted state (default: negative_cache.json)
+        """
+        self.state_file = Path(state_file) if state_file else self.DEFAULT_STATE_FILE
+        self._lock = threading.Lock()
+        self.current = BloomFilter(self.NUM_BITS, self.NUM_HASHES)
+        self.previous = BloomFilter(self.NUM_BITS, self.NUM_HASHES)
+        self.generation = self._generation_now()
+        self.recent: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._dirty = False
+        self.load()
+    
+    @staticmethod
+    def fingerprint(params: Dict[str, Any]) -> str:
+        """
+        Canonical fingerprint of a /works query.
+        
+        Search terms are lowercased and the keywords inside each
+        parenthesized group are sorted, so reordered keyword lists map to the
+        same fingerprint. Filters are part of the key (is_oa:true differs).
+        
+        Args:
+            params: /works request parameters
+        
+        Returns:
+            Fingerprint string
+        """
+        search = ' '.join(str(params.get('search', '')).lower().split())
+        
+        def sort_group(match):
+            operator = ' or ' if ' or ' in match.group(1) else ' and '
+            terms = sorted(term.strip() for term in match.group(1).split(operator))
+            return '(' + operator.join(terms) + ')'
+        
+        search = re.sub(r'\(([^()]*)\)', sort_group, search)
+        filters = ','.join(sorted(str(params.get('filter', '')).split(',')))
+        return f"{search}|{filters}"
+    
+    def _generation_now(self) -> int:
+        return int(time.time() // self.ROTATION_INTERVAL)
+    
+    def _rotate_if_due(self):
+        generation = self._generation_now()
+        if generation == self.generation:
+            return
+        self.previous = self.current if generation == self.generation + 1 else BloomFilter(self.NUM_BITS, self.NUM_HASHES)
+        self.current = BloomFilter(self.NUM_BITS, self.NUM_HASHES)
+        self.generation = generation
+        self._dirty = True
+        logger.debug("Rotated negative cache generation")
+    
+    def is_negative(self, params: Dict[str, Any]) -> bool:
+        """
+        Check whether a query recently returned zero or too few works.
+        
+        Args:
+            params: /works request parameters
+        
+        Returns:
+            True if the query is (probably) known to be too narrow
+        """
+        key = self.fingerprint(params)
+        with self._lock:
+            self._rotate_if_due()
+            entry = self.recent.get(key)
+            if entry is not None:
+                if entry['expires'] > time.time():
+                    return True
+                del self.recent[key]
+                return False  # Expired: the TTL map is authoritative over the Bloom filters
+            return key in self.current or key in self.previous
+    
+    def record(self, params: Dict[str, Any], count: int):
+        """
+        Remember a query that returned too few works.
+        
+        Args:
+            params: /works request parameters
+            count: Number of works the query matched
+        """
+        key = self.fingerprint(params)
+        with self._lock:
+            self._rotate_if_due()
+            self.recent[key] = {'count': count, 'expires': time.time() + self.TTL_SECONDS}
+            self.recent.move_to_end(key)
+            while len(self.recent) > self.MAX_TTL_ENTRIES:
+                self.recent.popitem(last=False)
+            self.current.add(key)
+            self._dirty = True
+    
+    def load(self):
+        """Restore persisted state, starting fresh if missing or corrupt."""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            with self._lock:
+                self._absorb(state)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load negative cache: {e}")
+    
+    def _compatible(self, state: Optional[Dict[str, Any]]) -> bool:
+        """Whether persisted state has this cache's filter geometry and generation clock."""
+        return bool(state) and (state.get('num_bits'), state.get('num_hashes'), state.get('rotation_interval')) == (
+            self.NUM_BITS, self.NUM_HASHES, self.ROTATION_INTERVAL)
+    
+    def _absorb(self, state: Optional[Dict[str, Any]]):
+        """
+        Merge persisted state into memory (ignored if incompatible).
+        
+        Bloom generations are ORed together by generation number and TTL
+        entries keep the later expiry, so nothing recorded on either side
+        is lost. Must be called with self._lock held.
+        """
+        if not self._compatible(state):
+            return  # Filter geometry or generation length changed: start fresh
+        self._rotate_if_due()
+        for generation, name in ((state['generation'], 'current'), (state['generation'] - 1, 'previous')):
+            target = {self.generation: self.current, self.generation - 1: self.previous}.get(generation)
+            if target is not None:
+                merged = int.from_bytes(target.bits, 'little') | int.from_bytes(base64.b64decode(state[name]), 'little')
+                target.bits = bytearray(merged.to_bytes(self.NUM_BITS // 8, 'little'))
+        now = time.time()
+        for key, entry in state.get('recent', {}).items():
+            if entry['expires'] > now and entry['expires'] > self.recent.get(key, {}).get('expires', 0):
+                self.recent[key] = entry
+        self.recent = OrderedDict(sorted(self.recent.items(), key=lambda item: item[1]['expires'])[-self.MAX_TTL_ENTRIES:])
+    
+    def _snapshot(self) -> Dict[str, Any]:
+        """Persistable state. Must be called with self._lock held."""
+        return {
+            'num_bits': self.NUM_BITS,
+            'num_hashes': self.NUM_HASHES,
+            'rotation_interval': self.ROTATION_INTERVAL,
+            'generation': self.generation,
+            'current': base64.b64encode(bytes(self.current.bits)).decode('ascii'),
+            'previous': base64.b64encode(bytes(self.previous.bits)).decode('ascii'),
+            'recent': dict(self.recent)
+        }
+    
+    def _merge(self, state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge the persisted state into memory and return the union to write back."""
+        with self._lock:
+            self._absorb(state)
+            return self._snapshot()
+    
+    def save(self):
+        """Merge state into the shared file if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        
+        try:
+            update_json(self.state_file, self._merge)
+        except OSError as e:
+            logger.warning(f"Could not save negative cache: {e}")
+            with self._lock:
+                self._dirty = True
@@ -0,0 +1,281 @@
+"""
+Shared Upstream Rate Limiter
+============================
+Token buckets for the upstream APIs (OpenAlex, Gemini), shared by every
+process on the host through one small SQLite file, so several uvicorn
+workers and pipeline subprocesses stay inside one combined budget instead
+of each assuming it has the whole quota.
+
+- Each bucket refills at `rate` tokens per second up to `burst` tokens;
+  a call takes one token or waits until one is available. Calls that
+  wait while holding an upstream concurrency slot use take(), whose wait
+  is bounded, so a drained bucket cannot pin the slot.
+- A 429/503 with Retry-After (or a Gemini retry delay) blocks the bucket
+  for every process until that time, so one throttled worker does not
+  leave the others to collect 429s of their own.
+- Retries back off exponentially with full jitter.
+- Background work (e.g. cache warm-up) can charge its requests to an
+  extra budget bucket with charge_to(), on top of the upstream bucket.
+
+Buckets are read and updated in one BEGIN IMMEDIATE transaction, which
+serializes concurrent acquires across processes. If the database cannot
+be opened the limiter fails open (calls are not delayed).
+
+Configuration (environment):
+    RATE_LIMIT_DB                 SQLite file (default: ./rate_limits.db)
+    OPENALEX_REQUESTS_PER_SECOND  default 10 (OpenAlex polite pool)
+    GEMINI_REQUESTS_PER_MINUTE    default 15
+"""
+
+import contextvars
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from cancellation import sleep as cancellable_sleep
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY_PATTERN = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+# Extra budget buckets charged for every upstream request made in the current context
+_charged_buckets: contextvars.ContextVar[Tuple[str, ...]] = contextvars.ContextVar("charged_buckets", default=())
+
+
+@contextmanager
+def charge_to(bucket: str) -> Iterator[None]:
+    """Charge upstream requests made in this block to an extra bucket (see RateLimiter.acquire_charged)."""
+    token = _charged_buckets.set(_charged_buckets.get() + (bucket,))
+    try:
+        yield
+    finally:
+        _charged_buckets.reset(token)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta seconds or HTTP date).
+    
+    Returns:
+        Seconds to wait, or None if missing or unparseable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def gemini_retry_delay(error: Exception) -> Optional[float]:
+    """Retry delay the Gemini API attached to a quota error, if any."""
+    match = RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether a Gemini client error is a quota/429 error (google.api_core ResourceExhausted)."""
+    return getattr(error, "code", None) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+class RateLimiter:
+    """
+    Cross-process token buckets persisted in SQLite.
+    """
+    
+    DEFAULT_DB = Path(__file__).parent / "rate_limits.db"
+    
+    def __init__(self, db_path: Optional[Path] = None, buckets: Optional[Dict[str, Tuple[float, float]]] = None):
+        """
+        Args:
+            db_path: SQLite file shared by all processes (default: RATE_LIMIT_DB or ./rate_limits.db)
+            buckets: Bucket name -> (tokens per second, burst size)
+        """
+        self.db_path = Path(db_path or os.getenv("RATE_LIMIT_DB", self.DEFAULT_DB))
+        self.buckets = buckets or {}
+        self._disabled = False
+        try:
+            with self._connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "name TEXT PRIMARY KEY, tokens REAL, updated REAL, blocked_until REAL)"
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter disabled, could not open {self.db_path}: {e}")
+            self._disabled = True
+    
+    def add_bucket(self, name: str, rate: float, burst: float):
+        """Register another bucket (e.g. one per Gemini API key); existing buckets are kept."""
+        self.buckets.setdefault(name, (rate, burst))
+    
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=10, isolation_level=None))
+    
+    def _take(self, db: sqlite3.Connection, name: str) -> float:
+        """
+        Take a token if one is available (inside a write transaction).
+        
+        Returns:
+            0 if a token was taken, else seconds until one could be
+        """
+        rate, burst = self.buckets[name]
+        now = time.time()
+        row = db.execute("SELECT tokens, updated, blocked_until FROM buckets WHERE name = ?", (name,)).fetchone()
+        tokens, updated, blocked_until = row if row else (burst, now, 0.0)
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+        
+        wait = 0.0
+        if blocked_until > now:
+            wait = blocked_until - now
+        elif tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        db.execute(
+            "INSERT OR REPLACE INTO buckets (name, tokens, updated, blocked_until) VALUES (?, ?, ?, ?)",
+            (name, tokens, now, blocked_until)
+        )
+        return wait
+    
+    def acquire(self, name: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a token from a bucket.
+        
+        Args:
+            name: Bucket name
+            timeout: Maximum seconds to wait (None = wait as long as needed)
+        
+        Returns:
+            True if a token was taken, False on timeout
+        
+        Raises:
+            RequestCancelled: if the request waiting for the token was cancelled
+        """
+        if self._disabled or name not in self.buckets:
+            return True
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            try:
+                with self._connect() as db:
+                    db.execute("BEGIN IMMEDIATE")
+                    try:
+                        wait = self._take(db, name)
+                        db.execute("COMMIT")
+                    except BaseException:
+                        db.execute("ROLLBACK")
+                        raise
+            except sqlite3.Error as e:
+                logger.warning(f"Rate limiter error on '{name}', not limiting: {e}")
+                return True
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            cancellable_sleep(wait)
+    
+    def take(self, name: str, timeout: float):
+        """
+        Wait a bounded time for a token, for callers holding an upstream slot while they wait.
+        
+        Args:
+            name: Bucket name
+            timeout: Maximum seconds to wait
+        
+        Raises:
+            TimeoutError: if no token was available within timeout
+            RequestCancelled: if the request waiting for the token was cancelled
+        """
+        if not self.acquire(name, timeout):
+            raise TimeoutError(f"No '{name}' rate limit token within {timeout:.0f}s")
+    
+    def acquire_charged(self):
+        """
+        Take a token from every budget bucket of the enclosing charge_to() blocks.
+        
+        Callers do this before queueing for an upstream concurrency slot, so
+        background work waits for its budget without holding a slot.
+        
+        Raises:
+            RequestCancelled: if the work waiting for its budget was cancelled
+        """
+        for bucket in _charged_buckets.get():
+            self.acquire(bucket)
+    
+    def available(self, name: str) -> Optional[float]:
+        """
+        Tokens a bucket could hand out now, without taking one.
+        
+        Returns:
+            Available tokens (0 while blocked), or None if the bucket is unknown or the limiter disabled
+        """
+        if self._disabled or name not in self.buckets:
+            return None
+        rate, burst = self.buckets[name]
+        now = time.time()
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT tokens, updated, blocked_until FROM buckets WHERE name = ?", (name,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if not row:
+            return burst
+        tokens, updated, blocked_until = row
+        return 0.0 if blocked_until > now else min(burst, tokens + max(0.0, now - updated) * rate)
+    
+    def block(self, name: str, seconds: float):
+        """Stop handing out tokens from a bucket for `seconds` (e.g. from Retry-After)."""
+        if self._disabled or name not in self.buckets or seconds <= 0:
+            return
+        until = time.time() + seconds
+        try:
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute(
+                    "INSERT INTO buckets (name, tokens, updated, blocked_until) VALUES (?, 0, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET tokens = 0, updated = excluded.updated, "
+                    "blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                    (name, time.time(), until)
+                )
+                db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter error on '{name}': {e}")
+        logger.warning(f"Upstream '{name}' throttled, pausing for {seconds:.1f}s")
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> RateLimiter:
+    """The process-wide limiter with the 'openalex' and 'gemini' buckets."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            openalex_rate = float(os.getenv("OPENALEX_REQUESTS_PER_SECOND", "10"))
+            gemini_rate = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15")) / 60
+            _shared_limiter = RateLimiter(buckets={
+                "openalex": (openalex_rate, max(1.0, openalex_rate)),
+                "gemini": (gemini_rate, max(1.0, gemini_rate * 60)),
+            })
+        return _shared_limiter
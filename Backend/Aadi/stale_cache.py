@@ -0,0 +1,92 @@
+"""
+Stale Response Cache
+====================
+Last good OpenAlex response per request, returned by the fetcher while
+OpenAlex is failing or its circuit is open.
+
+The fetcher usually runs as a short-lived subprocess per request, so an
+in-memory cache would always be empty. Responses are kept in one small
+SQLite file shared by every process on the host instead (like the token
+buckets in rate_limiter.py), as zlib-compressed JSON. Beyond max_entries
+the least recently stored responses are dropped. If the database cannot
+be opened the cache is disabled (every lookup misses).
+
+Configuration (environment):
+    STALE_CACHE_DB  SQLite file (default: ./stale_responses.db)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StaleResponseCache:
+    """
+    Cross-process last-good-response store persisted in SQLite.
+    """
+    
+    DEFAULT_DB = Path(__file__).parent / "stale_responses.db"
+    
+    def __init__(self, db_path: Optional[Path] = None, max_entries: int = 512):
+        """
+        Args:
+            db_path: SQLite file shared by all processes (default: STALE_CACHE_DB or ./stale_responses.db)
+            max_entries: Responses kept (least recently stored dropped first)
+        """
+        self.db_path = Path(db_path or os.getenv("STALE_CACHE_DB", self.DEFAULT_DB))
+        self.max_entries = max_entries
+        self._disabled = False
+        try:
+            with self._connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, data BLOB, stored_at REAL)")
+                db.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at)")
+        except sqlite3.Error as e:
+            logger.warning(f"Stale response cache disabled, could not open {self.db_path}: {e}")
+            self._disabled = True
+    
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=10, isolation_level=None))
+    
+    def put(self, key: str, data: Dict[str, Any]):
+        """Store the latest good response for a request key."""
+        if self._disabled:
+            return
+        blob = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        try:
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute("INSERT OR REPLACE INTO responses (key, data, stored_at) VALUES (?, ?, ?)",
+                           (key, blob, time.time()))
+                db.execute(
+                    "DELETE FROM responses WHERE stored_at < "
+                    "(SELECT stored_at FROM responses ORDER BY stored_at DESC LIMIT 1 OFFSET ?)",
+                    (self.max_entries - 1,)
+                )
+                db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store stale response: {e}")
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Last good response for a request key.
+        
+        Returns:
+            Response JSON data, or None if none was stored
+        """
+        if self._disabled:
+            return None
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT data FROM responses WHERE key = ?", (key,)).fetchone()
+            return json.loads(zlib.decompress(row[0])) if row else None
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            logger.warning(f"Could not read stale response: {e}")
+            return None
@@ -0,0 +1,109 @@
+"""
+Shared JSON State Files
+=======================
+Read-merge-write helpers for the small JSON state files that concurrent
+fetcher processes share (keyword frequency table, negative query cache).
+
+A save takes an exclusive lock on the sidecar "<file>.lock", re-reads the
+file, merges its own changes into what other processes wrote meanwhile and
+replaces the file through a uniquely named temporary file. Concurrent
+saves therefore neither clobber each other's temporary file nor lose each
+other's updates.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive inter-process lock for a state file.
+    
+    Args:
+        path: State file (the lock is taken on "<path>.lock")
+    """
+    lock_path = path.with_name(path.name + '.lock')
+    with open(lock_path, 'a+b') as handle:
+        if fcntl:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_json_atomic(path: Path, data: Any, **dump_kwargs):
+    """
+    Replace a JSON file atomically through a uniquely named temporary file.
+    
+    Args:
+        path: Target file
+        data: JSON-serializable data
+        **dump_kwargs: Passed to json.dump
+    """
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=path.parent, prefix=path.name + '.',
+                                     suffix='.tmp', delete=False) as f:
+        tmp_file = f.name
+        try:
+            json.dump(data, f, **dump_kwargs)
+        except Exception:
+            f.close()
+            os.unlink(tmp_file)
+            raise
+    try:
+        os.replace(tmp_file, path)
+    except OSError:
+        os.unlink(tmp_file)
+        raise
+
+
+def update_json(path: Path, merge: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]],
+                **dump_kwargs) -> Dict[str, Any]:
+    """
+    Merge changes into a shared JSON file under its lock.
+    
+    Args:
+        path: State file
+        merge: Gets the file's current contents (None if missing or corrupt)
+            and returns the contents to write
+        **dump_kwargs: Passed to json.dump
+    
+    Returns:
+        The contents written
+    
+    Raises:
+        OSError: if the file could not be locked or written
+    """
+    with file_lock(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                current = json.load(f)
+        except FileNotFoundError:
+            current = None
+        except ValueError as e:
+            logger.warning(f"Replacing corrupt state file {path}: {e}")
+            current = None
+        data = merge(current)
+        write_json_atomic(path, data, **dump_kwargs)
+    return data
@@ -0,0 +1,426 @@
+"""
+Subject Normalization Index
+===========================
+Maps free-text subject areas ("CV and DL", "computer vison") to OpenAlex
+domain/field/subfield/topic IDs, so the fetcher can filter works on topics
+instead of putting the subject into full-text search, and backs the
+subject autocomplete endpoint.
+
+Names come from OpenAlex display names, display_name_alternatives, topic
+keywords and a small table of common abbreviations. Two structures sit on
+top of the names:
+- a prefix trie whose nodes keep their best entries, for autocomplete, and
+- a character-trigram index for fuzzy matching of misspelled names.
+
+Usage:
+    python subject_index.py build <snapshot_root> [index_file]
+    python subject_index.py fetch [index_file]
+    python subject_index.py resolve [index_file] "<subject>"
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OPENALEX_PREFIX = "https://openalex.org/"
+API_BASE_URL = "https://api.openalex.org"
+LEVELS = ("domain", "field", "subfield", "topic")
+ENTITY_LEVELS = {"domains": "domain", "fields": "field", "subfields": "subfield", "topics": "topic"}
+
+# Works filter per level: primary topic for the hierarchy, any topic for topics
+LEVEL_FILTERS = {
+    "domain": "primary_topic.domain.id",
+    "field": "primary_topic.field.id",
+    "subfield": "primary_topic.subfield.id",
+    "topic": "topics.id",
+}
+
+# Common abbreviations in subject areas
+SUBJECT_ABBREVIATIONS = {
+    "ai": "artificial intelligence",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "cv": "computer vision",
+    "nlp": "natural language processing",
+    "cs": "computer science",
+    "hci": "human computer interaction",
+    "iot": "internet of things",
+    "rl": "reinforcement learning",
+    "ir": "information retrieval",
+    "ee": "electrical engineering",
+    "bio": "biology",
+    "chem": "chemistry",
+    "econ": "economics",
+}
+
+SPLIT_PATTERN = re.compile(r"\s*(?:,|;|/|&|\+|\band\b)\s*")
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, keep letters/digits and collapse whitespace."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def trigrams(text: str) -> List[str]:
+    """Character trigrams of a normalized name, padded at word edges."""
+    padded = f"  {text} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def short_id(openalex_id: str) -> str:
+    """'https://openalex.org/fields/17' -> 'fields/17', 'https://openalex.org/T10320' -> 'T10320'"""
+    return openalex_id[len(OPENALEX_PREFIX):] if openalex_id.startswith(OPENALEX_PREFIX) else openalex_id
+
+
+def project_subject(record: Dict[str, Any], level: str) -> Optional[Dict[str, Any]]:
+    """
+    Keep the fields of a domain/field/subfield/topic record used by the index.
+    
+    Returns:
+        Index entry, or None for records without an ID
+    """
+    if not record.get("id"):
+        return None
+    names = [record.get("display_name") or ""]
+    names += record.get("display_name_alternatives") or []
+    names += record.get("keywords") or []
+    return {
+        "id": short_id(record["id"]),
+        "level": level,
+        "display_name": record.get("display_name") or "",
+        "names": [name for name in names if name],
+        "works_count": record.get("works_count") or 0,
+        "ancestors": {
+            parent: short_id((record.get(parent) or {}).get("id") or "")
+            for parent in ("subfield", "field", "domain") if (record.get(parent) or {}).get("id")
+        },
+    }
+
+
+class TrieNode:
+    """Prefix trie node holding the best entries below it."""
+    
+    __slots__ = ("children", "entries")
+    
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.entries: List[int] = []
+
+
+class SubjectIndex:
+    """
+    In-memory prefix trie + trigram index over OpenAlex subject names.
+    """
+    
+    SUGGESTIONS_PER_NODE = 10
+    FUZZY_THRESHOLD = 0.5  # Minimum trigram Dice similarity for a fuzzy match
+    FILTER_THRESHOLD = 0.85  # Minimum match score for a part to become a hard works filter
+    
+    def __init__(self, entries: List[Dict[str, Any]]):
+        """
+        Build the lookup structures.
+        
+        Args:
+            entries: Index entries (see project_subject)
+        """
+        self.entries = entries
+        self.by_id = {entry["id"]: index for index, entry in enumerate(entries)}
+        
+        # Broader levels and bigger subjects first, so trie nodes keep the best entries
+        order = sorted(
+            range(len(entries)),
+            key=lambda i: (LEVELS.index(entries[i]["level"]), -entries[i]["works_count"])
+        )
+        
+        self.names: List[str] = []
+        self.name_entries: List[int] = []
+        self.name_gram_counts: List[int] = []
+        self.exact: Dict[str, List[int]] = {}
+        self.root = TrieNode()
+        self.trigram_index: Dict[str, List[int]] = {}
+        
+        for entry_index in order:
+            for name in {normalize_name(name) for name in entries[entry_index]["names"]}:
+                if not name:
+                    continue
+                self.exact.setdefault(name, []).append(entry_index)
+                name_index = len(self.names)
+                self.names.append(name)
+                self.name_entries.append(entry_index)
+                self._insert(name, entry_index)
+                grams = trigrams(name)
+                self.name_gram_counts.append(len(grams))
+                for gram in grams:
+                    self.trigram_index.setdefault(gram, []).append(name_index)
+    
+    def _insert(self, name: str, entry_index: int):
+        node = self.root
+        for char in name:
+            node = node.children.setdefault(char, TrieNode())
+            if len(node.entries) < self.SUGGESTIONS_PER_NODE and entry_index not in node.entries:
+                node.entries.append(entry_index)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def _match(self, entry_index: int, matched: str, score: float) -> Dict[str, Any]:
+        entry = self.entries[entry_index]
+        return {
+            "id": entry["id"],
+            "name": entry["display_name"],
+            "level": entry["level"],
+            "matched": matched,
+            "score": round(score, 3),
+        }
+    
+    def fuzzy(self, text: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Entries whose names share the most trigrams with the text.
+        
+        Args:
+            text: Subject text
+            limit: Maximum matches
+        
+        Returns:
+            Matches above FUZZY_THRESHOLD, best first
+        """
+        name = normalize_name(text)
+        query_grams = trigrams(name)
+        if not query_grams:
+            return []
+        
+        shared: Dict[int, int] = {}
+        for gram in query_grams:
+            for name_index in self.trigram_index.get(gram, ()):
+                shared[name_index] = shared.get(name_index, 0) + 1
+        
+        scored = []
+        for name_index, count in shared.items():
+            dice = 2 * count / (len(query_grams) + self.name_gram_counts[name_index])
+            if dice >= self.FUZZY_THRESHOLD:
+                scored.append((dice, name_index))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        
+        matches, seen = [], set()
+        for dice, name_index in scored:
+            entry_index = self.name_entries[name_index]
+            if entry_index not in seen:
+                seen.add(entry_index)
+                matches.append(self._match(entry_index, self.names[name_index], dice))
+                if len(matches) >= limit:
+                    break
+        return matches
+    
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Autocomplete subject names.
+        
+        Args:
+            prefix: Typed text
+            limit: Maximum suggestions
+        
+        Returns:
+            Suggestions, broadest and largest first (fuzzy matches if no name has the prefix)
+        """
+        text = normalize_name(prefix)
+        if not text:
+            return []
+        text = SUBJECT_ABBREVIATIONS.get(text, text)
+        
+        node = self.root
+        for char in text:
+            node = node.children.get(char)
+            if node is None:
+                return self.fuzzy(text, limit)
+        return [self._match(entry_index, text, 1.0) for entry_index in node.entries[:limit]]
+    
+    def _resolve_parts(self, subject: str) -> List[Optional[Dict[str, Any]]]:
+        """Best match per part of the subject text (None for parts without one)."""
+        whole = normalize_name(subject)
+        if whole in self.exact:  # Names such as "Computer Vision and Pattern Recognition"
+            return [self._match(self.exact[whole][0], whole, 1.0)]
+        
+        matches = []
+        for part in SPLIT_PATTERN.split(subject.lower()):
+            name = normalize_name(part)
+            if not name:
+                continue
+            name = SUBJECT_ABBREVIATIONS.get(name, name)
+            if name in self.exact:
+                matches.append(self._match(self.exact[name][0], name, 1.0))
+            else:
+                fuzzy = self.fuzzy(name, limit=1)
+                matches.append(fuzzy[0] if fuzzy else None)
+        return matches
+    
+    def resolve(self, subject: str) -> List[Dict[str, Any]]:
+        """
+        Map subject text to index entries.
+        
+        The text is split on ',', ';', '/', '&', '+' and 'and'; each part is
+        expanded if it is a known abbreviation and matched exactly, else
+        fuzzily. Parts without a match are ignored.
+        
+        Args:
+            subject: Free-text subject area (e.g. "CV and DL")
+        
+        Returns:
+            One match per resolved part
+        """
+        matches, seen = [], set()
+        for match in self._resolve_parts(subject):
+            if match and match["id"] not in seen:
+                seen.add(match["id"])
+                matches.append(match)
+        return matches
+    
+    def works_filter(self, subject: str) -> Optional[str]:
+        """
+        OpenAlex /works filter for a subject area.
+        
+        Matches at different levels are lifted to the broadest matched level
+        through their ancestors, so the filter ORs IDs under a single key
+        (e.g. "primary_topic.field.id:fields/17").
+        
+        The filter replaces the subject in the search text, so it is only
+        built when every part of the subject resolved with a score of at
+        least FILTER_THRESHOLD: a loose fuzzy match or a dropped part would
+        otherwise restrict works to the wrong topics.
+        
+        Args:
+            subject: Free-text subject area
+        
+        Returns:
+            Filter expression, or None if the subject did not resolve confidently
+        """
+        parts = self._resolve_parts(subject)
+        if not parts or any(match is None or match["score"] < self.FILTER_THRESHOLD for match in parts):
+            return None
+        matches = list({match["id"]: match for match in parts}.values())
+        
+        level = min((match["level"] for match in matches), key=LEVELS.index)
+        ids = []
+        for match in matches:
+            entry = self.entries[self.by_id[match["id"]]]
+            lifted = entry["id"] if entry["level"] == level else entry["ancestors"].get(level)
+            if lifted and lifted not in ids:
+                ids.append(lifted)
+        return f"{LEVEL_FILTERS[level]}:{'|'.join(ids)}" if ids else None
+    
+    @classmethod
+    def load(cls, index_file: Path) -> "SubjectIndex":
+        """Load entries saved by save()."""
+        with open(index_file, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["entries"])
+    
+    @staticmethod
+    def save(entries: List[Dict[str, Any]], index_file: Path):
+        """Save index entries atomically."""
+        index_file = Path(index_file)
+        tmp_file = index_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"built_at": time.time(), "entries": entries}, f)
+        os.replace(tmp_file, index_file)
+        logger.info(f"Saved {len(entries)} subject entries to {index_file}")
+
+
+def iter_snapshot_subjects(snapshot_root: Path) -> Iterator[Dict[str, Any]]:
+    """Index entries from snapshot partitions (data/{domains,fields,subfields,topics}/...)."""
+    snapshot_root = Path(snapshot_root)
+    data_dir = snapshot_root / "data" if (snapshot_root / "data").exists() else snapshot_root
+    for entity, level in ENTITY_LEVELS.items():
+        for partition in sorted((data_dir / entity).glob("updated_date=*/*.gz")):
+            with gzip.open(partition, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = project_subject(json.loads(line), level)
+                        if entry:
+                            yield entry
+
+
+def iter_api_subjects(email: str = "") -> Iterator[Dict[str, Any]]:
+    """Index entries paged from the OpenAlex API (a few dozen requests)."""
+    import requests
+    from rate_limiter import shared_limiter
+    
+    api_key = os.getenv("OPENALEX_API_KEY", "")
+    for entity, level in ENTITY_LEVELS.items():
+        cursor = "*"
+        while cursor:
+            params = {"per_page": 200, "cursor": cursor}
+            if email:
+                params["mailto"] = email
+            if api_key:
+                params["api_key"] = api_key
+            shared_limiter().acquire("openalex")
+            response = requests.get(f"{API_BASE_URL}/{entity}", params=params, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            for record in data.get("results", []):
+                entry = project_subject(record, level)
+                if entry:
+                    yield entry
+            cursor = data.get("meta", {}).get("next_cursor")
+
+
+def default_index_file() -> Path:
+    return Path(os.getenv("SUBJECT_INDEX_FILE", Path(__file__).parent / "subject_index.json"))
+
+
+def open_default_subject_index() -> Optional[SubjectIndex]:
+    """
+    Load the index at SUBJECT_INDEX_FILE (default: ./subject_index.json) if it exists.
+    
+    Returns:
+        SubjectIndex, or None if no index has been built
+    """
+    index_file = default_index_file()
+    if not index_file.exists():
+        return None
+    try:
+        index = SubjectIndex.load(index_file)
+        logger.info(f"Loaded subject index ({len(index)} subjects)")
+        return index
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not load subject index {index_file}: {e}")
+        return None
+
+
+def main():
+    """Command-line entry point."""
+    if len(sys.argv) < 2 or sys.argv[1] not in ("build", "fetch", "resolve"):
+        print(__doc__)
+        return
+    
+    command = sys.argv[1]
+    if command == "build" and len(sys.argv) > 2:
+        index_file = Path(sys.argv[3]) if len(sys.argv) > 3 else default_index_file()
+        SubjectIndex.save(list(iter_snapshot_subjects(Path(sys.argv[2]))), index_file)
+    elif command == "fetch":
+        index_file = Path(sys.argv[2]) if len(sys.argv) > 2 else default_index_file()
+        SubjectIndex.save(list(iter_api_subjects(os.getenv("OPENALEX_EMAIL", ""))), index_file)
+    elif command == "resolve" and len(sys.argv) > 2:
+        index_file = Path(sys.argv[2]) if len(sys.argv) > 3 else default_index_file()
+        index = SubjectIndex.load(index_file)
+        subject = sys.argv[-1]
+        started = time.perf_counter()
+        matches = index.resolve(subject)
+        elapsed = (time.perf_counter() - started) * 1e6
+        for match in matches:
+            print(f"{match['score']:.3f}  {match['level']:<9} {match['id']:<14} {match['name']}")
+        print(f"Filter: {index.works_filter(subject)}  ({elapsed:.0f} us)")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,91 @@
+"""
+Tests for cache_warmer.py
+Runs against a stub fetcher (no API calls) with temporary state files
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cache_warmer import CacheWarmer
+from cancellation import RequestCancelled, raise_if_cancelled
+from keyword_selectivity import KeywordSelectivity
+from leaderboards import LeaderboardStore
+from rate_limiter import RateLimiter
+
+
+class StubFetcher:
+    """Answers count probes locally; subjects have no journals"""
+    
+    def __init__(self, tmp: Path):
+        self.selectivity = KeywordSelectivity(tmp / "keyword_df.json")
+        self.rate_limiter = RateLimiter(db_path=tmp / "limits.db")
+        self.probed = []
+        self.on_probe = None
+    
+    def probe_query_count(self, criteria: dict, search_query: str) -> int:
+        raise_if_cancelled()
+        self.probed.append(search_query)
+        if self.on_probe:
+            self.on_probe()
+        return 1000 + len(search_query)
+    
+    def gather_candidates(self, criteria: dict):
+        return None
+
+
+def test_warmup_probes_keywords_queued_by_other_processes():
+    """Keywords a per-request fetcher process queued are probed by the warm-up"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        fetcher = StubFetcher(tmp)  # Loaded before the live request queued anything
+        
+        live = KeywordSelectivity(tmp / "keyword_df.json")
+        live.queue_probes(["Federated Learning", "edge devices"])
+        live.save()
+        
+        warmer = CacheWarmer(fetcher, LeaderboardStore(tmp / "leaderboards.json"), requests_per_minute=6000)
+        warmer.warm_all()
+        
+        assert sorted(fetcher.probed) == ["edge devices", "federated learning"], fetcher.probed
+        assert warmer.status()["keywords"] == 2
+        reloaded = KeywordSelectivity(tmp / "keyword_df.json")
+        assert reloaded.pending_keywords() == []
+        assert reloaded.document_frequency("federated learning") == 1000 + len("federated learning")
+    print("✓ Warm-up drains the shared keyword probe queue")
+
+
+def test_preempted_probes_keep_progress():
+    """Live traffic stops the probes; finished ones are saved and the rest stay queued"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        fetcher = StubFetcher(tmp)
+        fetcher.selectivity.queue_probes([f"keyword {i}" for i in range(5)])
+        fetcher.selectivity.save()
+        
+        warmer = CacheWarmer(fetcher, LeaderboardStore(tmp / "leaderboards.json"), requests_per_minute=6000)
+        fetcher.on_probe = lambda: len(fetcher.probed) == 2 and warmer._preempt.set()
+        try:
+            warmer.warm_keywords()
+            raise AssertionError("expected the probes to be preempted")
+        except RequestCancelled:
+            pass
+        
+        reloaded = KeywordSelectivity(tmp / "keyword_df.json")
+        assert reloaded.pending_keywords() == ["keyword 2", "keyword 3", "keyword 4"]
+        assert reloaded.document_frequency("keyword 0") is not None
+    print("✓ Preempted probes keep their progress")
+
+
+def run_all_tests():
+    """Run all cache warmer tests"""
+    test_warmup_probes_keywords_queued_by_other_processes()
+    test_preempted_probes_keep_progress()
+    print("\n[PASS] Cache warmer tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,182 @@
+"""
+Tests for delta_update.py and journal store patching
+Runs on small generated stores and shards (no snapshot or API needed)
+"""
+
+import gc
+import gzip
+import json
+import random
+import sys
+import tempfile
+import weakref
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from delta_update import DeltaUpdater
+from journal_store import (
+    JournalStore, _hash_delete, _hash_insert, discover_partitions, hash_lookup, iter_jsonl_records,
+    publish_version, version_dir
+)
+from works_index import WorksIndex, open_works_index
+
+
+def source(source_id: int, name: str, issn_l: str, issns: list) -> dict:
+    return {"id": f"https://openalex.org/S{source_id}", "display_name": name,
+            "issn_l": issn_l, "issn": issns, "updated_date": "2025-01-01"}
+
+
+def work(work_id: int, title: str, source_id: int) -> dict:
+    return {"id": f"https://openalex.org/W{work_id}", "title": title, "abstract": "", "keywords": [],
+            "source_id": f"https://openalex.org/S{source_id}", "source_type": "journal",
+            "cited_by_count": 3, "is_oa": True}
+
+
+def write_shard(path: Path, records: list):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def test_hash_delete():
+    """Deleting keys keeps every remaining key reachable"""
+    rng = random.Random(7)
+    table_keys = np.zeros(256, dtype=np.int64)
+    table_rows = np.full(256, -1, dtype=np.int32)
+    expected = {}
+    for step in range(2000):
+        key = rng.randint(1, 400)
+        if key in expected and rng.random() < 0.5:
+            assert _hash_delete(table_keys, table_rows, key)
+            del expected[key]
+        elif key not in expected and len(expected) < 120:
+            assert _hash_insert(table_keys, table_rows, key, step)
+            expected[key] = step
+    for key in range(1, 401):
+        assert hash_lookup(table_keys, table_rows, key) == expected.get(key), key
+    print("✓ Hash deletion keeps probe runs intact")
+
+
+class SourceRecord(dict):
+    """A source record that can be tracked with a weak reference"""
+
+
+def test_build_keeps_no_raw_records():
+    """Build projects records as they stream in; later records of an ID win"""
+    alive = []
+    
+    def stream():
+        for i in range(200):
+            record = SourceRecord(source(i % 150 + 1, f"Journal {i}", "", []))
+            record["counts_by_year"] = [{"year": 2000 + y, "works_count": y} for y in range(25)]
+            alive.append(weakref.ref(record))
+            yield record
+            del record
+            gc.collect()
+            # Only the build loop's current record may still be referenced
+            assert sum(ref() is not None for ref in alive) <= 1, "raw records kept during the build"
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        assert JournalStore.build(stream(), Path(tmp)) == 150
+        store = JournalStore(Path(tmp))
+        assert store.record(store.row_for_id("https://openalex.org/S11"))["display_name"] == "Journal 160"
+        assert store.record(store.row_for_id("https://openalex.org/S150"))["display_name"] == "Journal 149"
+    print("✓ Build keeps projected rows only")
+
+
+def test_patch_drops_replaced_issns():
+    """ISSNs a source no longer lists stop resolving to it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        JournalStore.build([source(1, "Old Title", "1234-5679", ["1234-5679", "2049-3630"]),
+                            source(2, "Other", "0317-8471", ["0317-8471"])], Path(tmp) / "v1")
+        store = JournalStore(Path(tmp) / "v1")
+        store.patch([source(1, "New Title", "1550-7998", ["1550-7998"]),
+                     source(2, "Other", "0317-8471", ["0317-8471", "2049-3630"])], Path(tmp) / "v2", 2)
+        patched = JournalStore(Path(tmp) / "v2")
+        
+        assert patched.get_by_issn("1234-5679") is None, "replaced ISSN still maps to the source"
+        assert patched.get_by_issn("1550-7998")["display_name"] == "New Title"
+        assert patched.get_by_issn("2049-3630")["display_name"] == "Other", "moved ISSN kept its old source"
+        assert patched.get_by_issn("0317-8471")["display_name"] == "Other"
+    print("✓ Patching removes replaced ISSNs")
+
+
+def test_delta_rebuilds_works_index():
+    """New works shards reach an existing works index"""
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = Path(tmp) / "shards"
+        index_dir = Path(tmp) / "works_index"
+        write_shard(shards / "works" / "updated_date=2025-01-01" / "part_000.jsonl",
+                    [work(1, "Coral reef bleaching", 10)])
+        updater = DeltaUpdater(Path(tmp) / "store", shards, derived={"works_index": index_dir})
+        
+        updater.rebuild_works_indexes()
+        assert not index_dir.exists(), "rebuilt an index that was never built"
+        
+        WorksIndex.build(iter_jsonl_records(discover_partitions(shards / "works")), index_dir)
+        write_shard(shards / "works" / "updated_date=2025-02-01" / "part_000.jsonl",
+                    [work(2, "Coral reef restoration", 11)])
+        updater.rebuild_works_indexes()
+        
+        index = open_works_index(index_dir)
+        assert len(index) == 2
+        assert index.count("coral AND restoration") == 1
+        assert not list(Path(tmp).glob("works_index.*")), "staging directories left behind"
+    print("✓ Delta rebuilds the works index")
+
+
+def write_partition(snapshot: Path, entity: str, date: str, records: list):
+    path = snapshot / "data" / entity / f"updated_date={date}" / "part_000.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def test_sync_without_new_data_rebuilds_nothing():
+    """Works and subject indexes are rebuilt once per new partition, not on every sync"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store_root, snapshot = Path(tmp) / "store", Path(tmp) / "snapshot"
+        store_dir = version_dir(store_root, 1)
+        JournalStore.build([source(1, "Reef Science", "", [])], store_dir)  # last_updated_date 2025-01-01
+        publish_version(store_root, store_dir)
+        raw_work = {"id": "https://openalex.org/W1", "title": "Coral reef bleaching",
+                    "primary_location": {"source": {"id": "https://openalex.org/S1"}}}
+        write_partition(snapshot, "works", "2025-03-01", [raw_work])
+        write_partition(snapshot, "topics", "2025-03-01", [{"id": "https://openalex.org/T1"}])
+        
+        updater = DeltaUpdater(store_root, Path(tmp) / "shards", workers=1, derived={})
+        rebuilds = []
+        updater.rebuild_works_indexes = lambda: rebuilds.append("works")
+        updater.rebuild_subject_index = lambda snapshot_root: rebuilds.append("subjects")
+        
+        assert updater.sync_snapshot(snapshot) is None  # No source partitions after the store's date
+        assert rebuilds == ["works", "subjects"], rebuilds
+        
+        rebuilds.clear()
+        assert updater.sync_snapshot(snapshot) is None
+        assert rebuilds == [], f"rebuilt {rebuilds} without new partitions"
+        
+        write_partition(snapshot, "works", "2025-04-01", [dict(raw_work, id="https://openalex.org/W2")])
+        updater.sync_snapshot(snapshot)
+        assert rebuilds == ["works"], rebuilds
+    print("✓ Sync without new data rebuilds nothing")
+
+
+def run_all_tests():
+    """Run all delta update tests"""
+    test_hash_delete()
+    test_build_keeps_no_raw_records()
+    test_patch_drops_replaced_issns()
+    test_delta_rebuilds_works_index()
+    test_sync_without_new_data_rebuilds_nothing()
+    print("\n[PASS] Delta update tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
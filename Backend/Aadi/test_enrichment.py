@@ -0,0 +1,107 @@
+"""
+Tests for enrichment.py
+Runs on small CSV dumps written to a temporary directory
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from enrichment import EnrichmentTable, open_default_enrichment
+
+DOAJ_DUMP = (
+    "Journal title,Journal ISSN (print version),Journal EISSN (online version),APC,APC amount,"
+    "Journal license,URL in DOAJ\n"
+    "Reef Letters,1234-5679,2049-3630,Yes,2000 EUR,CC BY,https://doaj.org/toc/1234-5679\n"
+    "Free Geology,0317-8471,,No,,CC BY-SA,https://doaj.org/toc/0317-8471\n"
+    "Truncated Row,1550-7998\n"
+    "\n"
+)
+
+OPENAPC_TABLE = (
+    "institution,period,euro,doi,issn,issn_print,issn_electronic,issn_l\n"
+    "Uni A,2021,1000,10.1/a,2434-561X,2434-561X,,2434-561X\n"
+    "Uni B,2022,3000,10.1/b,2434-561X,2434-561X,,2434-561X\n"
+    "Uni C,2022,1200,10.1/c,2434-561X,2434-561X,,2434-561X\n"
+    "Uni D,2023,not paid,10.1/d,2434-561X,2434-561X,,2434-561X\n"
+    "Uni E,2023\n"
+)
+
+
+def write_dumps(tmp: Path, dumps: dict):
+    for name, content in dumps.items():
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(tmp / name, mode) as f:
+            f.write(content)
+
+
+def test_doaj_dump_with_blank_and_short_lines():
+    """DOAJ rows give APC, license and DOAJ membership; blank and truncated lines are skipped"""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dumps(Path(tmp), {"doaj.csv": DOAJ_DUMP})
+        table = EnrichmentTable.load(Path(tmp))
+        
+        assert len(table) == 3
+        assert table.lookup("1234-5679") == {"apc_usd": 2160.0, "is_in_doaj": True, "license": "CC BY"}
+        assert table.lookup(None, ["2049-3630"])["apc_usd"] == 2160.0
+        assert table.lookup("0317-8471") == {"apc_usd": 0.0, "is_in_doaj": True, "license": "CC BY-SA"}
+        assert table.lookup("1550-7998") is None
+    print("✓ DOAJ dump loads despite blank and short lines")
+
+
+def test_per_article_table_aggregates_to_median():
+    """OpenAPC-style per-article charges become the median charge per journal"""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dumps(Path(tmp), {"openapc.csv": OPENAPC_TABLE})
+        table = EnrichmentTable.load(Path(tmp))
+        
+        assert table.lookup("2434-561X") == {"apc_usd": 1296.0, "is_in_doaj": False, "license": None}
+    print("✓ Per-article charges aggregate to the median")
+
+
+def test_lookup_tries_issn_l_then_issns():
+    """ISSN-L wins when it is known; otherwise the first known ISSN answers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dumps(Path(tmp), {"doaj.csv": DOAJ_DUMP, "openapc.csv": OPENAPC_TABLE})
+        table = EnrichmentTable.load(Path(tmp))
+        
+        assert table.lookup("2434-561X", ["1234-5679"])["apc_usd"] == 1296.0
+        assert table.lookup("9999-9999", ["bad", "0317-8471", "1234-5679"])["license"] == "CC BY-SA"
+        assert table.lookup("9999-9999", ["0000-0000"]) is None
+        assert table.lookup(None) is None
+    print("✓ Lookup tries ISSN-L, then each ISSN")
+
+
+def test_malformed_dump_is_skipped():
+    """An unreadable dump is skipped and the other dumps still load"""
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dumps(Path(tmp), {
+            "broken.csv": b"issn,euro\n\xff\xfe1234-5679,\x00\x00\n",
+            "doaj.csv": DOAJ_DUMP,
+        })
+        os.environ["ENRICHMENT_DIR"] = tmp
+        try:
+            table = open_default_enrichment()
+        finally:
+            del os.environ["ENRICHMENT_DIR"]
+        
+        assert table is not None, "one bad dump dropped the whole table"
+        assert table.lookup("1234-5679")["is_in_doaj"]
+    print("✓ Malformed dumps are skipped")
+
+
+def run_all_tests():
+    """Run all enrichment tests"""
+    test_doaj_dump_with_blank_and_short_lines()
+    test_per_article_table_aggregates_to_median()
+    test_lookup_tries_issn_l_then_issns()
+    test_malformed_dump_is_skipped()
+    print("\n[PASS] Enrichment tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
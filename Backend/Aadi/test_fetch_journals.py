@@ -0,0 +1,234 @@
+"""
+Tests for fetch_journals.py search planning and facet fan-out
+Runs against stubbed works searches and count probes (no API calls)
+"""
+
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import requests
+
+from fetch_journals import OpenAlexJournalFetcher
+from keyword_selectivity import KeywordSelectivity
+from negative_cache import NegativeQueryCache
+from rate_limiter import RateLimiter
+from stale_cache import StaleResponseCache
+from upstream_guard import UpstreamGuard
+
+CRITERIA = {
+    "subjectArea": "Chemistry",
+    "keywords": ["graph neural networks", "message passing", "molecules", "drug discovery"],
+    "openAccess": 0,
+}
+
+
+def offline_fetcher(tmp: Path, counts: dict, probe_gate: threading.Event = None) -> OpenAlexJournalFetcher:
+    """
+    A fetcher whose searches and probes are answered from counts (query -> matching works).
+    
+    Unknown queries match 1000 works. Probes wait for probe_gate when one is given.
+    """
+    fetcher = OpenAlexJournalFetcher()
+    fetcher.works_index = None
+    fetcher.subject_index = None
+    fetcher.selectivity = KeywordSelectivity(tmp / "keyword_df.json")
+    fetcher.negative_cache = NegativeQueryCache(tmp / "negative_cache.json")
+    fetcher.searches = []
+    
+    def search_works(criteria, search_query, per_page):
+        fetcher.searches.append(search_query)
+        count = counts.get(search_query, 1000)
+        return {"results": [{"id": f"W{i}"} for i in range(min(count, per_page))], "meta": {"count": count}}
+    
+    def probe_query_count(criteria, search_query):
+        if probe_gate is not None:
+            probe_gate.wait(10)
+        return counts.get(search_query, 1000)
+    
+    fetcher.search_works = search_works
+    fetcher.probe_query_count = probe_query_count
+    return fetcher
+
+
+def ladder_queries(fetcher: OpenAlexJournalFetcher) -> dict:
+    return dict(fetcher.build_query_ladder(CRITERIA))
+
+
+def test_ladder_picks_strictest_shape_with_enough_works():
+    """A too-narrow strict query falls back to the strictest shape with enough works"""
+    with tempfile.TemporaryDirectory() as tmp:
+        fetcher = offline_fetcher(Path(tmp), {})
+        queries = ladder_queries(fetcher)
+        assert list(queries) == ["strict", "top3", "any_keyword", "subject_only"]
+        fetcher = offline_fetcher(Path(tmp), {queries["strict"]: 3, queries["top3"]: 4, queries["any_keyword"]: 500})
+        
+        works = fetcher.fetch_top_works(CRITERIA)
+        assert len(works) == fetcher.TOP_WORKS_COUNT
+        assert fetcher.searches == [queries["strict"], queries["any_keyword"]], fetcher.searches
+    print("✓ Ladder picks the strictest shape with enough works")
+
+
+def test_negative_cache_skips_narrow_shapes():
+    """Shapes recorded as too narrow are not searched again"""
+    with tempfile.TemporaryDirectory() as tmp:
+        queries = ladder_queries(offline_fetcher(Path(tmp), {}))
+        counts = {queries["strict"]: 3, queries["top3"]: 4, queries["any_keyword"]: 500}
+        fetcher = offline_fetcher(Path(tmp), counts)
+        fetcher.fetch_top_works(CRITERIA)
+        
+        fetcher.searches.clear()
+        fetcher.fetch_top_works(CRITERIA)
+        assert fetcher.searches == [queries["any_keyword"]], fetcher.searches
+        
+        # A new process sees the same entries
+        restarted = offline_fetcher(Path(tmp), counts)
+        restarted.fetch_top_works(CRITERIA)
+        assert restarted.searches == [queries["any_keyword"]], restarted.searches
+    print("✓ Negative cache skips shapes known to be too narrow")
+
+
+def test_strict_results_do_not_wait_for_probes():
+    """When the strict query matches enough works, slow probes are not awaited"""
+    with tempfile.TemporaryDirectory() as tmp:
+        gate = threading.Event()
+        fetcher = offline_fetcher(Path(tmp), {}, probe_gate=gate)
+        queries = ladder_queries(fetcher)
+        
+        started = time.time()
+        works = fetcher.fetch_top_works(CRITERIA)
+        elapsed = time.time() - started
+        gate.set()
+        
+        assert len(works) == fetcher.TOP_WORKS_COUNT
+        assert elapsed < 2, f"waited {elapsed:.1f}s for the relaxed probes"
+        assert fetcher.searches == [queries["strict"]]
+        assert not fetcher.negative_cache.recent, "unfinished probes recorded in the negative cache"
+    print("✓ Strict results return without waiting for probes")
+
+
+def work(work_id: str, journal: str, doi: str = None) -> dict:
+    return {"id": work_id, "doi": doi, "primary_location": {"source": {"id": journal}}}
+
+
+def test_keyword_facets():
+    """Consecutive keywords form facets of FACET_SIZE, at most MAX_FACETS of them"""
+    fetcher = OpenAlexJournalFetcher()
+    fetcher.FACET_SIZE, fetcher.MAX_FACETS = 3, 5
+    keywords = [f"k{i}" for i in range(20)]
+    facets = fetcher.group_keyword_facets(keywords)
+    assert facets == [keywords[i:i + 3] for i in range(0, 15, 3)]
+    assert fetcher.group_keyword_facets(["a", "b", "c", "d"]) == [["a", "b", "c"], ["d"]]
+    assert fetcher.group_keyword_facets([]) == []
+    print("✓ Keywords are grouped into facets")
+
+
+def test_facet_fanout_and_dedupe():
+    """Each facet is searched once; empty facets are remembered; duplicates are dropped"""
+    facet_results = {
+        "Chemistry AND (graph neural networks AND message passing AND molecules)":
+            [work("W1", "S1", "10.1/a"), work("W2", "S2")],
+        "Chemistry AND (drug discovery)": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        fetcher = offline_fetcher(Path(tmp), {})
+        fetcher.FACET_SIZE = 3
+        fetcher.search_works = lambda criteria, query, per_page: (
+            fetcher.searches.append(query) or {"results": facet_results[query], "meta": {}}
+        )
+        result_sets = fetcher.fetch_facet_works(CRITERIA)
+        assert sorted(fetcher.searches) == sorted(facet_results)
+        assert [len(works) for works in result_sets] == [2, 0]
+        
+        fetcher.searches.clear()
+        fetcher.fetch_facet_works(CRITERIA)
+        assert fetcher.searches == list(facet_results)[:1], "empty facet searched again"
+    
+    unique = fetcher.dedupe_works([
+        [work("W1", "S1", "10.1/a"), work("W2", "S2")],
+        [work("W3", "S3", "10.1/a"), work("W2", "S2"), work("W4", "S1")],
+    ])
+    assert [w["id"] for w in unique] == ["W1", "W2", "W4"], "same DOI or ID kept twice"
+    print("✓ Facets are fanned out and deduplicated")
+
+
+def test_reciprocal_rank_fusion():
+    """Journals ranked well by several facets win; a journal first everywhere scores 1.0"""
+    fetcher = OpenAlexJournalFetcher()
+    result_sets = [
+        [work("W1", "S1"), work("W2", "S2"), work("W3", "S2")],  # S2 (2 works), then S1
+        [work("W4", "S1"), work("W5", "S3")],                    # S1, then S3
+        [],                                                      # A failed facet does not count
+    ]
+    assert fetcher.journal_ranking(result_sets[0]) == ["S2", "S1"]
+    fused = fetcher.fuse_journal_rankings(result_sets)
+    assert list(fused) == ["S1", "S2", "S3"], fused
+    k = fetcher.RRF_K
+    assert abs(fused["S1"] - (1 / (k + 2) + 1 / (k + 1)) / (2 / (k + 1))) < 1e-12
+    assert abs(fused["S3"] - (1 / (k + 2)) / (2 / (k + 1))) < 1e-12
+    assert fetcher.fuse_rankings([["S9"], ["S9"]]) == {"S9": 1.0}
+    assert fetcher.fuse_rankings([[], []]) == {}
+    print("✓ Reciprocal rank fusion ranks journals across facets")
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    
+    def __init__(self, data: dict):
+        self.data = data
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self) -> dict:
+        return self.data
+
+
+def request_fetcher(tmp: Path, get_once) -> OpenAlexJournalFetcher:
+    """A fresh fetcher process whose GETs are answered by get_once"""
+    fetcher = OpenAlexJournalFetcher()
+    fetcher.RETRY_DELAY = 0
+    fetcher.rate_limiter = RateLimiter(db_path=tmp / "limits.db")
+    fetcher.openalex_guard = UpstreamGuard("openalex-test")
+    fetcher.stale_responses = StaleResponseCache(tmp / "stale_responses.db")
+    fetcher._get_once = get_once
+    return fetcher
+
+
+def test_stale_response_served_when_openalex_fails():
+    """A later process gets the last good response back when every attempt fails"""
+    params = {"search": "coral reefs", "per_page": 5}
+    with tempfile.TemporaryDirectory() as tmp:
+        good = {"results": [{"id": "W1"}], "meta": {"count": 1}}
+        first = request_fetcher(Path(tmp), lambda url, params: FakeResponse(good))
+        assert first.make_request_with_retry(first.WORKS_BASE_URL, params) == good
+        
+        def unreachable(url, params):
+            raise requests.exceptions.ConnectionError("OpenAlex unreachable")
+        
+        later = request_fetcher(Path(tmp), unreachable)
+        assert later.make_request_with_retry(later.WORKS_BASE_URL, params) == good, "no stale fallback"
+        assert later.make_request_with_retry(later.WORKS_BASE_URL, dict(params, per_page=6)) is None
+    print("✓ Last good response served while OpenAlex fails")
+
+
+def run_all_tests():
+    """Run all fetcher search planning and fan-out tests"""
+    test_ladder_picks_strictest_shape_with_enough_works()
+    test_negative_cache_skips_narrow_shapes()
+    test_strict_results_do_not_wait_for_probes()
+    test_keyword_facets()
+    test_facet_fanout_and_dedupe()
+    test_reciprocal_rank_fusion()
+    test_stale_response_served_when_openalex_fails()
+    print("\n[PASS] Fetcher search planning tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
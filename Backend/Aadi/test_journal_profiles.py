@@ -0,0 +1,85 @@
+"""
+Tests for journal_profiles.py
+Runs on a small index built from generated works shards (no snapshot needed)
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from journal_profiles import JournalProfileIndex, feature_bucket
+from journal_store import discover_partitions, iter_jsonl_records
+
+FIELDS = ["ocean", "coral", "volcano", "glacier", "protein", "enzyme", "neuron", "galaxy", "quantum",
+          "polymer", "soil", "malaria", "battery", "graphene", "tsunami", "vaccine"]
+
+
+def journal_works(number: int) -> list:
+    """Works of journal S<number>: its own topic and a pair of field words"""
+    first, second = FIELDS[number % len(FIELDS)], FIELDS[(number * 7 + 3) % len(FIELDS)]
+    keywords = [f"{first} {second}", f"{first} dynamics", f"{second} modelling {number}"]
+    topic = {"id": f"https://openalex.org/T{number}", "display_name": f"{first} and {second} studies"}
+    return [
+        {"id": f"https://openalex.org/W{number * 100 + i}", "source_id": f"https://openalex.org/S{number}",
+         "source_type": "journal", "keywords": keywords[:2 + i % 2], "topics": [topic]}
+        for i in range(4)
+    ]
+
+
+def build_index(tmp: Path, num_journals: int = 40) -> JournalProfileIndex:
+    shard = tmp / "shards" / "works" / "updated_date=2025-01-01" / "part_000.jsonl"
+    shard.parent.mkdir(parents=True)
+    with open(shard, "w", encoding="utf-8") as f:
+        for number in range(1, num_journals + 1):
+            for work in journal_works(number):
+                f.write(json.dumps(work) + "\n")
+    JournalProfileIndex.build(iter_jsonl_records(discover_partitions(tmp / "shards" / "works")), tmp / "profiles")
+    return JournalProfileIndex(tmp / "profiles")
+
+
+def test_journals_retrieved_by_their_own_profile():
+    """A journal's keywords and topic name find it, scanning all IVF lists or only a few"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = build_index(Path(tmp))
+        assert len(index) == 40
+        num_lists = len(index.centroids)
+        assert num_lists > 2
+        
+        for number in range(1, 41):
+            work = journal_works(number)[1]
+            expected = f"https://openalex.org/S{number}"
+            subject = work["topics"][0]["display_name"]
+            exhaustive = [journal for journal, _ in index.search(work["keywords"], subject, top_k=5,
+                                                                 nprobe=num_lists)]
+            assert expected in exhaustive, (number, exhaustive)
+            probed = [journal for journal, _ in index.search(work["keywords"], subject, top_k=5, nprobe=2)]
+            assert expected in probed, (number, probed)
+    print("✓ Journals are retrieved by their own profiles")
+
+
+def test_unseen_features_carry_no_weight():
+    """Words no journal has do not change the query; an all-unseen query finds nothing"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = build_index(Path(tmp))
+        assert float(index.idf[feature_bucket("w:xylophone")]) == 0.0
+        
+        keywords = journal_works(5)[0]["keywords"]
+        assert (index.query_vector(keywords + ["xylophone zeppelin"]) == index.query_vector(keywords)).all()
+        assert not index.query_vector(["xylophone zeppelin"]).any()
+        assert index.search(["xylophone zeppelin"]) == []
+    print("✓ Unseen features carry no weight")
+
+
+def run_all_tests():
+    """Run all journal profile tests"""
+    test_journals_retrieved_by_their_own_profile()
+    test_unseen_features_carry_no_weight()
+    print("\n[PASS] Journal profile tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
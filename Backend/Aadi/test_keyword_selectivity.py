@@ -0,0 +1,109 @@
+"""
+Tests for keyword_selectivity.py
+Runs without making API calls (temporary tables only)
+"""
+
+import json
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from keyword_selectivity import KeywordSelectivity
+
+
+def test_empty_keywords():
+    """Subject-only criteria (no keywords) select nothing instead of crashing"""
+    with tempfile.TemporaryDirectory() as tmp:
+        table = KeywordSelectivity(Path(tmp) / "df.json")
+        assert table.select_keywords([]) == []
+        assert table.select_keywords([], base_count=5000) == []
+    print("✓ Empty keyword list selects nothing")
+
+
+def test_empty_keywords_query_ladder():
+    """The relaxation ladder of a subject-only request is the subject alone"""
+    from fetch_journals import OpenAlexJournalFetcher
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        fetcher = OpenAlexJournalFetcher()
+        fetcher.selectivity = KeywordSelectivity(Path(tmp) / "df.json")
+        fetcher.subject_index = None
+        ladder = fetcher.build_query_ladder({"subjectArea": "Oceanography", "keywords": [], "openAccess": 0})
+    assert ladder == [("strict", "Oceanography")], ladder
+    print("✓ Subject-only query ladder builds")
+
+
+def test_selects_specific_keywords():
+    """Known keywords are ranked by selectivity, generic ones left out"""
+    with tempfile.TemporaryDirectory() as tmp:
+        table = KeywordSelectivity(Path(tmp) / "df.json")
+        for keyword, count in [("automation", 5_000_000), ("graph neural networks", 40_000),
+                               ("message passing", 90_000), ("molecules", 300_000)]:
+            table.record(keyword, count)
+        selected = table.select_keywords(["automation", "molecules", "graph neural networks", "message passing"],
+                                         max_keywords=3)
+    assert selected[0] == "graph neural networks", selected
+    assert "automation" not in selected, selected
+    print(f"✓ Selective keywords chosen: {selected}")
+
+
+def test_concurrent_saves_merge():
+    """Processes sharing the table keep each other's probes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "df.json"
+        tables = [KeywordSelectivity(path) for _ in range(4)]
+        
+        def probe(worker: int, table: KeywordSelectivity):
+            for i in range(25):
+                table.record(f"keyword {worker}-{i}", 1000 + i)
+                table.save()
+        
+        threads = [threading.Thread(target=probe, args=(worker, table)) for worker, table in enumerate(tables)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        assert len(saved["terms"]) == 100, len(saved["terms"])
+        assert not list(Path(tmp).glob("*.tmp")), "temporary files left behind"
+        assert len(KeywordSelectivity(path).terms) == 100
+    print("✓ Concurrent saves merge without losing probes")
+
+
+def test_probe_queue():
+    """Queued keywords persist until some process probes them"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "df.json"
+        live = KeywordSelectivity(path)
+        live.queue_probes(["Federated Learning", "edge devices"])
+        live.save()
+        
+        warmup = KeywordSelectivity(path)
+        assert warmup.pending_keywords() == ["federated learning", "edge devices"]
+        warmup.refresh(warmup.pending_keywords(), lambda keyword: 1234)
+        assert warmup.pending_keywords() == []
+        
+        live.save()  # Nothing changed here: the queue stays drained
+        assert KeywordSelectivity(path).pending_keywords() == []
+        assert KeywordSelectivity(path).document_frequency("federated learning") == 1234
+    print("✓ Probe queue is drained by refresh")
+
+
+def run_all_tests():
+    """Run all keyword selectivity tests"""
+    test_empty_keywords()
+    test_empty_keywords_query_ladder()
+    test_selects_specific_keywords()
+    test_concurrent_saves_merge()
+    test_probe_queue()
+    print("\n[PASS] Keyword selectivity tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,132 @@
+"""
+Tests for negative_cache.py
+Runs without making API calls (temporary state files and a fake clock)
+"""
+
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import negative_cache
+from negative_cache import NegativeQueryCache
+
+
+class FakeClock:
+    """Stands in for the time module inside negative_cache"""
+    
+    def __init__(self, now: float):
+        self.now = now
+    
+    def time(self) -> float:
+        return self.now
+
+
+def with_clock(test):
+    """Run a test with negative_cache's clock replaced by a FakeClock"""
+    def run():
+        real_time = negative_cache.time
+        negative_cache.time = FakeClock(1_700_000_000)
+        try:
+            test(negative_cache.time)
+        finally:
+            negative_cache.time = real_time
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+
+QUERY = {"search": "robotics AND (grasping AND tactile)", "filter": "is_oa:true"}
+
+
+@with_clock
+def test_reordered_keywords_share_fingerprint(clock):
+    """Keyword order inside a group does not change the fingerprint"""
+    reordered = {"search": "Robotics AND (tactile AND grasping)", "filter": "is_oa:true"}
+    assert NegativeQueryCache.fingerprint(QUERY) == NegativeQueryCache.fingerprint(reordered)
+    print("✓ Reordered keywords share a fingerprint")
+
+
+@with_clock
+def test_entries_expire_after_ttl(clock):
+    """An entry stops being negative once its TTL has passed"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NegativeQueryCache(Path(tmp) / "neg.json")
+        cache.record(QUERY, 2)
+        assert cache.is_negative(QUERY)
+        
+        clock.now += NegativeQueryCache.TTL_SECONDS + 1
+        assert not cache.is_negative(QUERY), "expired entry still answered from the Bloom filter"
+        assert not cache.is_negative(QUERY)
+    print("✓ Entries expire after TTL_SECONDS")
+
+
+@with_clock
+def test_bloom_tail_expires_within_ttl(clock):
+    """Entries evicted from the TTL map are forgotten within the TTL too"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NegativeQueryCache(Path(tmp) / "neg.json")
+        cache.record(QUERY, 0)
+        for i in range(NegativeQueryCache.MAX_TTL_ENTRIES):
+            cache.record({"search": f"filler {i}"}, 0)
+        assert cache.fingerprint(QUERY) not in cache.recent
+        assert cache.is_negative(QUERY), "Bloom filter lost a recent entry"
+        
+        clock.now += NegativeQueryCache.TTL_SECONDS
+        assert not cache.is_negative(QUERY)
+    print("✓ Bloom entries are forgotten within TTL_SECONDS")
+
+
+@with_clock
+def test_state_survives_restart(clock):
+    """A new process sees entries saved by an earlier one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "neg.json"
+        cache = NegativeQueryCache(path)
+        cache.record(QUERY, 1)
+        cache.save()
+        assert NegativeQueryCache(path).is_negative(QUERY)
+    print("✓ State persists across processes")
+
+
+@with_clock
+def test_concurrent_saves_merge(clock):
+    """Processes sharing the state file keep each other's entries"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "neg.json"
+        caches = [NegativeQueryCache(path) for _ in range(4)]
+        
+        def record(worker: int, cache: NegativeQueryCache):
+            for i in range(20):
+                cache.record({"search": f"query {worker}-{i}"}, 0)
+                cache.save()
+        
+        threads = [threading.Thread(target=record, args=(worker, cache)) for worker, cache in enumerate(caches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        reloaded = NegativeQueryCache(path)
+        missing = [(w, i) for w in range(4) for i in range(20) if not reloaded.is_negative({"search": f"query {w}-{i}"})]
+        assert not missing, f"lost entries: {missing}"
+        assert len(reloaded.recent) == 80
+        assert not list(Path(tmp).glob("*.tmp")), "temporary files left behind"
+    print("✓ Concurrent saves merge without losing entries")
+
+
+def run_all_tests():
+    """Run all negative cache tests"""
+    test_reordered_keywords_share_fingerprint()
+    test_entries_expire_after_ttl()
+    test_bloom_tail_expires_within_ttl()
+    test_state_survives_restart()
+    test_concurrent_saves_merge()
+    print("\n[PASS] Negative cache tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,78 @@
+"""
+Tests for subject_index.py and the fetcher's subject filter
+Runs on a small hand-written index (no snapshot or API needed)
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from subject_index import SubjectIndex
+
+ENTRIES = [
+    {"id": "fields/17", "level": "field", "display_name": "Computer Science",
+     "names": ["Computer Science"], "works_count": 9000, "ancestors": {"domain": "domains/3"}},
+    {"id": "subfields/1707", "level": "subfield", "display_name": "Computer Vision and Pattern Recognition",
+     "names": ["Computer Vision and Pattern Recognition", "Computer Vision"], "works_count": 800,
+     "ancestors": {"field": "fields/17", "domain": "domains/3"}},
+    {"id": "subfields/1702", "level": "subfield", "display_name": "Artificial Intelligence",
+     "names": ["Artificial Intelligence", "Deep Learning"], "works_count": 1200,
+     "ancestors": {"field": "fields/17", "domain": "domains/3"}},
+    {"id": "fields/19", "level": "field", "display_name": "Earth and Planetary Sciences",
+     "names": ["Earth and Planetary Sciences", "Oceanography"], "works_count": 4000,
+     "ancestors": {"domain": "domains/3"}},
+]
+
+
+def test_exact_subjects_become_filters():
+    """Exact names and abbreviations resolve to a hard works filter"""
+    index = SubjectIndex(ENTRIES)
+    assert index.works_filter("Computer Vision") == "primary_topic.subfield.id:subfields/1707"
+    assert index.works_filter("CV and DL") == "primary_topic.subfield.id:subfields/1707|subfields/1702"
+    assert index.works_filter("Oceanography") == "primary_topic.field.id:fields/19"
+    print("✓ Exact subjects become filters")
+
+
+def test_loose_subjects_stay_in_search_text():
+    """Fuzzy or partly resolved subjects are not turned into hard filters"""
+    index = SubjectIndex(ENTRIES)
+    assert index.resolve("computer visionary art"), "expected a loose fuzzy match"
+    assert index.resolve("computer visionary art")[0]["score"] < SubjectIndex.FILTER_THRESHOLD
+    assert index.works_filter("computer visionary art") is None
+    
+    # One part resolves, the other does not: filtering on the first would drop the second
+    assert [match["id"] for match in index.resolve("Oceanography and Marine Policy")] == ["fields/19"]
+    assert index.works_filter("Oceanography and Marine Policy") is None
+    print("✓ Loose subjects stay in the search text")
+
+
+def test_fetcher_keeps_unfiltered_subject_in_query():
+    """The fetcher searches for the subject text when it is not filtered on"""
+    from fetch_journals import OpenAlexJournalFetcher
+    
+    fetcher = OpenAlexJournalFetcher()
+    fetcher.subject_index = SubjectIndex(ENTRIES)
+    fetcher.works_index = None
+    
+    loose = {"subjectArea": "Oceanography and Marine Policy", "keywords": [], "openAccess": 0}
+    assert fetcher.subject_filter(loose) is None
+    assert fetcher.build_query_ladder(loose) == [("strict", "Oceanography and Marine Policy")]
+    
+    exact = {"subjectArea": "Oceanography", "keywords": [], "openAccess": 0}
+    assert fetcher.subject_filter(exact) == "primary_topic.field.id:fields/19"
+    assert fetcher.build_query_ladder(exact) == [("strict", "")]
+    print("✓ Fetcher keeps unfiltered subjects in the query")
+
+
+def run_all_tests():
+    """Run all subject index tests"""
+    test_exact_subjects_become_filters()
+    test_loose_subjects_stay_in_search_text()
+    test_fetcher_keeps_unfiltered_subject_in_query()
+    print("\n[PASS] Subject index tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,136 @@
+"""
+Tests for upstream_guard.py
+Runs without calling any upstream (local functions stand in for calls)
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from cancellation import RequestCancelled
+from rate_limiter import RateLimiter, is_rate_limit_error
+from upstream_guard import CircuitOpenError, GuardStore, UpstreamGuard
+
+
+def half_open_guard() -> UpstreamGuard:
+    """A guard whose circuit has just become ready for a probe"""
+    guard = UpstreamGuard("test", open_seconds=0.0)
+    guard.breaker._open()
+    return guard
+
+
+def call_fails(guard: UpstreamGuard, fn, prepare=None, expected=Exception):
+    try:
+        guard.call(fn, timeout=5, prepare=prepare)
+    except expected:
+        return
+    raise AssertionError(f"expected {expected.__name__}")
+
+
+def test_cancelled_probe_frees_half_open():
+    """A probe cancelled mid-call lets the next call probe"""
+    guard = half_open_guard()
+    
+    def cancelled():
+        raise RequestCancelled("Client disconnected")
+    
+    call_fails(guard, cancelled, expected=RequestCancelled)
+    assert guard.breaker.state == "half_open"
+    assert guard.call(lambda: "ok", timeout=5) == "ok", "circuit stuck half-open after a cancelled probe"
+    assert guard.breaker.state == "closed"
+    assert guard.concurrency.inflight == 0
+    print("✓ Cancelled probe frees the half-open circuit")
+
+
+def test_failed_prepare_frees_half_open():
+    """A probe whose prepare() fails never went out and does not hold the probe"""
+    guard = half_open_guard()
+    
+    def no_token():
+        raise TimeoutError("rate limiter wait exceeded")
+    
+    call_fails(guard, lambda: "unused", prepare=no_token, expected=TimeoutError)
+    assert guard.breaker.state == "half_open"
+    assert guard.call(lambda: "ok", timeout=5) == "ok"
+    assert guard.breaker.state == "closed"
+    print("✓ Failed prepare frees the half-open circuit")
+
+
+def test_only_one_probe_at_a_time():
+    """While a probe is out, other calls fail fast"""
+    guard = half_open_guard()
+    assert guard.breaker.allow()
+    call_fails(guard, lambda: "unused", expected=CircuitOpenError)
+    guard.breaker.abandon_probe()
+    assert guard.breaker.allow()
+    print("✓ Half-open circuit lets one probe through")
+
+
+def test_token_wait_is_bounded():
+    """A copy waiting on a drained bucket gives its slot back after the wait bound"""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = RateLimiter(db_path=Path(tmp) / "limits.db", buckets={"slow": (0.01, 1.0)})
+        limiter.acquire("slow")
+        guard = UpstreamGuard("test")
+        started = time.time()
+        call_fails(guard, lambda: "unused", prepare=lambda: limiter.take("slow", 0.2), expected=TimeoutError)
+        assert time.time() - started < 2
+        assert guard.concurrency.inflight == 0, "slot kept after the token wait gave up"
+    
+    assert not is_rate_limit_error(ValueError("DOI 10.1429/abc not found")), "matched '429' in the message"
+    print("✓ Token waits inside a slot are bounded")
+
+
+def test_guards_share_state_through_the_store():
+    """Guards in different processes (here: instances) see one breaker, latency window and limit"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = Path(tmp) / "guard_state.db"
+        first = UpstreamGuard("shared", store=GuardStore(store_path), min_calls=4, max_concurrency=2)
+        second = UpstreamGuard("shared", store=GuardStore(store_path), min_calls=4, max_concurrency=2)
+        
+        def fails():
+            raise ConnectionError("upstream down")
+        
+        for guard in (first, second, first, second):
+            call_fails(guard, fails, expected=ConnectionError)
+        assert first.breaker.current_state() == "open"
+        call_fails(second, lambda: "unused", expected=CircuitOpenError)
+        
+        second.breaker.state = "closed"
+        second.breaker.calls.clear()
+        second.breaker.record(False, 0.01)  # Local edits are replaced by the shared state first
+        assert first.breaker.current_state() == "open"
+        assert first.status()["limit"] == second.status()["limit"] == 1, "failures did not cut the shared limit"
+        
+        first = UpstreamGuard("other", store=GuardStore(store_path), max_concurrency=2)
+        second = UpstreamGuard("other", store=GuardStore(store_path), max_concurrency=2)
+        for _ in range(10):
+            first.latency.record(0.02)
+            second.latency.record(0.04)
+        assert second.latency.percentile(0.95) == 0.04, "latency samples not shared"
+        
+        first.concurrency.acquire()
+        first.concurrency.acquire()
+        assert not second.concurrency.try_acquire(), "slots held by another process not counted"
+        assert second.status()["inflight"] == 2
+        first.concurrency.release(0.02)
+        assert second.concurrency.try_acquire()
+    print("✓ Guards share state through the store")
+
+
+def run_all_tests():
+    """Run all upstream guard tests"""
+    test_cancelled_probe_frees_half_open()
+    test_failed_prepare_frees_half_open()
+    test_only_one_probe_at_a_time()
+    test_token_wait_is_bounded()
+    test_guards_share_state_through_the_store()
+    print("\n[PASS] Upstream guard tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,157 @@
+"""
+Tests for works_index.py
+Builds small generated indexes (no snapshot or API needed)
+"""
+
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from works_index import ShardedWorksIndex, WorksIndex, open_works_index, parse_query, query_terms
+
+INDEX_FILES = ["vocab.bin", "postings.bin", "tfs.bin", "titles.bin", "vocab_offsets.npy", "df.npy",
+               "posting_offsets.npy", "tf_offsets.npy", "work_id.npy", "source_id.npy",
+               "cited_by_count.npy", "is_oa.npy", "is_journal.npy", "doc_length.npy", "title_offsets.npy"]
+
+
+def generated_works(count: int = 1500, seed: int = 3) -> list:
+    """Random works over a small vocabulary, with repeated work IDs"""
+    rng = random.Random(seed)
+    words = ["coral", "reef", "bleaching", "ocean", "acidification", "fishery", "plankton",
+             "satellite", "temperature", "model", "sediment", "estuary", "mangrove", "carbon"]
+    works = []
+    for _ in range(count):
+        work_id = rng.randint(1, count // 2)
+        works.append({
+            "id": f"https://openalex.org/W{work_id}",
+            "title": " ".join(rng.choice(words) for _ in range(5)),
+            "abstract": " ".join(rng.choice(words) for _ in range(rng.randint(0, 20))),
+            "keywords": [rng.choice(words)],
+            "source_id": f"https://openalex.org/S{rng.randint(1, 40)}",
+            "source_type": rng.choice(["journal", "journal", "repository"]),
+            "cited_by_count": rng.randint(0, 5000),
+            "is_oa": rng.random() < 0.5,
+        })
+    return works
+
+
+def test_spilled_build_matches_in_memory_build():
+    """Sorted runs merge into exactly the index a single in-memory run gives"""
+    works = generated_works()
+    with tempfile.TemporaryDirectory() as tmp:
+        WorksIndex.build(iter(works), Path(tmp) / "one_run", run_postings=10 ** 9)
+        WorksIndex.build(iter(works), Path(tmp) / "spilled", run_postings=500)
+        for name in INDEX_FILES:
+            one_run = (Path(tmp) / "one_run" / name).read_bytes()
+            spilled = (Path(tmp) / "spilled" / name).read_bytes()
+            assert one_run == spilled, f"{name} differs"
+        assert not (Path(tmp) / "spilled" / "build_runs").exists(), "runs left behind"
+    print("✓ Spilled build is identical to the in-memory build")
+
+
+def test_latest_copy_of_a_work_wins():
+    """A later record of the same work replaces the earlier one"""
+    works = [
+        {"id": "W7", "title": "Coral bleaching survey", "source_id": "S1", "source_type": "journal"},
+        {"id": "W3", "title": "Mangrove carbon", "source_id": "S2", "source_type": "journal"},
+        {"id": "W7", "title": "Estuary sediment model", "source_id": "S3", "source_type": "journal"},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        WorksIndex.build(iter(works), Path(tmp), run_postings=2)
+        index = WorksIndex(Path(tmp))
+        assert len(index) == 2
+        assert index.count("coral") == 0, "superseded copy still indexed"
+        results, total = index.search("estuary AND sediment")
+        assert total == 1 and results[0]["id"].endswith("W7")
+        assert results[0]["primary_location"]["source"]["id"].endswith("S3")
+        assert list(index.work_ids) == [3, 7], "documents not numbered in work ID order"
+    print("✓ Latest copy of a work wins")
+
+
+def test_search_reuses_matched_postings():
+    """Scores from the postings decoded by match equal freshly decoded ones"""
+    with tempfile.TemporaryDirectory() as tmp:
+        WorksIndex.build(iter(generated_works()), Path(tmp))
+        index = WorksIndex(Path(tmp))
+        query = "coral AND (reef OR plankton) AND ocean"
+        docs, postings = index.match(query)
+        terms = query_terms(parse_query(query))
+        assert set(terms) <= set(postings), "match did not keep the decoded postings"
+        
+        decoded = []
+        original = index.posting_list
+        index.posting_list = lambda term: decoded.append(term) or original(term)
+        reused = index.score(docs, terms, postings=postings)
+        assert not decoded, f"postings decoded again: {decoded}"
+        index.posting_list = original
+        assert np.allclose(reused, index.score(docs, terms))
+        
+        results, total = index.search(query, top_n=5)
+        assert total == index.count(query) == len(docs)
+        assert len(results) == 5
+    print("✓ Search reuses the postings decoded by match")
+
+
+def test_fetcher_probes_use_count():
+    """Count probes against a local index do not run a scored search"""
+    from fetch_journals import OpenAlexJournalFetcher
+    
+    class CountingIndex:
+        def __init__(self):
+            self.calls = []
+        
+        def count(self, query, open_access_only=False):
+            self.calls.append(("count", query, open_access_only))
+            return 42
+        
+        def search(self, query, top_n=30, open_access_only=False):
+            self.calls.append(("search", query, open_access_only))
+            return [], 0
+    
+    fetcher = OpenAlexJournalFetcher()
+    fetcher.works_index = CountingIndex()
+    assert fetcher.probe_query_count({"openAccess": 1}, "coral AND reef") == 42
+    assert fetcher.works_index.calls == [("count", "coral AND reef", True)]
+    print("✓ Fetcher count probes use the index's count()")
+
+
+def test_sharded_index_matches_single_index():
+    """Sharded search gives the single index's totals and top works, in-process"""
+    works = generated_works(count=2000, seed=11)
+    with tempfile.TemporaryDirectory() as tmp:
+        WorksIndex.build(iter(works), Path(tmp) / "single")
+        ShardedWorksIndex.build(iter(works), Path(tmp) / "sharded", num_shards=3, run_postings=900)
+        single = WorksIndex(Path(tmp) / "single")
+        sharded = open_works_index(Path(tmp) / "sharded")
+        assert isinstance(sharded, ShardedWorksIndex)
+        assert len(sharded) == len(single)
+        assert sum(len(shard) for shard in sharded.shards) == len(single)
+        
+        for query in ["coral AND reef", "ocean AND (plankton OR carbon)", "estuary", "nonexistent"]:
+            single_works, single_total = single.search(query, top_n=10, open_access_only=True)
+            sharded_works, sharded_total = sharded.search(query, top_n=10, open_access_only=True)
+            assert sharded_total == single_total == sharded.count(query, True), query
+            assert [w["id"] for w in sharded_works] == [w["id"] for w in single_works], query
+            assert np.allclose([w["relevance_score"] for w in sharded_works],
+                               [w["relevance_score"] for w in single_works])
+    print("✓ Sharded index matches the single index")
+
+
+def run_all_tests():
+    """Run all works index tests"""
+    test_spilled_build_matches_in_memory_build()
+    test_latest_copy_of_a_work_wins()
+    test_search_reuses_matched_postings()
+    test_fetcher_probes_use_count()
+    test_sharded_index_matches_single_index()
+    print("\n[PASS] Works index tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
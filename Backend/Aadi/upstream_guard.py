@@ -0,0 +1,639 @@
+"""
+Upstream Guards
+===============
+Tail-latency protection for calls to OpenAlex and Gemini:
+
+- Hedging: if a call has not answered by the upstream's observed p95
+  latency, a duplicate is sent and whichever finishes first wins. The
+  slower copy runs to completion in the background and is ignored.
+- Circuit breaker: when too many recent calls failed or were slow, the
+  circuit opens and calls fail immediately with CircuitOpenError for
+  OPEN_SECONDS, so callers go straight to their fallbacks (local keyword
+  extraction, cached or leaderboard results) instead of waiting on
+  timeouts. After the pause one probe call is let through; its outcome
+  closes the circuit or opens it again.
+- Adaptive concurrency: calls in flight are capped by a limit that
+  follows upstream capacity (gradient algorithm on latency, with a
+  multiplicative cut on errors and throttling). Calls over the limit
+  queue for a slot and fail with QueueTimeoutError if none frees up in
+  time; hedges are only sent when a slot is free.
+- Cancellation: waits for slots and answers give up as soon as the
+  calling request is cancelled (see cancellation.py).
+
+get_guard() returns an upstream's guard, whose latency samples, breaker
+state, concurrency limit and slots live in one small SQLite file shared by
+every process on the host (like the token buckets in rate_limiter.py).
+Fetcher subprocesses live for one request, so per-process state would
+never collect enough calls to hedge, trip or adapt. Each read-modify-write
+is one BEGIN IMMEDIATE transaction; slots are leases that expire after
+SLOT_LEASE seconds, so a crashed process cannot hold them forever. If the
+database cannot be opened the guard falls back to per-process state.
+
+Configuration (environment):
+    GUARD_STATE_DB  SQLite file (default: ./guard_state.db)
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from cancellation import RequestCancelled, raise_if_cancelled, submit_in_context
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class QueueTimeoutError(TimeoutError):
+    """Raised when no concurrency slot frees up within the queue timeout."""
+
+
+class GuardStore:
+    """
+    Guard state shared across processes, one JSON document per key in SQLite.
+    """
+    
+    DEFAULT_DB = Path(__file__).parent / "guard_state.db"
+    
+    def __init__(self, db_path: Optional[Path] = None):
+        """
+        Args:
+            db_path: SQLite file shared by all processes (default: GUARD_STATE_DB or ./guard_state.db)
+        """
+        self.db_path = Path(db_path or os.getenv("GUARD_STATE_DB", self.DEFAULT_DB))
+        self._disabled = False
+        try:
+            with self._connect() as db:
+                db.execute("CREATE TABLE IF NOT EXISTS guard_state (key TEXT PRIMARY KEY, data TEXT)")
+        except sqlite3.Error as e:
+            logger.warning(f"Guard state not shared, could not open {self.db_path}: {e}")
+            self._disabled = True
+    
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=10, isolation_level=None))
+    
+    def read(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Current state of a key, without locking it.
+        
+        Returns:
+            The stored state ({} if none yet), or None if the store is unavailable
+        """
+        if self._disabled:
+            return None
+        try:
+            with self._connect() as db:
+                row = db.execute("SELECT data FROM guard_state WHERE key = ?", (key,)).fetchone()
+            return json.loads(row[0]) if row else {}
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Guard state error on '{key}': {e}")
+            return None
+    
+    @contextmanager
+    def update(self, key: str) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Read-modify-write the state of a key in one write transaction.
+        
+        Yields:
+            The stored state ({} if none yet) to change in place, or None if
+            the store is unavailable (the caller then keeps its local state)
+        """
+        if self._disabled:
+            yield None
+            return
+        db, state = None, None
+        try:
+            db = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT data FROM guard_state WHERE key = ?", (key,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Guard state error on '{key}', using local state: {e}")
+            if db is not None:
+                db.close()
+            db = None
+        
+        try:
+            yield state
+        except BaseException:
+            if db is not None:
+                db.close()  # Closing without COMMIT rolls the transaction back
+            raise
+        if db is not None:
+            try:
+                db.execute("INSERT OR REPLACE INTO guard_state (key, data) VALUES (?, ?)", (key, json.dumps(state)))
+                db.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Guard state error on '{key}': {e}")
+            finally:
+                db.close()
+
+
+_shared_store: Optional[GuardStore] = None
+_shared_store_lock = threading.Lock()
+
+
+def shared_guard_store() -> GuardStore:
+    """The process-wide handle on the host's guard state database."""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = GuardStore()
+        return _shared_store
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls."""
+    
+    def __init__(self, window: int = 200, store: Optional[GuardStore] = None, name: str = ""):
+        """
+        Args:
+            window: Recent calls kept
+            store: Shared state (None: samples are kept in this process)
+            name: Upstream name (the store key)
+        """
+        self.window = window
+        self.samples = deque(maxlen=window)
+        self.store = store
+        self.key = f"latency:{name}"
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float):
+        if self.store is not None:
+            with self.store.update(self.key) as shared:
+                if shared is not None:
+                    shared["samples"] = (shared.get("samples", []) + [seconds])[-self.window:]
+                    return
+        with self._lock:
+            self.samples.append(seconds)
+    
+    def percentile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        """q-quantile of recent latencies, or None with fewer than min_samples."""
+        shared = self.store.read(self.key) if self.store is not None else None
+        with self._lock:
+            samples = shared.get("samples", []) if shared is not None else list(self.samples)
+        if len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Error-rate and slow-call-rate breaker over a window of recent calls.
+    """
+    
+    PROBE_TIMEOUT = 120.0  # A probe unanswered this long (its process died) frees the half-open slot
+    
+    def __init__(self, name: str, window: int = 20, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_seconds: float = 10.0, slow_rate: float = 0.5, open_seconds: float = 30.0,
+                 store: Optional[GuardStore] = None):
+        """
+        Args:
+            name: Upstream name (for logging and the store key)
+            window: Recent calls considered
+            min_calls: Calls needed before the breaker can trip
+            error_rate: Failure share that opens the circuit
+            slow_seconds: Calls slower than this count as slow
+            slow_rate: Slow-call share that opens the circuit
+            open_seconds: How long the circuit stays open before a probe
+            store: Shared state (None: the breaker is local to this process)
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.calls = deque(maxlen=window)  # (failed, slow)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_started = 0.0  # When the outstanding half-open probe went out (0: none)
+        self.store = store
+        self.key = f"breaker:{name}"
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def _synced(self) -> Iterator[None]:
+        """Hold the breaker lock, with the shared state loaded before and saved after."""
+        with self._lock:
+            if self.store is None:
+                yield
+                return
+            with self.store.update(self.key) as shared:
+                if shared:
+                    self.state, self.opened_at = shared["state"], shared["opened_at"]
+                    self.probe_started = shared["probe_started"]
+                    self.calls = deque((tuple(call) for call in shared["calls"]), maxlen=self.calls.maxlen)
+                yield
+                if shared is not None:
+                    shared.update(state=self.state, opened_at=self.opened_at,
+                                  probe_started=self.probe_started, calls=list(self.calls))
+    
+    def allow(self) -> bool:
+        """Whether a call may go out now (in half-open state, only one probe at a time)."""
+        with self._synced():
+            if self.state == "closed":
+                return True
+            now = time.time()
+            if self.state == "open" and now - self.opened_at >= self.open_seconds:
+                self.state = "half_open"
+                self.probe_started = 0.0
+            if self.state == "half_open" and (not self.probe_started
+                                              or now - self.probe_started >= self.PROBE_TIMEOUT):
+                self.probe_started = now
+                return True
+            return False
+    
+    def current_state(self) -> str:
+        """Circuit state as last recorded by any process sharing the store."""
+        shared = self.store.read(self.key) if self.store is not None else None
+        return shared.get("state", self.state) if shared else self.state
+    
+    def abandon_probe(self):
+        """Free the half-open probe slot of a call that never finished (cancelled or not sent)."""
+        with self._synced():
+            if self.state == "half_open":
+                self.probe_started = 0.0
+    
+    def record(self, failed: bool, seconds: float):
+        """Record a finished call and trip or reset the circuit."""
+        slow = seconds >= self.slow_seconds
+        with self._synced():
+            if self.state == "half_open":
+                self.probe_started = 0.0
+                if failed or slow:
+                    self._open()
+                else:
+                    self.state = "closed"
+                    self.calls.clear()
+                    logger.info(f"Circuit for '{self.name}' closed")
+                return
+            
+            self.calls.append((failed, slow))
+            if self.state == "closed" and len(self.calls) >= self.min_calls:
+                failures = sum(1 for f, _ in self.calls if f) / len(self.calls)
+                slow_calls = sum(1 for _, s in self.calls if s) / len(self.calls)
+                if failures >= self.error_rate or slow_calls >= self.slow_rate:
+                    self._open()
+    
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.time()
+        self.calls.clear()
+        logger.warning(f"Circuit for '{self.name}' opened for {self.open_seconds:.0f}s")
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Concurrency limit driven by measured latency and errors.
+    
+    Gradient algorithm: a moving average of latency is compared with its
+    lowest recent value (the no-queueing baseline); while it stays within
+    TOLERANCE of the baseline the limit grows by about sqrt(limit), and
+    when latency rises (requests queueing upstream) it shrinks in
+    proportion. Errors and throttling cut
+    the limit by BACKOFF_RATIO. The limit only grows while it is actually
+    used, so an idle period does not inflate it.
+    
+    With a store, the limit, its latency averages and the slots in use are
+    shared by every process, so the limit caps the host's calls in flight.
+    """
+    
+    SLOT_LEASE = 300.0  # Seconds after which a slot whose release never came (crashed process) is reclaimed
+    TOLERANCE = 1.5  # Latency inflation accepted before the limit shrinks
+    SMOOTHING = 0.2  # Weight of each new limit estimate
+    BACKOFF_RATIO = 0.7  # Multiplicative decrease on errors
+    BASELINE_DRIFT = 0.01  # Upward drift of the baseline latency per second
+    CANCEL_POLL_INTERVAL = 0.1  # seconds between cancellation checks while queued
+    
+    def __init__(self, name: str, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 queue_timeout: float = 5.0, store: Optional[GuardStore] = None):
+        """
+        Args:
+            name: Upstream name (for logging and the store key)
+            initial: Starting limit
+            min_limit: Lowest limit
+            max_limit: Highest limit
+            queue_timeout: Longest wait for a slot (seconds)
+            store: Shared state (None: the limit and slots are local to this process)
+        """
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_timeout = queue_timeout
+        self.inflight = 0  # Slots held by this process
+        self.waiting = 0
+        self.short_rtt: Optional[float] = None
+        self.baseline_rtt: Optional[float] = None
+        self.slots: List[List[float]] = []  # Shared slot leases: [pid, expires at]
+        self.store = store
+        self.key = f"limiter:{name}"
+        self._updated_at = time.time()
+        self._limit_changed_at = 0.0
+        self._cond = threading.Condition()
+    
+    @contextmanager
+    def _synced(self) -> Iterator[bool]:
+        """
+        Hold the limiter lock, with the shared state loaded before and saved after.
+        
+        Yields:
+            Whether the state is shared (False without a store or while it is unavailable)
+        """
+        with self._cond:
+            if self.store is None:
+                yield False
+                return
+            with self.store.update(self.key) as shared:
+                if shared:
+                    self.limit, self.short_rtt = shared["limit"], shared["short_rtt"]
+                    self.baseline_rtt, self._updated_at = shared["baseline_rtt"], shared["updated_at"]
+                    self._limit_changed_at = shared["limit_changed_at"]
+                    now = time.time()
+                    self.slots = [slot for slot in shared["slots"] if slot[1] > now]
+                yield shared is not None
+                if shared is not None:
+                    shared.update(limit=self.limit, short_rtt=self.short_rtt, baseline_rtt=self.baseline_rtt,
+                                  updated_at=self._updated_at, limit_changed_at=self._limit_changed_at,
+                                  slots=self.slots)
+    
+    def _take_slot(self) -> bool:
+        """Take a slot if the limit allows one now."""
+        with self._synced() as shared:
+            in_use = len(self.slots) if shared else self.inflight
+            if in_use >= int(self.limit):
+                return False
+            if shared:
+                self.slots.append([os.getpid(), time.time() + self.SLOT_LEASE])
+            self.inflight += 1
+            return True
+    
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Wait for a slot.
+        
+        Args:
+            timeout: Maximum wait, capped at queue_timeout
+        
+        Raises:
+            QueueTimeoutError: if no slot freed up in time
+            RequestCancelled: if the waiting request was cancelled
+        """
+        wait_for = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+        deadline = time.time() + wait_for
+        with self._cond:
+            self.waiting += 1
+            try:
+                while not self._take_slot():
+                    raise_if_cancelled()
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise QueueTimeoutError(
+                            f"No '{self.name}' slot within {wait_for:.1f}s (limit {int(self.limit)})"
+                        )
+                    self._cond.wait(min(remaining, self.CANCEL_POLL_INTERVAL))
+            finally:
+                self.waiting -= 1
+    
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now."""
+        return self._take_slot()
+    
+    def release(self, seconds: Optional[float] = None, failed: bool = False):
+        """
+        Free a slot and update the limit.
+        
+        Args:
+            seconds: Latency of the finished call (None: call never went out)
+            failed: Whether the call failed
+        """
+        with self._synced() as shared:
+            inflight = len(self.slots) if shared else self.inflight
+            self.inflight -= 1
+            if shared:
+                pid = os.getpid()
+                mine = next((i for i, slot in enumerate(self.slots) if slot[0] == pid), None)
+                if mine is not None:
+                    del self.slots[mine]
+            if failed:
+                self._decrease()
+            elif seconds is not None:
+                self._update(seconds, inflight)
+            self._cond.notify_all()
+    
+    def backoff(self):
+        """Cut the limit after the upstream signalled overload (e.g. a 429)."""
+        with self._synced():
+            self._decrease()
+    
+    def _due(self) -> bool:
+        """Limit changes are applied at most once per round trip, so one burst moves it once."""
+        now = time.time()
+        if now - self._limit_changed_at < (self.short_rtt or 0.0):
+            return False
+        self._limit_changed_at = now
+        return True
+    
+    def _decrease(self):
+        if self._due():
+            self.limit = max(float(self.min_limit), self.limit * self.BACKOFF_RATIO)
+    
+    def _update(self, rtt: float, inflight: int):
+        now = time.time()
+        self.short_rtt = rtt if self.short_rtt is None else 0.9 * self.short_rtt + 0.1 * rtt
+        # Baseline: lowest smoothed latency seen, drifting up slowly so it can follow a slower upstream
+        if self.baseline_rtt is None or self.short_rtt < self.baseline_rtt:
+            self.baseline_rtt = self.short_rtt
+        else:
+            self.baseline_rtt *= 1 + self.BASELINE_DRIFT * (now - self._updated_at)
+        self._updated_at = now
+        if inflight < self.limit / 2 or not self._due():
+            return
+        gradient = max(0.5, min(1.0, self.TOLERANCE * self.baseline_rtt / self.short_rtt))
+        estimate = self.limit * gradient + math.sqrt(self.limit)
+        limit = (1 - self.SMOOTHING) * self.limit + self.SMOOTHING * estimate
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+    
+    def status(self) -> Dict[str, Any]:
+        with self._synced() as shared:
+            inflight = len(self.slots) if shared else self.inflight
+            return {"limit": int(self.limit), "inflight": inflight, "queued": self.waiting}
+
+
+class UpstreamGuard:
+    """
+    Hedged calls to one upstream behind a circuit breaker and an adaptive concurrency limit.
+    """
+    
+    HEDGE_QUANTILE = 0.95
+    MIN_HEDGE_DELAY = 0.05  # seconds
+    
+    def __init__(self, name: str, max_concurrency: int = 64, queue_timeout: float = 5.0,
+                 store: Optional[GuardStore] = None, **breaker_options):
+        """
+        Args:
+            name: Upstream name
+            max_concurrency: Upper bound of the adaptive concurrency limit
+            queue_timeout: Longest wait for a concurrency slot (seconds)
+            store: State shared with other processes (None: state is local to this guard)
+            breaker_options: CircuitBreaker settings
+        """
+        self.name = name
+        self.latency = LatencyTracker(store=store, name=name)
+        self.breaker = CircuitBreaker(name, store=store, **breaker_options)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            name, initial=min(8, max_concurrency), max_limit=max_concurrency, queue_timeout=queue_timeout,
+            store=store
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-call")
+        self.hedges_sent = 0
+        self.hedges_won = 0
+    
+    def _timed(self, fn: Callable[[], Any], prepare: Optional[Callable[[], Any]],
+               ignore_error: Optional[Callable[[Exception], bool]] = None):
+        """
+        Run one copy in its concurrency slot; prepare() (e.g. a rate-limit wait) is not timed.
+        
+        A copy that ends without an outcome (prepare failed, the request was
+        cancelled or the error is one ignore_error accepts) gives up the
+        half-open probe, so the next call can probe.
+        """
+        try:
+            if prepare is not None:
+                prepare()
+            raise_if_cancelled()
+        except Exception:
+            self.breaker.abandon_probe()
+            self.concurrency.release()
+            raise
+        started = time.time()
+        try:
+            result = fn()
+        except RequestCancelled:
+            self.breaker.abandon_probe()
+            self.concurrency.release()
+            raise
+        except Exception as e:
+            if ignore_error is not None and ignore_error(e):
+                self.breaker.abandon_probe()
+                self.concurrency.release()
+                raise
+            elapsed = time.time() - started
+            self.breaker.record(True, elapsed)
+            self.concurrency.release(elapsed, failed=True)
+            raise
+        elapsed = time.time() - started
+        self.breaker.record(False, elapsed)
+        self.concurrency.release(elapsed)
+        self.latency.record(elapsed)
+        return result
+    
+    def call(self, fn: Callable[[], Any], timeout: Optional[float] = None,
+             prepare: Optional[Callable[[], Any]] = None,
+             ignore_error: Optional[Callable[[Exception], bool]] = None) -> Any:
+        """
+        Call fn, hedging it once at the observed p95 latency.
+        
+        Args:
+            fn: Zero-argument callable making one upstream call
+            timeout: Maximum seconds to wait for any copy, queueing included (None = no limit)
+            prepare: Run before each copy, on the copy's thread and outside its latency measurement
+            ignore_error: Errors it returns True for say nothing about upstream health
+                (e.g. one API key's quota) and are not counted by the breaker or limiter
+        
+        Returns:
+            The first successful result
+        
+        Raises:
+            QueueTimeoutError: if no concurrency slot freed up in time
+            CircuitOpenError: if the circuit is open
+            RequestCancelled: if the calling request was cancelled (copies
+                already sent finish in the background, their results unused)
+            TimeoutError: if no copy answered within timeout
+            Exception: the last copy's error if every copy failed
+        """
+        raise_if_cancelled()
+        deadline = time.time() + timeout if timeout is not None else None
+        self.concurrency.acquire(timeout)
+        if not self.breaker.allow():
+            self.concurrency.release()
+            raise CircuitOpenError(f"Circuit for '{self.name}' is open")
+        
+        pending = {submit_in_context(self._executor, self._timed, fn, prepare, ignore_error)}
+        hedge_delay = self.latency.percentile(self.HEDGE_QUANTILE)
+        hedged = None
+        
+        if hedge_delay is not None:
+            hedge_delay = max(hedge_delay, self.MIN_HEDGE_DELAY)
+            if deadline is not None:
+                hedge_delay = min(hedge_delay, max(0.0, deadline - time.time()))
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done and self.breaker.current_state() == "closed" and self.concurrency.try_acquire():
+                hedged = submit_in_context(self._executor, self._timed, fn, prepare, ignore_error)
+                pending.add(hedged)
+                self.hedges_sent += 1
+        
+        error: Optional[BaseException] = None
+        while pending:
+            raise_if_cancelled()
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            poll = self.concurrency.CANCEL_POLL_INTERVAL
+            step = poll if remaining is None else min(remaining, poll)
+            done, pending = wait(pending, timeout=step, return_when=FIRST_COMPLETED)
+            if not done:
+                if remaining is not None and remaining <= step:
+                    break
+                continue
+            for future in done:
+                if future.exception() is None:
+                    if future is hedged:
+                        self.hedges_won += 1
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise TimeoutError(f"No answer from '{self.name}' within {timeout}s")
+    
+    def status(self) -> Dict[str, Any]:
+        """Breaker state, concurrency and hedging counters, for health checks."""
+        p95 = self.latency.percentile(self.HEDGE_QUANTILE)
+        return {
+            "circuit": self.breaker.current_state(),
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            **self.concurrency.status(),
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name: str, **options) -> UpstreamGuard:
+    """The process-wide guard of an upstream, sharing state with other processes (created on first use)."""
+    with _guards_lock:
+        if name not in _guards:
+            options.setdefault("store", shared_guard_store())
+            _guards[name] = UpstreamGuard(name, **options)
+        return _guards[name]
+
+
+def guard_status() -> Dict[str, Dict[str, Any]]:
+    """Status of every upstream guard created in this process."""
+    with _guards_lock:
+        guards = dict(_guards)
+    return {name: guard.status() for name, guard in guards.items()}
@@ -0,0 +1,772 @@
+"""
+Local Works Index
+=================
+BM25 inverted index over OpenAlex works (title, abstract and keywords) built
+from projected snapshot shards (see ingest_snapshot.py), so step 1 of
+find_top_journals can run without calling the /works search endpoint.
+
+- Posting lists are delta-encoded document numbers in variable-byte form,
+  decoded with vectorized NumPy; term frequencies are one byte per posting.
+- The vocabulary is a sorted, offset-indexed string blob searched by
+  bisection, so opening an index only memory-maps files.
+- Queries use the same syntax as build_search_query ("subject AND (a AND b)",
+  "subject AND (a OR b)"): AND binds tighter than OR and a multi-word term
+  matches works containing all of its words.
+- Scores are BM25 multiplied by a citation boost, mirroring the API's
+  preference for well-cited works.
+- Builds stream: postings are buffered up to BUILD_RUN_POSTINGS, spilled as
+  sorted runs and k-way merged into the posting file, so build memory is
+  bounded by the run size plus a few compact per-work columns.
+- Large corpora are split into shards by work ID (work ID modulo the shard
+  count, so a streaming build can route each work on arrival). Shards are
+  memory-mapped in the process that opens the index; queries visit the
+  shards one after another and the per-shard top-K lists are merged, using
+  corpus-wide BM25 statistics so scores are comparable across shards.
+  Sharding bounds build memory and per-shard array sizes; it does not make
+  a single query faster (the scoring loops hold the GIL, so a thread pool
+  measured no faster than visiting the shards in turn).
+
+Usage:
+    python works_index.py build <shards/works> [index_dir] [num_shards]
+    python works_index.py search <index_dir> "<query>"
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import time
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from journal_store import discover_partitions, iter_jsonl_records, openalex_key
+
+logger = logging.getLogger(__name__)
+
+OPENALEX_PREFIX = "https://openalex.org/"
+SHARDS_FILE = "shards.json"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'from', 'as', 'is', 'was', 'are', 'were', 'be', 'this', 'that', 'these', 'those', 'we',
+    'our', 'it', 'its', 'can', 'has', 'have', 'not', 'which', 'also'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase, split into alphanumeric tokens, drop stop words and strip a
+    plural 's' ("networks" -> "network").
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def encode_vbyte(values: np.ndarray) -> np.ndarray:
+    """
+    Variable-byte encode non-negative integers (7 bits per byte, high bit set
+    on every byte except a value's last).
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        group = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        group |= np.where(nbytes[mask] > k + 1, np.uint64(0x80), np.uint64(0))
+        out[starts[mask] + k] = group.astype(np.uint8)
+    return out
+
+
+def decode_vbyte(buffer: np.ndarray) -> np.ndarray:
+    """Decode a buffer written by encode_vbyte."""
+    buffer = np.asarray(buffer, dtype=np.uint8)
+    if len(buffer) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(buffer < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    
+    values = np.zeros(len(ends), dtype=np.uint64)
+    for k in range(int(lengths.max())):
+        mask = lengths > k
+        values[mask] |= (buffer[starts[mask] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+def parse_query(query: str):
+    """
+    Parse a build_search_query string into a tree.
+    
+    Returns:
+        ('term', [tokens]) | ('and', [children]) | ('or', [children]), or None if empty
+    """
+    parts = re.findall(r"\(|\)|[^()]+", query)
+    tokens: List[str] = []
+    for part in parts:
+        if part in "()":
+            tokens.append(part)
+        else:
+            # Split on standalone operators, keeping multi-word terms together
+            for piece in re.split(r"\s+(AND|OR)\s+|^(AND|OR)\s+|\s+(AND|OR)$|^(AND|OR)$", part.strip()):
+                if piece and piece.strip():
+                    tokens.append(piece.strip())
+    
+    position = 0
+    
+    def parse_or():
+        nonlocal position
+        children = [parse_and()]
+        while position < len(tokens) and tokens[position] == "OR":
+            position += 1
+            children.append(parse_and())
+        children = [child for child in children if child]
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else ("or", children)
+    
+    def parse_and():
+        nonlocal position
+        children = [parse_atom()]
+        while position < len(tokens) and tokens[position] == "AND":
+            position += 1
+            children.append(parse_atom())
+        children = [child for child in children if child]
+        if not children:
+            return None
+        return children[0] if len(children) == 1 else ("and", children)
+    
+    def parse_atom():
+        nonlocal position
+        if position >= len(tokens):
+            return None
+        token = tokens[position]
+        if token == "(":
+            position += 1
+            node = parse_or()
+            if position < len(tokens) and tokens[position] == ")":
+                position += 1
+            return node
+        if token in (")", "AND", "OR"):
+            return None
+        position += 1
+        words = tokenize(token)
+        return ("term", words) if words else None
+    
+    return parse_or()
+
+
+def query_terms(node) -> List[str]:
+    """All distinct tokens in a parsed query, in order."""
+    if node is None:
+        return []
+    if node[0] == "term":
+        return list(node[1])
+    seen = []
+    for child in node[1]:
+        for token in query_terms(child):
+            if token not in seen:
+                seen.append(token)
+    return seen
+
+
+class WorksIndex:
+    """
+    Read-only, memory-mapped BM25 index over works.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    CITATION_BOOST = 0.5  # Score multiplier reaches 1.5 for the most-cited work
+    BUILD_RUN_POSTINGS = 1_000_000  # Postings held in memory before a sorted run is spilled
+    
+    def __init__(self, index_dir: Path):
+        """
+        Memory-map an index directory written by WorksIndex.build.
+        
+        Args:
+            index_dir: Index directory
+        """
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        
+        def load(name: str) -> np.ndarray:
+            return np.load(self.index_dir / f"{name}.npy", mmap_mode="r")
+        
+        def blob(name: str) -> np.ndarray:
+            path = self.index_dir / f"{name}.bin"
+            return np.memmap(path, dtype=np.uint8, mode="r") if path.stat().st_size else np.zeros(0, np.uint8)
+        
+        self.vocab = blob("vocab")
+        self.vocab_offsets = load("vocab_offsets")
+        self.document_frequency = load("df")
+        self.postings = blob("postings")
+        self.posting_offsets = load("posting_offsets")
+        self.term_frequencies = blob("tfs")
+        self.tf_offsets = load("tf_offsets")
+        
+        self.work_ids = load("work_id")
+        self.source_ids = load("source_id")
+        self.cited_by_count = load("cited_by_count")
+        self.is_oa = load("is_oa")
+        self.is_journal = load("is_journal")
+        self.doc_length = load("doc_length")
+        self.titles = blob("titles")
+        self.title_offsets = load("title_offsets")
+        
+        self.total_docs = int(self.meta["documents"])
+        self.average_length = float(self.meta["average_length"]) or 1.0
+        self.citation_norm = math.log1p(int(self.meta.get("max_cited_by_count", 0))) or 1.0
+    
+    def __len__(self) -> int:
+        return self.total_docs
+    
+    def _term(self, term_id: int) -> str:
+        start, end = int(self.vocab_offsets[term_id]), int(self.vocab_offsets[term_id + 1])
+        return bytes(self.vocab[start:end]).decode("utf-8")
+    
+    def term_id(self, term: str) -> Optional[int]:
+        """Binary-search the sorted vocabulary for a term."""
+        low, high = 0, len(self.vocab_offsets) - 2
+        while low <= high:
+            middle = (low + high) // 2
+            found = self._term(middle)
+            if found == term:
+                return middle
+            if found < term:
+                low = middle + 1
+            else:
+                high = middle - 1
+        return None
+    
+    def posting_list(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decode a term's postings.
+        
+        Returns:
+            Tuple of (sorted document numbers, term frequencies)
+        """
+        term_id = self.term_id(term)
+        if term_id is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+        start, end = int(self.posting_offsets[term_id]), int(self.posting_offsets[term_id + 1])
+        docs = np.cumsum(decode_vbyte(self.postings[start:end])).astype(np.int64)
+        tf_start, tf_end = int(self.tf_offsets[term_id]), int(self.tf_offsets[term_id + 1])
+        return docs, np.asarray(self.term_frequencies[tf_start:tf_end])
+    
+    def _match(self, node, cache: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        if node[0] == "term":
+            matched = None
+            for token in node[1]:
+                if token not in cache:
+                    cache[token] = self.posting_list(token)
+                docs = cache[token][0]
+                matched = docs if matched is None else np.intersect1d(matched, docs, assume_unique=True)
+            return matched
+        results = [self._match(child, cache) for child in node[1]]
+        combined = results[0]
+        for result in results[1:]:
+            if node[0] == "and":
+                combined = np.intersect1d(combined, result, assume_unique=True)
+            else:
+                combined = np.union1d(combined, result)
+        return combined
+    
+    def match(self, query: str, open_access_only: bool = False,
+              journals_only: bool = True) -> Tuple[np.ndarray, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Find documents matching a query and its filters.
+        
+        Returns:
+            Tuple of (matching document numbers, token -> decoded postings
+            (docs, term frequencies), reusable by score)
+        """
+        tree = parse_query(query)
+        cache: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if tree is None:
+            return np.zeros(0, dtype=np.int64), cache
+        docs = self._match(tree, cache)
+        if journals_only and len(docs):
+            docs = docs[np.asarray(self.is_journal[docs], dtype=bool)]
+        if open_access_only and len(docs):
+            docs = docs[np.asarray(self.is_oa[docs], dtype=bool)]
+        return docs, cache
+    
+    def count(self, query: str, open_access_only: bool = False) -> int:
+        """Number of works matching a query (the local per_page=1 probe)."""
+        return len(self.match(query, open_access_only)[0])
+    
+    def score(self, docs: np.ndarray, terms: List[str],
+              global_stats: Optional[Dict[str, Any]] = None,
+              postings: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None) -> np.ndarray:
+        """
+        BM25 with citation boost for the given documents.
+        
+        Args:
+            docs: Document numbers to score
+            terms: Query tokens
+            global_stats: Optional corpus-wide statistics ({'documents',
+                'average_length', 'df': {term: df}, 'max_cited_by_count'})
+                used instead of this index's own (for sharded indexes)
+            postings: Postings already decoded by match (decoded here if missing)
+        
+        Returns:
+            Scores aligned with docs
+        """
+        total_docs, average_length, citation_norm = self.total_docs, self.average_length, self.citation_norm
+        if global_stats:
+            total_docs = global_stats["documents"]
+            average_length = global_stats["average_length"] or 1.0
+            citation_norm = math.log1p(global_stats["max_cited_by_count"]) or 1.0
+        
+        scores = np.zeros(len(docs), dtype=np.float64)
+        lengths = np.asarray(self.doc_length[docs], dtype=np.float64)
+        norm = self.K1 * (1 - self.B + self.B * lengths / average_length)
+        
+        for term in terms:
+            posting_docs, tfs = postings[term] if postings and term in postings else self.posting_list(term)
+            if not len(posting_docs):
+                continue
+            df = global_stats["df"].get(term, len(posting_docs)) if global_stats else len(posting_docs)
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            positions = np.searchsorted(posting_docs, docs)
+            positions = np.minimum(positions, len(posting_docs) - 1)
+            present = posting_docs[positions] == docs
+            tf = np.where(present, tfs[positions], 0).astype(np.float64)
+            scores += idf * tf * (self.K1 + 1) / (tf + norm)
+        
+        citations = np.log1p(np.asarray(self.cited_by_count[docs], dtype=np.float64))
+        return scores * (1 + self.CITATION_BOOST * citations / citation_norm)
+    
+    def work(self, doc: int, score: float) -> Dict[str, Any]:
+        """Build a work record in the shape the fetcher reads from the /works API."""
+        start, end = int(self.title_offsets[doc]), int(self.title_offsets[doc + 1])
+        return {
+            "id": f"{OPENALEX_PREFIX}W{int(self.work_ids[doc])}",
+            "title": bytes(self.titles[start:end]).decode("utf-8"),
+            "cited_by_count": int(self.cited_by_count[doc]),
+            "open_access": {"is_oa": bool(self.is_oa[doc])},
+            "primary_location": {
+                "source": {
+                    "id": f"{OPENALEX_PREFIX}S{int(self.source_ids[doc])}",
+                    "type": "journal" if self.is_journal[doc] else None,
+                }
+            },
+            "relevance_score": round(float(score), 4),
+        }
+    
+    def search(self, query: str, top_n: int = 30, open_access_only: bool = False,
+               global_stats: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Top-N works for a query.
+        
+        Args:
+            query: build_search_query-style query string
+            top_n: Number of works to return
+            open_access_only: Keep only open access works (is_oa:true)
+            global_stats: Optional corpus-wide statistics (see score)
+        
+        Returns:
+            Tuple of (works best first, total matching works)
+        """
+        docs, postings = self.match(query, open_access_only)
+        if not len(docs):
+            return [], 0
+        scores = self.score(docs, query_terms(parse_query(query)), global_stats, postings)
+        if len(docs) > top_n:
+            top = np.argpartition(-scores, top_n - 1)[:top_n]
+        else:
+            top = np.arange(len(docs))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.work(int(docs[i]), float(scores[i])) for i in top], len(docs)
+    
+    @staticmethod
+    def build(records: Iterator[Dict[str, Any]], index_dir: Path, run_postings: Optional[int] = None) -> int:
+        """
+        Build an index from projected work records.
+        
+        Later records with the same work ID replace earlier ones, so shards
+        can be passed oldest first. Documents are numbered in work ID order.
+        
+        Args:
+            records: Projected works (see ingest_snapshot.project_work)
+            index_dir: Output directory
+            run_postings: Postings buffered per sorted run (default: BUILD_RUN_POSTINGS)
+        
+        Returns:
+            Number of indexed works
+        """
+        builder = IndexBuilder(index_dir, run_postings or WorksIndex.BUILD_RUN_POSTINGS)
+        for record in records:
+            builder.add(record)
+        return builder.finish()
+
+
+class IndexBuilder:
+    """
+    Streams works into a WorksIndex directory through sorted posting runs.
+    
+    Each added work contributes (term, work ID, arrival number, tf) postings
+    to an in-memory buffer; a full buffer is sorted and spilled as a run
+    file. finish() picks the latest arrival of every work ID, numbers the
+    documents in work ID order and k-way merges the runs term by term, so
+    only one term's posting list is in memory while the index is written.
+    """
+    
+    def __init__(self, index_dir: Path, run_postings: int):
+        """
+        Args:
+            index_dir: Output directory
+            run_postings: Postings buffered before a sorted run is spilled
+        """
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.run_dir = self.index_dir / "build_runs"
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+        self.run_dir.mkdir()
+        self.run_postings = max(1, run_postings)
+        self.runs: List[Path] = []
+        self.buffer: List[Tuple[str, int, int, int]] = []
+        
+        # Per-arrival columns (compact arrays, not records)
+        self.work_ids = array("q")
+        self.source_ids = array("q")
+        self.cited_by_count = array("i")
+        self.is_oa = array("B")
+        self.is_journal = array("B")
+        self.doc_length = array("i")
+        self.title_offsets = array("q", [0])
+        self.title_file = open(self.run_dir / "titles.bin", "wb")
+    
+    def add(self, work: Dict[str, Any]):
+        """Add one projected work (a later copy of the same work ID replaces it)."""
+        key = openalex_key(work.get("id") or "")
+        if not key:
+            return
+        arrival = len(self.work_ids)
+        text = " ".join([work.get("title") or "", work.get("abstract") or ""] + list(work.get("keywords") or []))
+        tokens = tokenize(text)
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        self.buffer.extend((token, key, arrival, min(tf, 255)) for token, tf in frequencies.items())
+        
+        self.work_ids.append(key)
+        self.source_ids.append(openalex_key(work.get("source_id") or ""))
+        self.cited_by_count.append(work.get("cited_by_count") or 0)
+        self.is_oa.append(bool(work.get("is_oa")))
+        self.is_journal.append(work.get("source_type") == "journal")
+        self.doc_length.append(len(tokens))
+        title = (work.get("title") or "").encode("utf-8")
+        self.title_file.write(title)
+        self.title_offsets.append(self.title_offsets[-1] + len(title))
+        
+        if len(self.buffer) >= self.run_postings:
+            self._spill()
+    
+    def _spill(self):
+        self.buffer.sort()
+        path = self.run_dir / f"run_{len(self.runs):05d}.tsv"
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{term}\t{work_id}\t{arrival}\t{tf}\n" for term, work_id, arrival, tf in self.buffer)
+        self.runs.append(path)
+        self.buffer = []
+    
+    @staticmethod
+    def _read_run(path: Path) -> Iterator[Tuple[str, int, int, int]]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                term, work_id, arrival, tf = line.rstrip("\n").split("\t")
+                yield term, int(work_id), int(arrival), int(tf)
+    
+    def finish(self) -> int:
+        """
+        Write the index files and remove the runs.
+        
+        Returns:
+            Number of indexed works
+        """
+        self.title_file.close()
+        self.buffer.sort()
+        arrivals = np.frombuffer(self.work_ids, dtype=np.int64) if self.work_ids else np.zeros(0, np.int64)
+        
+        # Latest arrival of each work ID wins; documents are numbered in work ID order
+        order = np.lexsort((np.arange(len(arrivals)), arrivals))
+        latest = np.ones(len(order), dtype=bool)
+        latest[:-1] = arrivals[order][1:] != arrivals[order][:-1]
+        winners = order[latest]
+        doc_of_arrival = np.full(len(arrivals), -1, dtype=np.int64)
+        doc_of_arrival[winners] = np.arange(len(winners))
+        count = len(winners)
+        
+        def column(values: array, dtype) -> np.ndarray:
+            values = np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype)
+            return values[winners]
+        
+        work_ids = arrivals[winners]
+        doc_length = column(self.doc_length, np.int32)
+        cited_by_count = column(self.cited_by_count, np.int32)
+        
+        # Postings: merge the sorted runs, one term at a time
+        merged = heapq.merge(*(self._read_run(path) for path in self.runs), iter(self.buffer))
+        encoded_terms: List[bytes] = []
+        posting_offsets, tf_offsets, df = [0], [0], []
+        with open(self.index_dir / "postings.bin", "wb") as posting_file, \
+                open(self.index_dir / "tfs.bin", "wb") as tf_file:
+            for term, entries in groupby(merged, key=itemgetter(0)):
+                docs, tfs = [], []
+                for _, _, arrival, tf in entries:
+                    doc = doc_of_arrival[arrival]
+                    if doc >= 0:
+                        docs.append(doc)
+                        tfs.append(tf)
+                if not docs:
+                    continue  # Only in superseded copies of works
+                encoded = encode_vbyte(np.diff(np.array(docs, dtype=np.int64), prepend=0))
+                posting_file.write(encoded.tobytes())
+                tf_file.write(bytes(tfs))
+                encoded_terms.append(term.encode("utf-8"))
+                posting_offsets.append(posting_offsets[-1] + len(encoded))
+                tf_offsets.append(tf_offsets[-1] + len(tfs))
+                df.append(len(docs))
+        
+        vocab_offsets = np.zeros(len(encoded_terms) + 1, dtype=np.int64)
+        vocab_offsets[1:] = np.cumsum([len(term) for term in encoded_terms])
+        with open(self.index_dir / "vocab.bin", "wb") as f:
+            f.write(b"".join(encoded_terms))
+        
+        # Titles in document order
+        title_offsets_by_arrival = np.frombuffer(self.title_offsets, dtype=np.int64)
+        title_blob = self.run_dir / "titles.bin"
+        titles = np.memmap(title_blob, dtype=np.uint8, mode="r") if title_blob.stat().st_size else np.zeros(0, np.uint8)
+        title_offsets = np.zeros(count + 1, dtype=np.int64)
+        with open(self.index_dir / "titles.bin", "wb") as f:
+            for doc, arrival in enumerate(winners):
+                start, end = title_offsets_by_arrival[arrival], title_offsets_by_arrival[arrival + 1]
+                f.write(titles[start:end].tobytes())
+                title_offsets[doc + 1] = title_offsets[doc] + (end - start)
+        del titles
+        
+        arrays = {
+            "vocab_offsets": vocab_offsets, "df": np.array(df, dtype=np.int32),
+            "posting_offsets": np.array(posting_offsets, dtype=np.int64),
+            "tf_offsets": np.array(tf_offsets, dtype=np.int64), "work_id": work_ids,
+            "source_id": column(self.source_ids, np.int64), "cited_by_count": cited_by_count,
+            "is_oa": column(self.is_oa, np.uint8), "is_journal": column(self.is_journal, np.uint8),
+            "doc_length": doc_length, "title_offsets": title_offsets,
+        }
+        for name, values in arrays.items():
+            np.save(self.index_dir / f"{name}.npy", values)
+        
+        meta = {
+            "documents": count,
+            "terms": len(encoded_terms),
+            "average_length": float(doc_length.mean()) if count else 0.0,
+            "max_cited_by_count": int(cited_by_count.max()) if count else 0,
+            "built_at": time.time(),
+        }
+        with open(self.index_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+        logger.info(f"Indexed {count} works ({len(encoded_terms)} terms, {len(self.runs)} spilled runs) "
+                    f"in {self.index_dir}")
+        return count
+
+
+class ShardedWorksIndex:
+    """
+    Works index split into shards by work ID, searched in-process.
+    """
+    
+    def __init__(self, index_root: Path):
+        """
+        Memory-map every shard listed in <index_root>/shards.json.
+        
+        Args:
+            index_root: Directory written by ShardedWorksIndex.build
+        """
+        self.index_root = Path(index_root)
+        with open(self.index_root / SHARDS_FILE, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        
+        self.shards = [WorksIndex(self.index_root / shard["dir"]) for shard in self.meta["shards"]]
+        self.total_docs = int(self.meta["documents"])
+    
+    def __len__(self) -> int:
+        return self.total_docs
+    
+    def global_stats(self, terms: List[str]) -> Dict[str, Any]:
+        """Corpus-wide BM25 statistics for the query terms."""
+        df = {}
+        for term in terms:
+            total = 0
+            for shard in self.shards:
+                term_id = shard.term_id(term)
+                if term_id is not None:
+                    total += int(shard.document_frequency[term_id])
+            df[term] = total
+        return {
+            "documents": self.total_docs,
+            "average_length": self.meta["average_length"],
+            "max_cited_by_count": self.meta["max_cited_by_count"],
+            "df": df,
+        }
+    
+    def search(self, query: str, top_n: int = 30,
+               open_access_only: bool = False) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Scatter a query to all shards and merge their top works.
+        
+        Same contract as WorksIndex.search.
+        """
+        stats = self.global_stats(query_terms(parse_query(query)))
+        works: List[Dict[str, Any]] = []
+        total = 0
+        for shard_works, shard_total in (shard.search(query, top_n, open_access_only, stats) for shard in self.shards):
+            works.extend(shard_works)
+            total += shard_total
+        works.sort(key=lambda work: work["relevance_score"], reverse=True)
+        return works[:top_n], total
+    
+    def count(self, query: str, open_access_only: bool = False) -> int:
+        """Number of works matching a query across all shards."""
+        return sum(shard.count(query, open_access_only) for shard in self.shards)
+    
+    @staticmethod
+    def build(records: Iterator[Dict[str, Any]], index_root: Path, num_shards: int,
+              run_postings: Optional[int] = None) -> int:
+        """
+        Build a sharded index, routing each work to shard (work ID % num_shards).
+        
+        Args:
+            records: Projected works (later records with the same ID win)
+            index_root: Output directory
+            num_shards: Number of shards
+            run_postings: Postings buffered per sorted run, split across the
+                shards (default: WorksIndex.BUILD_RUN_POSTINGS)
+        
+        Returns:
+            Number of indexed works
+        """
+        index_root = Path(index_root)
+        index_root.mkdir(parents=True, exist_ok=True)
+        num_shards = max(1, num_shards)
+        per_shard = max(1, (run_postings or WorksIndex.BUILD_RUN_POSTINGS) // num_shards)
+        
+        shard_dirs = [f"shard_{number:03d}" for number in range(num_shards)]
+        builders = [IndexBuilder(index_root / shard_dir, per_shard) for shard_dir in shard_dirs]
+        for record in records:
+            key = openalex_key(record.get("id") or "")
+            if key:
+                builders[key % num_shards].add(record)
+        
+        shards = []
+        documents = 0
+        total_length = 0.0
+        max_cited = 0
+        for shard_dir, builder in zip(shard_dirs, builders):
+            count = builder.finish()
+            with open(index_root / shard_dir / "meta.json", "r", encoding="utf-8") as f:
+                shard_meta = json.load(f)
+            documents += count
+            total_length += shard_meta["average_length"] * count
+            max_cited = max(max_cited, shard_meta["max_cited_by_count"])
+            shards.append({"dir": shard_dir, "documents": count})
+        
+        meta = {
+            "documents": documents,
+            "average_length": total_length / documents if documents else 0.0,
+            "max_cited_by_count": max_cited,
+            "partition": "work_id % shards",
+            "shards": shards,
+            "built_at": time.time(),
+        }
+        with open(index_root / SHARDS_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        
+        logger.info(f"Indexed {documents} works into {len(shards)} shards in {index_root}")
+        return documents
+
+
+def open_works_index(index_dir: Path):
+    """Open a sharded index if index_dir holds one, else a single index."""
+    index_dir = Path(index_dir)
+    if (index_dir / SHARDS_FILE).exists():
+        return ShardedWorksIndex(index_dir)
+    return WorksIndex(index_dir)
+
+
+def open_default_works_index():
+    """
+    Open the index at WORKS_INDEX_DIR (default: ./works_index) if it exists.
+    
+    Returns:
+        WorksIndex or ShardedWorksIndex, or None if no index has been built
+    """
+    index_dir = Path(os.getenv("WORKS_INDEX_DIR", Path(__file__).parent / "works_index"))
+    if not (index_dir / "meta.json").exists() and not (index_dir / SHARDS_FILE).exists():
+        return None
+    try:
+        index = open_works_index(index_dir)
+        logger.info(f"Loaded local works index ({len(index)} works)")
+        return index
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not open works index at {index_dir}: {e}")
+        return None
+
+
+def main():
+    """Command-line entry point: build or query an index."""
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "search"):
+        print(__doc__)
+        return
+    
+    if sys.argv[1] == "build":
+        shards = discover_partitions(Path(sys.argv[2]))
+        index_dir = Path(sys.argv[3]) if len(sys.argv) > 3 else Path(__file__).parent / "works_index"
+        num_shards = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+        logger.info(f"Indexing works from {len(shards)} shards...")
+        if num_shards > 1:
+            ShardedWorksIndex.build(iter_jsonl_records(shards), index_dir, num_shards)
+        else:
+            WorksIndex.build(iter_jsonl_records(shards), index_dir)
+    else:
+        index = open_works_index(Path(sys.argv[2]))
+        started = time.perf_counter()
+        works, total = index.search(sys.argv[3])
+        elapsed = (time.perf_counter() - started) * 1000
+        for work in works:
+            print(f"{work['relevance_score']:8.3f}  {work['cited_by_count']:>7}  {work['title'][:90]}")
+        print(f"{total} matching works in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -10,7 +10,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Gemini API Configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# GEMINI_API_KEYS (comma-separated) spreads calls over several keys (see key_pool.py)
+GEMINI_API_KEYS = [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or (GEMINI_API_KEYS[0] if GEMINI_API_KEYS else None)
 
 # File Paths
 FORMAT_REFERENCE_FILE = "format.json"
@@ -0,0 +1,131 @@
+"""
+Gemini Micro-Batching
+=====================
+Collects refinement and keyword-extraction jobs from concurrent requests
+for a few milliseconds and sends them to Gemini as one multi-item prompt,
+so the shared instruction block and context keywords are sent once per
+batch instead of once per job.
+
+Opt-in: set GEMINI_BATCH_WINDOW_MS (e.g. 5) to enable batching;
+GEMINI_BATCH_MAX_ITEMS (default 8) caps the jobs per prompt. A job
+submitted alone in its window, or whose item could not be parsed from the
+batched answer, resolves to None and the caller sends its own single
+prompt instead.
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# run_batch(key, jobs) -> one result per job (None = not parsed)
+BatchRunner = Callable[[Hashable, List[Any]], List[Optional[str]]]
+
+
+class MicroBatcher:
+    """
+    Groups jobs submitted within a short window into batched calls.
+    """
+    
+    def __init__(self, run_batch: BatchRunner, window: float, max_items: int = 8):
+        """
+        Args:
+            run_batch: Sends one batched call for jobs sharing a key
+            window: Seconds to wait for more jobs after the first one arrives
+            max_items: Jobs per batch; a full batch is sent without waiting
+        """
+        self.run_batch = run_batch
+        self.window = window
+        self.max_items = max(2, max_items)
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Hashable, Any, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self.stats = {"jobs": 0, "batches": 0, "batched_jobs": 0, "unparsed_jobs": 0}
+    
+    def submit(self, key: Hashable, job: Any) -> Future:
+        """
+        Queue a job for the next batch.
+        
+        Args:
+            key: Jobs are only batched with jobs of the same key (e.g. prompt context)
+            job: Payload passed to run_batch
+        
+        Returns:
+            Future resolving to the job's result, or None if the caller should
+            make a single call itself
+        """
+        future: Future = Future()
+        with self._lock:
+            self.stats["jobs"] += 1
+            self._pending.append((key, job, future))
+            if len(self._pending) >= self.max_items:
+                batch, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                # Batches run on their own thread so no caller's cancellation scope applies to them
+                threading.Thread(target=self._run, args=(batch,), name="gemini-batch", daemon=True).start()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+    
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is threading.current_thread():
+                self._timer = None
+        self._run(batch)
+    
+    def _run(self, batch: List[Tuple[Hashable, Any, Future]]):
+        groups: Dict[Hashable, List[Tuple[Any, Future]]] = {}
+        for key, job, future in batch:
+            groups.setdefault(key, []).append((job, future))
+        
+        for key, entries in groups.items():
+            if len(entries) == 1:
+                entries[0][1].set_result(None)  # Alone in its window: sent as a single call
+                continue
+            futures = [future for _, future in entries]
+            try:
+                results = self.run_batch(key, [job for job, _ in entries])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            results = (list(results) + [None] * len(entries))[:len(entries)]
+            unparsed = sum(result is None for result in results)
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["batched_jobs"] += len(entries) - unparsed
+                self.stats["unparsed_jobs"] += unparsed
+            for future, result in zip(futures, results):
+                future.set_result(result)
+    
+    def status(self) -> Dict[str, int]:
+        """Job and batch counters (jobs - batched_jobs + batches = upstream calls)."""
+        with self._lock:
+            return dict(self.stats)
+
+
+_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher(run_batch: BatchRunner) -> Optional[MicroBatcher]:
+    """
+    The process-wide batcher, or None when GEMINI_BATCH_WINDOW_MS is unset or 0.
+    
+    Args:
+        run_batch: Batch runner used when the batcher is first created
+    """
+    global _batcher
+    window_ms = float(os.getenv("GEMINI_BATCH_WINDOW_MS", "0") or 0)
+    if window_ms <= 0:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            max_items = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", "8"))
+            _batcher = MicroBatcher(run_batch, window_ms / 1000, max_items)
+        return _batcher
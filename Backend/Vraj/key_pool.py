@@ -0,0 +1,221 @@
+"""
+Gemini API Key Pool
+===================
+Spreads Gemini calls over several API keys, so refinement throughput
+scales with the number of provisioned keys instead of stopping at one
+key's quota.
+
+- Every key has its own bucket in the shared rate limiter
+  ("gemini:<key id>", GEMINI_REQUESTS_PER_MINUTE per key), so remaining
+  quota is tracked across all worker processes.
+- A call goes to the least-loaded healthy key: fewest calls in flight,
+  then fewest recent 429s, then fewest calls overall; keys without quota
+  left are skipped.
+- A 429 cools that key down (for Gemini's retry delay, else
+  GEMINI_KEY_COOLDOWN seconds) in every process while the other keys keep
+  serving; callers only wait when every key is exhausted or cooling down.
+- status() reports usage per key; the API server shows it in /health.
+
+Configuration (environment):
+    GEMINI_API_KEYS      Comma-separated keys (the pool is used with two or more)
+    GEMINI_KEY_COOLDOWN  Default cooldown after a 429 (default 60 seconds)
+
+Keys are identified by a short hash and never logged in full.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+
+try:
+    from cancellation import sleep as cancellable_sleep
+except ImportError:
+    from time import sleep as cancellable_sleep
+
+
+class PooledKey:
+    """
+    One API key with its usage counters and per-key model clients.
+    """
+    
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+        self.bucket = f"gemini:{self.key_id}"
+        self.inflight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.recent_429s: deque = deque()
+        self.cooldown_until = 0.0
+        self._client = None
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def model(self, model_name: str):
+        """A GenerativeModel for model_name that calls the API with this key."""
+        with self._lock:
+            if model_name not in self._models:
+                if self._client is None:
+                    self._client = glm.GenerativeServiceClient(client_options={"api_key": self.api_key})
+                model = genai.GenerativeModel(model_name)
+                # genai.configure() sets one key per process; bind this model to the key's own client
+                model._client = self._client
+                self._models[model_name] = model
+            return self._models[model_name]
+
+
+class GeminiKeyPool:
+    """
+    Routes Gemini calls over several API keys.
+    """
+    
+    RECENT_WINDOW = 300  # Seconds of 429 history used for routing and status
+    POLL_INTERVAL = 0.25  # Seconds between retries while every key is unavailable
+    
+    def __init__(self, api_keys: List[str], rate_limiter=None, requests_per_minute: float = 15,
+                 cooldown: float = 60):
+        """
+        Args:
+            api_keys: Gemini API keys (duplicates ignored)
+            rate_limiter: Shared RateLimiter for per-key buckets (None = no quota tracking)
+            requests_per_minute: Quota of each key
+            cooldown: Seconds a key rests after a 429 without a retry delay
+        """
+        self.keys = [PooledKey(key) for key in dict.fromkeys(api_keys)]
+        self.rate_limiter = rate_limiter
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        if rate_limiter:
+            for key in self.keys:
+                rate_limiter.add_bucket(key.bucket, requests_per_minute / 60, max(1.0, requests_per_minute))
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def _recent_429s(self, key: PooledKey, now: float) -> int:
+        while key.recent_429s and key.recent_429s[0] < now - self.RECENT_WINDOW:
+            key.recent_429s.popleft()
+        return len(key.recent_429s)
+    
+    def acquire(self, timeout: Optional[float] = None) -> PooledKey:
+        """
+        Pick the key for one call and take a token from its bucket.
+        
+        Args:
+            timeout: Maximum seconds to wait while every key is unavailable (None = no limit)
+        
+        Returns:
+            The least-loaded healthy key with quota left
+        
+        Raises:
+            TimeoutError: if no key had quota within timeout
+            RequestCancelled: if the request is cancelled while every key is unavailable
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            now = time.time()
+            with self._lock:
+                ranked = sorted(
+                    (key for key in self.keys if key.cooldown_until <= now),
+                    key=lambda key: (key.inflight, self._recent_429s(key, now), key.calls)
+                )
+            for key in ranked:
+                if self.rate_limiter is None or self.rate_limiter.acquire(key.bucket, timeout=0):
+                    with self._lock:
+                        key.calls += 1
+                    return key
+            # Every key is exhausted or cooling down: wait for the first one to recover
+            if deadline is not None and now >= deadline:
+                raise TimeoutError(f"No Gemini key had quota within {timeout:.0f}s")
+            cooldowns = [key.cooldown_until - now for key in self.keys if key.cooldown_until > now]
+            delay = min([self.POLL_INTERVAL] + cooldowns) if ranked else max(min(cooldowns), 0.01)
+            cancellable_sleep(delay if deadline is None else min(delay, max(deadline - now, 0.01)))
+    
+    @contextmanager
+    def in_flight(self, key: PooledKey) -> Iterator[None]:
+        """Count a call (hedges included) as in flight on a key."""
+        with self._lock:
+            key.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                key.inflight -= 1
+    
+    def throttle(self, key: PooledKey, seconds: Optional[float] = None):
+        """
+        Cool a key down after a 429, in every process sharing the rate limiter.
+        
+        Args:
+            key: Throttled key
+            seconds: Retry delay reported by Gemini (default: the pool's cooldown)
+        """
+        seconds = seconds if seconds is not None else self.cooldown
+        now = time.time()
+        with self._lock:
+            key.throttled += 1
+            key.recent_429s.append(now)
+            key.cooldown_until = max(key.cooldown_until, now + seconds)
+        if self.rate_limiter:
+            self.rate_limiter.block(key.bucket, seconds)
+    
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Usage per key.
+        
+        Returns:
+            Key id -> {'calls', 'inflight', 'throttled', 'recent_429s',
+            'cooldown_seconds', 'remaining_quota'}
+        """
+        now = time.time()
+        status = {}
+        for key in self.keys:
+            remaining = self.rate_limiter.available(key.bucket) if self.rate_limiter else None
+            with self._lock:
+                status[key.key_id] = {
+                    "calls": key.calls,
+                    "inflight": key.inflight,
+                    "throttled": key.throttled,
+                    "recent_429s": self._recent_429s(key, now),
+                    "cooldown_seconds": round(max(0.0, key.cooldown_until - now), 1),
+                    "remaining_quota": round(remaining, 1) if remaining is not None else None,
+                }
+        return status
+
+
+_key_pool: Optional[GeminiKeyPool] = None
+_key_pool_lock = threading.Lock()
+
+
+def configured_keys() -> List[str]:
+    """Keys listed in GEMINI_API_KEYS."""
+    return [key.strip() for key in os.getenv("GEMINI_API_KEYS", "").split(",") if key.strip()]
+
+
+def get_key_pool(rate_limiter=None) -> Optional[GeminiKeyPool]:
+    """
+    The process-wide key pool, or None unless GEMINI_API_KEYS lists two or more keys.
+    
+    Args:
+        rate_limiter: Shared RateLimiter used when the pool is first created
+    """
+    global _key_pool
+    keys = configured_keys()
+    if len(set(keys)) < 2:
+        return None
+    with _key_pool_lock:
+        if _key_pool is None:
+            _key_pool = GeminiKeyPool(
+                keys,
+                rate_limiter,
+                requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15")),
+                cooldown=float(os.getenv("GEMINI_KEY_COOLDOWN", "60")),
+            )
+        return _key_pool
@@ -1,7 +1,137 @@
 import os
+import re
+import sys
 import json
+import threading
 import google.generativeai as genai
-from typing import Dict, Any
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from gemini_batch import get_batcher
+from prompt_cache import get_prefix_cache
+
+# The upstream rate limiter and guards are shared with the journal fetcher (Backend/Aadi)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Aadi"))
+try:
+    from rate_limiter import backoff_delay, gemini_retry_delay, is_rate_limit_error, shared_limiter
+    from upstream_guard import get_guard
+    from cancellation import RequestCancelled, raise_if_cancelled, submit_in_context
+except ImportError:  # Vraj deployed on its own: calls are not rate limited, hedged, cancellable or pooled
+    shared_limiter = None
+    get_guard = None
+    
+    class RequestCancelled(Exception):
+        """Never raised: requests are not cancellable without Aadi's cancellation module"""
+    
+    def raise_if_cancelled():
+        pass
+    
+    def submit_in_context(executor, fn, *args, **kwargs):
+        return executor.submit(fn, *args, **kwargs)
+
+from key_pool import get_key_pool
+
+# Attempts per Gemini call when the API reports quota exhaustion (429)
+GEMINI_MAX_RETRIES = 3
+# Longest wait for one Gemini answer (hedges included) before falling back
+GEMINI_TIMEOUT = 20  # seconds
+
+# Refinement routing by field length (see PaperSearchBackend.choose_strategy)
+SHORT_FIELD_WORDS = 4      # Up to this many words: local refiner or the light model
+LONG_FIELD_WORDS = 120     # Above this many words: refined in sentence chunks
+CHUNK_WORDS = 60           # Target words per chunk
+MAX_PARALLEL_CHUNKS = 4
+# Lighter model for short fields (empty = use the main model)
+GEMINI_LIGHT_MODEL = os.getenv("GEMINI_LIGHT_MODEL", "gemini-2.0-flash-lite").strip()
+
+# Abbreviations and initials whose period does not end a sentence ("e.g. Graph",
+# "Fig. 3", "J. Smith"): chunks are not split after them
+NON_TERMINAL_PERIOD = re.compile(
+    r"(?:\b(?i:e\.g|i\.e|et al|vs|cf|fig|figs|eq|eqs|no|approx|dr|prof|ref|refs)|(?<![A-Za-z])[A-Z])\.$"
+)
+
+# Words short fields may contain and still be refined locally (besides
+# abbreviations and the format.json keyword vocabulary)
+CONNECTIVES = {"and", "or", "of", "for", "in", "on", "the", "with", "to", "&"}
+
+# Abbreviations the refinement prompt asks Gemini to expand, for local use
+# when a field has to be expanded without a model call
+ABBREVIATIONS = {
+    "ai": "artificial intelligence",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "nlp": "natural language processing",
+    "cv": "computer vision",
+    "cnn": "convolutional neural networks",
+    "cnns": "convolutional neural networks",
+    "rnn": "recurrent neural networks",
+    "rnns": "recurrent neural networks",
+    "gan": "generative adversarial networks",
+    "gans": "generative adversarial networks",
+    "gpu": "graphics processing unit",
+    "llm": "large language model",
+    "llms": "large language models",
+    "rl": "reinforcement learning",
+    "nn": "neural networks",
+    "iot": "internet of things",
+}
+
+# Rules shared by the single and batched (gemini_batch) refinement prompts
+REFINEMENT_RULES = """1. Fix ALL spelling mistakes (papr → paper, presants → presents, etc.)
+2. Expand ALL abbreviations and short forms to their full forms:
+   - ML → machine learning
+   - AI → artificial intelligence
+   - NLP → natural language processing
+   - DL → deep learning
+   - CNN → convolutional neural networks
+   - RNN → recurrent neural networks
+   - CV → computer vision
+   - GPU → graphics processing unit
+   - LLM → large language model
+   - RL → reinforcement learning
+   - etc.
+3. IMPORTANT: Only expand abbreviations, do NOT change "AI and ML" to "Artificial Intelligence and Machine Learning" - change it to "artificial intelligence and machine learning" (lowercase, just expanded)
+4. Keep the original structure and meaning intact
+5. Use proper academic terminology
+6. Maintain professional language
+7. Do NOT add extra information or change the core content"""
+
+# Rules shared by the single and batched keyword extraction prompts
+KEYWORD_RULES = """1. Extract EXACTLY 15-20 most relevant technical keywords and phrases for maximum search precision
+2. Use lowercase for all terms (e.g., "machine learning", "deep learning", "artificial intelligence")
+3. Expand ALL abbreviations to full forms (AI → artificial intelligence, ML → machine learning, DL → deep learning, NLP → natural language processing, etc.)
+4. Include NO abbreviations in the keywords - only full expanded terms
+5. Focus on technical terms, methodologies, technologies, and research areas
+6. Include variations and related terms for better search coverage"""
+
+# Static instruction prefixes (cached by prompt_cache when enabled); the
+# per-call part after them only carries the field, context terms and text
+REFINEMENT_INSTRUCTIONS = f"""You are a text refinement assistant for academic paper searches. Your task is to refine the field of a paper given after these instructions.
+
+Instructions:
+{REFINEMENT_RULES}
+8. Return ONLY the refined text, nothing else (no explanations, no quotes, no markdown)"""
+
+KEYWORD_INSTRUCTIONS = f"""Extract the most relevant technical keywords and terms from the academic text given after these instructions.
+
+Instructions:
+{KEYWORD_RULES}
+7. Return ONLY a comma-separated list of keywords, nothing else (no numbering, no explanations)"""
+
+BATCH_INSTRUCTIONS = f"""You are a text refinement and keyword extraction assistant for academic paper searches. Complete every item given after these instructions.
+
+Items with task "refine" - refine the given field of a paper:
+{REFINEMENT_RULES}
+
+Items with task "keywords" - extract the most relevant technical keywords and terms from the text:
+{KEYWORD_RULES}
+
+Return ONLY a JSON array with one object per item, {{"id": <item id>, "result": ...}}, where result is the refined text (a string) for "refine" items and the keywords (an array of strings) for "keywords" items. No explanations, no markdown."""
+
+# format.json keywords included as context per prompt (the most similar to the input)
+CONTEXT_KEYWORD_LIMIT = 8
 
 class PaperSearchBackend:
     def __init__(self, api_key: str):
@@ -12,8 +142,16 @@ class PaperSearchBackend:
             api_key: Your Gemini API key
         """
         genai.configure(api_key=api_key)
+        self.api_key = api_key
         # Use Gemini 2.0 Flash - fast and reliable
         self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.rate_limiter = shared_limiter() if shared_limiter else None
+        self.guard = get_guard("gemini") if get_guard else None
+        # Short fields go to a lighter model with its own latency profile (and guard)
+        self.light_model = genai.GenerativeModel(GEMINI_LIGHT_MODEL) if GEMINI_LIGHT_MODEL else None
+        self.light_guard = get_guard("gemini-light") if get_guard and self.light_model else None
+        # With GEMINI_API_KEYS, calls are spread over several keys (see key_pool.py)
+        self.key_pool = get_key_pool(self.rate_limiter) if self.rate_limiter else None
         
     def load_format_reference(self, format_file_path: str = "format.json") -> Dict:
         """
@@ -44,7 +182,302 @@ class PaperSearchBackend:
                 ]
             }
     
-    def refine_text_with_gemini(self, text: str, field_name: str, format_reference: Dict) -> str:
+    def _generate(self, prompt: str, prefix: str = "", light: bool = False):
+        """
+        Call the model through the shared 'gemini' rate-limit bucket.
+        
+        Quota errors (429) pause the bucket for the retry delay Gemini
+        reports (or a jittered exponential backoff) and are retried; other
+        errors are raised to the caller. Calls are hedged at the observed
+        p95 latency and queue for the adaptive concurrency limit; while the
+        Gemini circuit is open or the queue is full they fail at once
+        (CircuitOpenError, QueueTimeoutError) so callers use their local
+        fallbacks.
+        
+        With GEMINI_PROMPT_CACHE_MODEL set, the static prefix is served from
+        a Gemini context cache and only the prompt is sent.
+        
+        With a key pool, each copy of an attempt (hedges included) takes a
+        token from the least-loaded healthy key's bucket instead of the
+        shared 'gemini' bucket, and a 429 cools only the key that got it
+        down before the next attempt moves on to another key. Such 429s are
+        one key's quota, so they do not count against the circuit breaker.
+        
+        Args:
+            prompt: Prompt text (the per-call part when a prefix is given)
+            prefix: Static instruction prefix sent before the prompt
+            light: Use the light model (GEMINI_LIGHT_MODEL) if one is configured
+            
+        Returns:
+            The model response
+        """
+        light = light and self.light_model is not None
+        model = self.light_model if light else self.model
+        guard = self.light_guard if light else self.guard
+        # Prefix caches belong to the cache model, so light calls send the full prompt
+        prefix_cache = get_prefix_cache() if prefix and not light else None
+        # Key and cached model of each copy (a hedge takes its own key): prepare and
+        # call of one copy run on the same guard thread
+        copy = threading.local()
+        
+        def take_token():
+            copy.pool_key = None
+            # Bounded waits: the copy holds a guard slot while it waits for quota
+            if self.key_pool:
+                copy.pool_key = self.key_pool.acquire(timeout=GEMINI_TIMEOUT)
+            elif self.rate_limiter:
+                self.rate_limiter.take("gemini", GEMINI_TIMEOUT)
+            # Context caches belong to the key's project: only the configured key uses them
+            if prefix_cache and (copy.pool_key is None or copy.pool_key.api_key == self.api_key):
+                copy.cached_model = prefix_cache.model_for(prefix)
+            else:
+                copy.cached_model = None
+        
+        def call_model():
+            pool_key, cached_model = copy.pool_key, copy.cached_model
+            with self.key_pool.in_flight(pool_key) if pool_key else nullcontext():
+                try:
+                    if cached_model is not None:
+                        try:
+                            return cached_model.generate_content(prompt)
+                        except Exception as e:
+                            if type(e).__name__ not in ("NotFound", "PermissionDenied"):
+                                raise
+                            prefix_cache.invalidate(prefix)  # Cache deleted or expired upstream
+                    target = pool_key.model(model.model_name) if pool_key else model
+                    return target.generate_content(f"{prefix}\n\n{prompt}" if prefix else prompt)
+                except Exception as e:
+                    # A 429 is this key's quota: cool down the key that got it, hedges included
+                    if pool_key is not None and is_rate_limit_error(e):
+                        self.key_pool.throttle(pool_key, gemini_retry_delay(e))
+                    raise
+        
+        def key_quota_error(error: Exception) -> bool:
+            """With a key pool, a 429 is one key's quota and not a sign of an unhealthy upstream."""
+            return self.key_pool is not None and is_rate_limit_error(error)
+        
+        attempts = GEMINI_MAX_RETRIES + (len(self.key_pool) - 1 if self.key_pool else 0)
+        for attempt in range(attempts):
+            try:
+                if guard:
+                    return guard.call(call_model, timeout=GEMINI_TIMEOUT, prepare=take_token,
+                                      ignore_error=key_quota_error)
+                take_token()
+                return call_model()
+            except Exception as e:
+                if not self.rate_limiter or not is_rate_limit_error(e) or attempt == attempts - 1:
+                    raise
+                if self.key_pool is None:  # Pooled keys were cooled down by the copy that got the 429
+                    delay = gemini_retry_delay(e)
+                    self.rate_limiter.block("gemini", delay if delay is not None else backoff_delay(attempt, 2.0))
+    
+    def _complete(self, prefix: str, prompt: str, job: Dict, light: bool = False) -> str:
+        """
+        Model answer text for a refinement or keyword prompt.
+        
+        With GEMINI_BATCH_WINDOW_MS set, the job is first offered to the
+        micro-batcher, which answers it together with concurrent jobs in one
+        call; if it was alone in its window or its item could not be parsed
+        from the batched answer, the single prompt is sent as before. Jobs
+        routed to the light model are not batched.
+        
+        Args:
+            prefix: Static instructions of the single-job prompt
+            prompt: Per-call part of the single-job prompt
+            job: {'task': "refine" or "keywords", 'field', 'text', 'subject', 'terms'}
+            light: Send the job to the light model
+        
+        Returns:
+            Raw answer text (keywords comma-separated)
+        """
+        if light and self.light_model is not None:
+            return self._generate(prompt, prefix, light=True).text
+        batcher = get_batcher(PaperSearchBackend._run_batch)
+        if batcher:
+            future = batcher.submit(job["subject"], dict(job, backend=self))
+            while True:
+                try:
+                    result = future.result(timeout=0.1)
+                    break
+                except FutureTimeout:
+                    raise_if_cancelled()  # The batch still answers the other requests
+            if result is not None:
+                return result
+        return self._generate(prompt, prefix).text
+    
+    @staticmethod
+    def _batch_prompt(subject_area: str, jobs: List[Dict]) -> str:
+        """Per-call part of a multi-item prompt (follows BATCH_INSTRUCTIONS)."""
+        terms = list(dict.fromkeys(term for job in jobs for term in job["terms"]))
+        items = "\n".join(
+            json.dumps({"id": i, "task": job["task"], "field": job["field"] or "text", "text": job["text"]},
+                       ensure_ascii=False)
+            for i, job in enumerate(jobs)
+        )
+        return f"""{PaperSearchBackend._context_line(subject_area, terms)}
+
+Items (one JSON object per line):
+{items}
+
+JSON:"""
+    
+    @staticmethod
+    def _run_batch(subject_area: str, jobs: List[Dict]) -> List[Optional[str]]:
+        """
+        Answer several jobs with one Gemini call (runner for gemini_batch).
+        
+        Args:
+            subject_area: Reference subject area shared by the jobs
+            jobs: {'backend', 'task', 'field', 'text', 'terms'} dicts
+        
+        Returns:
+            Answer text per job, None where the item is missing or malformed
+        """
+        prompt = PaperSearchBackend._batch_prompt(subject_area, jobs)
+        response = jobs[0]["backend"]._generate(prompt, BATCH_INSTRUCTIONS)
+        answer = response.text.strip()
+        start, end = answer.find("["), answer.rfind("]")
+        try:
+            items = json.loads(answer[start:end + 1]) if start != -1 else []
+        except ValueError:
+            items = []
+        
+        results: List[Optional[str]] = [None] * len(jobs)
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict) or not isinstance(item.get("id"), int) or not 0 <= item["id"] < len(jobs):
+                continue
+            result = item.get("result")
+            if jobs[item["id"]]["task"] == "keywords" and isinstance(result, list):
+                result = ", ".join(str(keyword) for keyword in result)
+            if isinstance(result, str) and result.strip():
+                results[item["id"]] = result
+        return results
+    
+    @staticmethod
+    def expand_abbreviations(text: str) -> str:
+        """
+        Expand known abbreviations locally (no API call)
+        
+        Args:
+            text: Input text, e.g. "CV and DL"
+            
+        Returns:
+            Text with abbreviations replaced by their lowercase full forms
+        """
+        def replace(match):
+            return ABBREVIATIONS.get(match.group(0).lower(), match.group(0))
+        
+        return re.sub(r"\b[A-Za-z]{2,4}\b", replace, text)
+    
+    @staticmethod
+    def relevant_keywords(text: str, keywords: List[str], limit: int = CONTEXT_KEYWORD_LIMIT) -> List[str]:
+        """
+        Reference keywords most similar to the text (local lookup, no API call)
+        
+        A keyword matches when at least half of its words (abbreviations
+        expanded, compared by their first five letters so "network" and
+        "networks" agree) occur in the text.
+        
+        Args:
+            text: Input text, e.g. "ML" or an abstract
+            keywords: Reference keywords from format.json
+            limit: Maximum keywords returned
+            
+        Returns:
+            Matching keywords, best match first
+        """
+        def stems(value: str) -> set:
+            words = re.findall(r"[a-z0-9]+", PaperSearchBackend.expand_abbreviations(value).lower())
+            return {word[:5] for word in words}
+        
+        text_stems = stems(text)
+        scored = []
+        for position, keyword in enumerate(keywords):
+            keyword_stems = stems(keyword)
+            if keyword_stems:
+                score = len(keyword_stems & text_stems) / len(keyword_stems)
+                if score >= 0.5:
+                    scored.append((-score, position, keyword))
+        return [keyword for _, _, keyword in sorted(scored)[:limit]]
+    
+    @staticmethod
+    def _context_line(subject_area: str, terms: List[str]) -> str:
+        """Prompt context sentence with the reference subject and the relevant terms only."""
+        line = f"Context: This is related to {subject_area}."
+        return f"{line} Relevant terms include: {', '.join(terms)}" if terms else line
+    
+    @staticmethod
+    def choose_strategy(text: str, format_reference: Dict) -> str:
+        """
+        Pick how a field is refined from its size and content
+        
+        Args:
+            text: Input text to refine
+            format_reference: Reference format from format.json
+            
+        Returns:
+            "local" - short and made only of known abbreviations and terms
+                      ("ML", "AI and CV"): expanded locally, no API call
+            "light" - other short fields: the light model
+            "chunked" - long fields: refined in parallel sentence chunks
+            "standard" - everything else: one call to the main model
+        """
+        words = re.findall(r"[A-Za-z0-9&]+", text)
+        if len(words) > LONG_FIELD_WORDS:
+            return "chunked"
+        if len(words) > SHORT_FIELD_WORDS:
+            return "standard"
+        
+        vocabulary = set(CONNECTIVES) | set(ABBREVIATIONS)
+        for term in list(format_reference.get("keywords", [])) + list(ABBREVIATIONS.values()):
+            vocabulary.update(re.findall(r"[a-z0-9]+", term.lower()))
+        if all(word.lower() in vocabulary for word in words):
+            return "local"
+        return "light"
+    
+    @staticmethod
+    def split_sentences(text: str, chunk_words: int = CHUNK_WORDS) -> List[str]:
+        """
+        Split text at sentence boundaries into chunks of about chunk_words words
+        
+        Args:
+            text: Long text, e.g. an abstract
+            chunk_words: Target words per chunk (a single longer sentence stays whole)
+            
+        Returns:
+            Chunks in order; joining them with spaces restores the text
+        """
+        sentences = []
+        for piece in re.split(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])", text.strip()):
+            if sentences and NON_TERMINAL_PERIOD.search(sentences[-1]):
+                sentences[-1] += " " + piece
+            else:
+                sentences.append(piece)
+        chunks, current, current_words = [], [], 0
+        for sentence in sentences:
+            words = len(sentence.split())
+            if current and current_words + words > chunk_words:
+                chunks.append(" ".join(current))
+                current, current_words = [], 0
+            current.append(sentence)
+            current_words += words
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+    
+    def _refine_chunks(self, text: str, field_name: str, format_reference: Dict) -> str:
+        """Refine a long field as parallel sentence chunks and stitch the results back together."""
+        chunks = self.split_sentences(text)
+        with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_PARALLEL_CHUNKS)) as executor:
+            futures = [
+                submit_in_context(executor, self.refine_text_with_gemini, chunk,
+                                  f"{field_name} (part {i} of {len(chunks)})", format_reference, "standard")
+                for i, chunk in enumerate(chunks, 1)
+            ]
+            return " ".join(future.result() for future in futures)
+    
+    def refine_text_with_gemini(self, text: str, field_name: str, format_reference: Dict,
+                                strategy: Optional[str] = None) -> str:
         """
         Use Gemini API to refine text by correcting spelling mistakes and expanding short forms
         
@@ -52,46 +485,32 @@ class PaperSearchBackend:
             text: Input text to refine
             field_name: Name of the field (title, abstract, subjectArea)
             format_reference: Reference format from format.json
+            strategy: Override choose_strategy ("local", "light", "chunked", "standard")
             
         Returns:
             Refined text
         """
-        # Create context from format.json keywords for better refinement
-        keywords_context = ", ".join(format_reference.get("keywords", []))
+        strategy = strategy or self.choose_strategy(text, format_reference)
+        if strategy == "local":
+            return self.expand_abbreviations(text).strip()
+        if strategy == "chunked" and len(self.split_sentences(text)) > 1:
+            return self._refine_chunks(text, field_name, format_reference)
+        
+        # Context: only the format.json keywords relevant to this text
         subject_area = format_reference.get("subjectArea", "")
+        terms = self.relevant_keywords(text, format_reference.get("keywords", []))
         
-        prompt = f"""You are a text refinement assistant for academic paper searches. Your task is to refine the following {field_name}.
+        prompt = f"""Field: {field_name}
 
-Context: This is related to {subject_area}. Common terms include: {keywords_context}
+{self._context_line(subject_area, terms)}
 
 Input text: "{text}"
 
-Instructions:
-1. Fix ALL spelling mistakes (papr → paper, presants → presents, etc.)
-2. Expand ALL abbreviations and short forms to their full forms:
-   - ML → machine learning
-   - AI → artificial intelligence
-   - NLP → natural language processing
-   - DL → deep learning
-   - CNN → convolutional neural networks
-   - RNN → recurrent neural networks
-   - CV → computer vision
-   - GPU → graphics processing unit
-   - LLM → large language model
-   - RL → reinforcement learning
-   - etc.
-3. IMPORTANT: Only expand abbreviations, do NOT change "AI and ML" to "Artificial Intelligence and Machine Learning" - change it to "artificial intelligence and machine learning" (lowercase, just expanded)
-4. Keep the original structure and meaning intact
-5. Use proper academic terminology
-6. Maintain professional language
-7. Do NOT add extra information or change the core content
-8. Return ONLY the refined text, nothing else (no explanations, no quotes, no markdown)
-
 Refined text:"""
 
         try:
-            response = self.model.generate_content(prompt)
-            refined_text = response.text.strip()
+            job = {"task": "refine", "field": field_name, "text": text, "subject": subject_area, "terms": terms}
+            refined_text = self._complete(REFINEMENT_INSTRUCTIONS, prompt, job, light=strategy == "light").strip()
             # Remove any quotes that might be added
             refined_text = refined_text.strip('"').strip("'").strip('`')
             # Remove markdown code blocks if present
@@ -99,9 +518,11 @@ Refined text:"""
                 lines = refined_text.split('\n')
                 refined_text = '\n'.join(lines[1:-1]) if len(lines) > 2 else refined_text
             return refined_text
+        except RequestCancelled:
+            raise  # Client gone: no local fallback either
         except Exception as e:
             print(f"Error refining {field_name}: {e}")
-            return text  # Return original text if refinement fails
+            return self.expand_abbreviations(text)  # Local refinement if Gemini fails
     
     def extract_keywords_with_gemini(self, text: str, format_reference: Dict) -> list:
         """
@@ -114,28 +535,18 @@ Refined text:"""
         Returns:
             List of extracted keywords
         """
-        keywords_context = ", ".join(format_reference.get("keywords", []))
+        subject_area = format_reference.get("subjectArea", "")
+        terms = self.relevant_keywords(text, format_reference.get("keywords", []))
         
-        prompt = f"""Extract the most relevant technical keywords and terms from the following academic text.
-
-Context: Common AI/ML terms include: {keywords_context}
+        prompt = f"""{self._context_line(subject_area, terms)}
 
 Text: "{text}"
 
-Instructions:
-1. Extract EXACTLY 15-20 most relevant technical keywords and phrases for maximum search precision
-2. Use lowercase for all terms (e.g., "machine learning", "deep learning", "artificial intelligence")
-3. Expand ALL abbreviations to full forms (AI → artificial intelligence, ML → machine learning, DL → deep learning, NLP → natural language processing, etc.)
-4. Include NO abbreviations in the keywords - only full expanded terms
-5. Focus on technical terms, methodologies, technologies, and research areas
-6. Include variations and related terms for better search coverage
-7. Return ONLY a comma-separated list of keywords, nothing else (no numbering, no explanations)
-
 Keywords:"""
 
         try:
-            response = self.model.generate_content(prompt)
-            keywords_text = response.text.strip()
+            job = {"task": "keywords", "field": "", "text": text, "subject": subject_area, "terms": terms}
+            keywords_text = self._complete(KEYWORD_INSTRUCTIONS, prompt, job).strip()
             # Remove any quotes or formatting
             keywords_text = keywords_text.strip('"').strip("'").strip('`')
             # Remove markdown formatting if present
@@ -155,6 +566,8 @@ Keywords:"""
             
             # Return 15-20 keywords
             return keywords[:20]
+        except RequestCancelled:
+            raise
         except Exception as e:
             print(f"Error extracting keywords: {e}")
             # INTELLIGENT FALLBACK: Extract keywords from the actual text
@@ -273,6 +686,7 @@ Keywords:"""
         )
         
         # Refine title
+        raise_if_cancelled()  # Client gone: skip the remaining Gemini calls
         print("[3/7] Refining title...")
         refined_title = self.refine_text_with_gemini(
             input_data.get("title", ""), 
@@ -281,6 +695,7 @@ Keywords:"""
         )
         
         # Refine abstract
+        raise_if_cancelled()
         print("[4/7] Refining abstract...")
         refined_abstract = self.refine_text_with_gemini(
             input_data.get("abstract", ""), 
@@ -289,9 +704,11 @@ Keywords:"""
         )
         
         # Extract keywords from title and abstract
+        raise_if_cancelled()
         print("[5/7] Extracting keywords...")
         combined_text = f"{refined_title}. {refined_abstract}"
         keywords = self.extract_keywords_with_gemini(combined_text, format_reference)
+        raise_if_cancelled()
         
         # Validate percentages
         print("[6/7] Validating acceptance percentages...")
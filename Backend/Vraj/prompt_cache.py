@@ -0,0 +1,144 @@
+"""
+Gemini Prompt-Prefix Caching
+============================
+Keeps the static instruction block of the refinement and keyword prompts
+in Gemini context caches, so each call only sends its short per-field
+part (field name, relevant context terms, input text) and the prefix is
+not billed or processed again.
+
+Opt-in: set GEMINI_PROMPT_CACHE_MODEL to a versioned model that supports
+explicit caching (e.g. gemini-2.0-flash-001). Caches live for
+GEMINI_PROMPT_CACHE_TTL seconds (default 3600) and are extended before
+they expire.
+
+Gemini only caches content of at least a minimum token count (4096 for
+gemini-2.0-flash-001; GEMINI_PROMPT_CACHE_MIN_TOKENS). Prefixes estimated
+below it, or rejected by the model as invalid, are never cached: their
+calls send the full prompt and creation is not retried. Other creation
+failures (caching unsupported, quota) are retried after RETRY_SECONDS.
+"""
+
+import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+
+class PromptPrefixCache:
+    """
+    One Gemini context cache per static prompt prefix.
+    """
+    
+    RETRY_SECONDS = 600   # Wait before retrying a prefix whose cache could not be created
+    RENEW_MARGIN = 0.2    # Extend a cache once less than this fraction of its TTL is left
+    MIN_TOKENS = 4096     # Smallest content Gemini caches (gemini-2.0-flash-001)
+    CHARS_PER_TOKEN = 4   # Rough token estimate for English prompt text
+    
+    def __init__(self, model_name: str, ttl: float = 3600, min_tokens: Optional[int] = None):
+        """
+        Args:
+            model_name: Versioned model the caches are created for
+            ttl: Cache lifetime in seconds
+            min_tokens: Minimum cacheable token count of the model (default: MIN_TOKENS)
+        """
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.ttl = ttl
+        self.min_tokens = self.MIN_TOKENS if min_tokens is None else min_tokens
+        self._lock = threading.Lock()
+        # prefix hash -> {'cache', 'model', 'expires'}, {'failed_until'} or {'skipped'}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "failures": 0, "skipped": 0}
+    
+    def model_for(self, prefix: str) -> Optional[Any]:
+        """
+        A GenerativeModel bound to the cached prefix.
+        
+        Args:
+            prefix: Static instruction text (sent as the cached system instruction)
+        
+        Returns:
+            The model to send the remaining prompt to, or None to send the full prompt
+        """
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and "model" in entry and entry["expires"] - now > self.ttl * self.RENEW_MARGIN:
+                self.stats["hits"] += 1
+                return entry["model"]
+            if entry and (entry.get("skipped") or entry.get("failed_until", 0) > now):
+                self.stats["misses"] += 1
+                return None
+            if entry is None and len(prefix) / self.CHARS_PER_TOKEN < self.min_tokens:
+                logger.warning(f"Prompt prefix of about {len(prefix) // self.CHARS_PER_TOKEN} tokens is below "
+                               f"the {self.min_tokens} tokens {self.model_name} caches, sending full prompts")
+                self._entries[key] = {"skipped": True}
+                self.stats["skipped"] += 1
+                self.stats["misses"] += 1
+                return None
+            
+            try:
+                if entry and "cache" in entry and entry["expires"] > now:
+                    entry["cache"].update(ttl=datetime.timedelta(seconds=self.ttl))
+                    entry["expires"] = now + self.ttl
+                    self.stats["hits"] += 1
+                    return entry["model"]
+                cache = genai.caching.CachedContent.create(
+                    model=self.model_name,
+                    display_name=f"journal-recommender-{key[:12]}",
+                    system_instruction=prefix,
+                    ttl=datetime.timedelta(seconds=self.ttl),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+            except Exception as e:
+                # The model rejects the prefix itself (e.g. below its real minimum): retrying cannot help
+                if type(e).__name__ == "InvalidArgument":
+                    logger.warning(f"Prompt prefix cannot be cached, sending full prompts: {e}")
+                    self._entries[key] = {"skipped": True}
+                    self.stats["skipped"] += 1
+                else:
+                    logger.warning(f"Prompt prefix not cached, retrying in {self.RETRY_SECONDS}s: {e}")
+                    self._entries[key] = {"failed_until": now + self.RETRY_SECONDS}
+                    self.stats["failures"] += 1
+                self.stats["misses"] += 1
+                return None
+            
+            self._entries[key] = {"cache": cache, "model": model, "expires": now + self.ttl}
+            self.stats["created"] += 1
+            self.stats["hits"] += 1
+            return model
+    
+    def invalidate(self, prefix: str):
+        """Forget a prefix's cache (e.g. deleted upstream) so the next call recreates it."""
+        with self._lock:
+            self._entries.pop(hashlib.sha256(prefix.encode("utf-8")).hexdigest(), None)
+    
+    def status(self) -> Dict[str, int]:
+        """Cache hit/miss counters (skipped = prefixes never cached)."""
+        with self._lock:
+            return dict(self.stats)
+
+
+_prefix_cache: Optional[PromptPrefixCache] = None
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache() -> Optional[PromptPrefixCache]:
+    """The process-wide prefix cache, or None when GEMINI_PROMPT_CACHE_MODEL is unset."""
+    global _prefix_cache
+    model_name = os.getenv("GEMINI_PROMPT_CACHE_MODEL", "").strip()
+    if not model_name:
+        return None
+    with _prefix_cache_lock:
+        if _prefix_cache is None or _prefix_cache.model_name.split("/")[-1] != model_name.split("/")[-1]:
+            min_tokens = os.getenv("GEMINI_PROMPT_CACHE_MIN_TOKENS", "").strip()
+            _prefix_cache = PromptPrefixCache(model_name, float(os.getenv("GEMINI_PROMPT_CACHE_TTL", "3600")),
+                                              int(min_tokens) if min_tokens else None)
+        return _prefix_cache
@@ -0,0 +1,179 @@
+"""
+Tests for gemini_batch.py and batched Gemini calls in main.py
+Runs without calling Gemini (stub runners and answers stand in for the model)
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add this directory and Aadi's shared modules to path
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Aadi"))
+
+import gemini_batch
+from gemini_batch import MicroBatcher
+from main import PaperSearchBackend
+
+
+class RecordingRunner:
+    """Answers each job with its payload upper-cased and records the batches"""
+    
+    def __init__(self, answer=None):
+        self.batches = []
+        self.answer = answer or (lambda key, jobs: [job.upper() for job in jobs])
+    
+    def __call__(self, key, jobs):
+        self.batches.append((key, list(jobs)))
+        return self.answer(key, jobs)
+
+
+def test_full_batch_is_sent_without_waiting():
+    """max_items jobs go out at once, long before the window ends"""
+    runner = RecordingRunner()
+    batcher = MicroBatcher(runner, window=30, max_items=3)
+    
+    started = time.time()
+    futures = [batcher.submit("Biology", job) for job in ("a", "b", "c")]
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", "C"]
+    assert time.time() - started < 5, "full batch waited for the window"
+    assert runner.batches == [("Biology", ["a", "b", "c"])]
+    assert batcher.status() == {"jobs": 3, "batches": 1, "batched_jobs": 3, "unparsed_jobs": 0}
+    print("✓ Full batch is sent without waiting")
+
+
+def test_window_flushes_partial_batches():
+    """Jobs still pending when the window ends are sent; a job alone in its key gets None"""
+    runner = RecordingRunner()
+    batcher = MicroBatcher(runner, window=0.05, max_items=8)
+    
+    futures = [batcher.submit("Biology", "a"), batcher.submit("Biology", "b"), batcher.submit("Physics", "c")]
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", None]
+    assert runner.batches == [("Biology", ["a", "b"])], "single job sent as a batch"
+    
+    # The next window starts with the next job
+    later = [batcher.submit("Biology", "d"), batcher.submit("Biology", "e")]
+    assert [future.result(timeout=5) for future in later] == ["D", "E"]
+    assert len(runner.batches) == 2
+    print("✓ Window flushes partial batches")
+
+
+def test_short_or_long_answers_fill_with_none():
+    """Missing results resolve to None (caller sends its own prompt); extra ones are dropped"""
+    short = MicroBatcher(RecordingRunner(lambda key, jobs: ["A"]), window=30, max_items=3)
+    futures = [short.submit("Biology", job) for job in ("a", "b", "c")]
+    assert [future.result(timeout=5) for future in futures] == ["A", None, None]
+    assert short.status()["unparsed_jobs"] == 2
+    
+    long = MicroBatcher(RecordingRunner(lambda key, jobs: ["A", "B", "X", "Y"]), window=30, max_items=2)
+    futures = [long.submit("Biology", job) for job in ("a", "b")]
+    assert [future.result(timeout=5) for future in futures] == ["A", "B"]
+    print("✓ Wrong result counts fall back per item")
+
+
+def test_batch_error_reaches_every_waiter():
+    """A failed batched call raises in every job of the batch, and other keys still run"""
+    def answer(key, jobs):
+        if key == "Biology":
+            raise TimeoutError("Gemini did not answer")
+        return [job.upper() for job in jobs]
+    
+    batcher = MicroBatcher(RecordingRunner(answer), window=30, max_items=4)
+    failing = [batcher.submit("Biology", "a"), batcher.submit("Biology", "b")]
+    working = [batcher.submit("Physics", "c"), batcher.submit("Physics", "d")]
+    
+    for future in failing:
+        try:
+            future.result(timeout=5)
+            raise AssertionError("batch error not propagated")
+        except TimeoutError as e:
+            assert "did not answer" in str(e)
+    assert [future.result(timeout=5) for future in working] == ["C", "D"]
+    print("✓ Batch errors reach every waiter")
+
+
+def job(task: str, text: str, backend=None) -> dict:
+    return {"task": task, "field": "title", "text": text, "subject": "Biology", "terms": [], "backend": backend}
+
+
+def answering_backend(answer: str) -> PaperSearchBackend:
+    """A backend whose batched calls get answer and whose single prompts are recorded"""
+    backend = PaperSearchBackend("test-key")
+    backend.single_prompts = []
+    
+    def generate(prompt, prefix="", light=False):
+        if "Items (one JSON object per line)" in prompt:
+            return SimpleNamespace(text=answer)
+        backend.single_prompts.append(prompt)
+        return SimpleNamespace(text=f"single answer {len(backend.single_prompts)}")
+    
+    backend._generate = generate
+    return backend
+
+
+def test_run_batch_parses_items_by_id():
+    """Items are matched by id; keyword lists are joined; bad or missing items are None"""
+    answer = "Here you go:\n" + json.dumps([
+        {"id": 2, "result": ["coral reefs", "bleaching"]},
+        {"id": 0, "result": "Coral reef bleaching"},
+        {"id": 1, "result": "   "},
+        {"id": 7, "result": "out of range"},
+        {"id": "3", "result": "id is not an int"},
+    ]) + "\nDone."
+    backend = answering_backend(answer)
+    jobs = [job("refine", "coral bleeching", backend), job("refine", "reefs", backend),
+            job("keywords", "coral reef bleaching", backend), job("refine", "ocean", backend)]
+    
+    results = PaperSearchBackend._run_batch("Biology", jobs)
+    assert results == ["Coral reef bleaching", None, "coral reefs, bleaching", None], results
+    
+    for unparseable in ("I cannot help with that.", '[{"id": 0, "result": ', '{"id": 0, "result": "x"}'):
+        backend = answering_backend(unparseable)
+        jobs = [job("refine", "a", backend), job("refine", "b", backend)]
+        assert PaperSearchBackend._run_batch("Biology", jobs) == [None, None], unparseable
+    print("✓ Batched answers are parsed per item")
+
+
+def test_unparsed_item_falls_back_to_single_prompt():
+    """Through _complete, a job missing from the batched answer sends its own prompt"""
+    backend = answering_backend(json.dumps([{"id": 0, "result": "first refined"}]))
+    previous = os.environ.get("GEMINI_BATCH_WINDOW_MS")
+    os.environ["GEMINI_BATCH_WINDOW_MS"] = "200"
+    gemini_batch._batcher = None
+    try:
+        # Submit one at a time so the ids follow submission order
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(backend._complete, "", "single prompt a", job("refine", "a"))
+            while not gemini_batch._batcher or not gemini_batch._batcher.status()["jobs"]:
+                time.sleep(0.005)
+            second = executor.submit(backend._complete, "", "single prompt b", job("refine", "b"))
+            assert first.result(timeout=10) == "first refined"
+            assert second.result(timeout=10) == "single answer 1"
+        assert backend.single_prompts == ["single prompt b"], backend.single_prompts
+        assert gemini_batch._batcher.status()["unparsed_jobs"] == 1
+    finally:
+        gemini_batch._batcher = None
+        if previous is None:
+            os.environ.pop("GEMINI_BATCH_WINDOW_MS", None)
+        else:
+            os.environ["GEMINI_BATCH_WINDOW_MS"] = previous
+    print("✓ Unparsed items fall back to a single prompt")
+
+
+def run_all_tests():
+    """Run all micro-batching tests"""
+    test_full_batch_is_sent_without_waiting()
+    test_window_flushes_partial_batches()
+    test_short_or_long_answers_fill_with_none()
+    test_batch_error_reaches_every_waiter()
+    test_run_batch_parses_items_by_id()
+    test_unparsed_item_falls_back_to_single_prompt()
+    print("\n[PASS] Micro-batching tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,97 @@
+"""
+Tests for key_pool.py and pooled Gemini calls in main.py
+Runs without calling Gemini (fake models stand in for each key)
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add this directory and Aadi's shared modules to path
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Aadi"))
+
+from key_pool import GeminiKeyPool
+from main import PaperSearchBackend
+from rate_limiter import RateLimiter
+from upstream_guard import UpstreamGuard
+
+
+class ResourceExhausted(Exception):
+    """Stands in for google.api_core's 429 error"""
+
+
+class FakeModel:
+    """Answers after a delay, or fails with a 429"""
+    
+    def __init__(self, key_id: str, seconds: float, quota_left: bool):
+        self.key_id = key_id
+        self.seconds = seconds
+        self.quota_left = quota_left
+    
+    def generate_content(self, prompt: str) -> str:
+        time.sleep(self.seconds)
+        if not self.quota_left:
+            raise ResourceExhausted("429 Resource has been exhausted")
+        return f"answer from {self.key_id}"
+
+
+def pooled_backend(tmp: str, models: dict) -> PaperSearchBackend:
+    """A backend whose pool has one fake model per key and a guard that hedges at once"""
+    backend = PaperSearchBackend("test-key")
+    backend.rate_limiter = RateLimiter(db_path=Path(tmp) / "limits.db", buckets={"gemini": (1.0, 10.0)})
+    backend.key_pool = GeminiKeyPool(list(models), backend.rate_limiter, requests_per_minute=600)
+    for key in backend.key_pool.keys:
+        key.model = lambda model_name, model=models[key.api_key]: model
+    backend.guard = UpstreamGuard("gemini-test")
+    for _ in range(20):
+        backend.guard.latency.record(0.01)  # p95 of 10ms: the hedge goes out after MIN_HEDGE_DELAY
+    return backend
+
+
+def test_hedge_throttles_the_key_that_got_429():
+    """A hedge on another key answers, and only the first copy's key cools down"""
+    with tempfile.TemporaryDirectory() as tmp:
+        models = {
+            "key-one": FakeModel("key-one", 0.2, quota_left=False),
+            "key-two": FakeModel("key-two", 0.4, quota_left=True),
+        }
+        backend = pooled_backend(tmp, models)
+        first, second = backend.key_pool.keys
+        
+        assert backend._generate("prompt") == "answer from key-two"
+        assert backend.guard.hedges_sent == 1
+        assert first.throttled == 1, "key that got the 429 was not cooled down"
+        assert second.throttled == 0, "the hedge's key was throttled for the other copy's 429"
+        assert first.inflight == second.inflight == 0
+    print("✓ Hedged copies keep their own keys")
+
+
+def test_key_quota_does_not_trip_breaker():
+    """429s on pooled keys are retried on other keys and not counted as upstream failures"""
+    with tempfile.TemporaryDirectory() as tmp:
+        models = {
+            "key-one": FakeModel("key-one", 0.0, quota_left=False),
+            "key-two": FakeModel("key-two", 0.0, quota_left=False),
+            "key-three": FakeModel("key-three", 0.0, quota_left=True),
+        }
+        backend = pooled_backend(tmp, models)
+        backend.guard.latency.samples.clear()  # No hedging: one copy per attempt
+        
+        assert backend._generate("prompt") == "answer from key-three"
+        assert [key.throttled for key in backend.key_pool.keys] == [1, 1, 0]
+        assert not any(failed for failed, _ in backend.guard.breaker.calls), "429 counted as a failure"
+        assert backend.guard.breaker.state == "closed"
+    print("✓ Key quota errors do not trip the breaker")
+
+
+def run_all_tests():
+    """Run all key pool tests"""
+    test_hedge_throttles_the_key_that_got_429()
+    test_key_quota_does_not_trip_breaker()
+    print("\n[PASS] Key pool tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
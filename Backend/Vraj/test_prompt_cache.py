@@ -0,0 +1,219 @@
+"""
+Tests for prompt_cache.py and the prompt context in main.py
+Runs without calling Gemini (a stub stands in for genai's caching API)
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add this directory and Aadi's shared modules to path
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Aadi"))
+
+import prompt_cache
+from main import PaperSearchBackend
+from prompt_cache import PromptPrefixCache
+
+PREFIX = "Instructions: " + "refine the field of a paper. " * 600  # About 4200 tokens
+
+
+class InvalidArgument(Exception):
+    """Stands in for google.api_core's 400 error"""
+
+
+class NotFound(Exception):
+    """Stands in for google.api_core's 404 error"""
+
+
+class StubCachedContent:
+    """Records created caches and TTL extensions"""
+    
+    created = []
+    error = None
+    
+    def __init__(self, system_instruction: str):
+        self.system_instruction = system_instruction
+        self.updates = []
+    
+    @classmethod
+    def create(cls, model, display_name, system_instruction, ttl):
+        if cls.error is not None:
+            raise cls.error
+        cache = cls(system_instruction)
+        cls.created.append(cache)
+        return cache
+    
+    def update(self, ttl):
+        self.updates.append(ttl.total_seconds())
+
+
+class StubModel:
+    def __init__(self, answer, cached_content=None):
+        self.answer = answer
+        self.cached_content = cached_content
+        self.prompts = []
+    
+    @classmethod
+    def from_cached_content(cls, cached_content):
+        return cls("cached answer", cached_content)
+    
+    def generate_content(self, prompt: str):
+        self.prompts.append(prompt)
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return SimpleNamespace(text=self.answer)
+
+
+def stub_caching(error: Exception = None):
+    """Point prompt_cache at the stub caching API (restored by restore_caching)"""
+    StubCachedContent.created, StubCachedContent.error = [], error
+    original = prompt_cache.genai
+    prompt_cache.genai = SimpleNamespace(
+        caching=SimpleNamespace(CachedContent=StubCachedContent),
+        GenerativeModel=StubModel,
+    )
+    return original
+
+
+def restore_caching(original):
+    prompt_cache.genai = original
+
+
+def test_hit_extend_and_invalidate():
+    """A created cache is reused, extended near its expiry and recreated after invalidate"""
+    original = stub_caching()
+    try:
+        cache = PromptPrefixCache("gemini-2.0-flash-001", ttl=100)
+        model = cache.model_for(PREFIX)
+        assert model.cached_content.system_instruction == PREFIX
+        assert cache.model_for(PREFIX) is model, "cache not reused"
+        assert len(StubCachedContent.created) == 1
+        
+        entry = next(iter(cache._entries.values()))
+        entry["expires"] = time.time() + 10  # Less than RENEW_MARGIN of the TTL left
+        assert cache.model_for(PREFIX) is model
+        assert model.cached_content.updates == [100.0], "cache not extended"
+        assert entry["expires"] > time.time() + 90
+        assert len(StubCachedContent.created) == 1
+        
+        entry["expires"] = time.time() - 1  # Expired upstream: a new cache is created
+        assert cache.model_for(PREFIX) is not model
+        assert len(StubCachedContent.created) == 2
+        
+        cache.invalidate(PREFIX)
+        cache.model_for(PREFIX)
+        assert len(StubCachedContent.created) == 3, "invalidated prefix not recreated"
+        assert cache.status() == {"hits": 5, "misses": 0, "created": 3, "failures": 0, "skipped": 0}
+    finally:
+        restore_caching(original)
+    print("✓ Prefix caches are reused, extended and recreated")
+
+
+def test_small_prefix_is_never_cached():
+    """A prefix below the minimum token count is skipped once, without a create call"""
+    original = stub_caching()
+    try:
+        cache = PromptPrefixCache("gemini-2.0-flash-001")
+        for _ in range(3):
+            assert cache.model_for("Instructions: refine the field.") is None
+        assert StubCachedContent.created == [], "create called for a too-small prefix"
+        assert cache.status()["skipped"] == 1
+        assert cache.status()["misses"] == 3
+        
+        # A model with a lower minimum caches the same prefix
+        lower = PromptPrefixCache("gemini-2.0-flash-001", min_tokens=1)
+        assert lower.model_for("Instructions: refine the field.") is not None
+    finally:
+        restore_caching(original)
+    print("✓ Too-small prefixes are sent in full")
+
+
+def test_rejected_prefix_is_not_retried():
+    """InvalidArgument skips the prefix for good; other failures are retried after RETRY_SECONDS"""
+    original = stub_caching(InvalidArgument("Cached content is too small"))
+    try:
+        cache = PromptPrefixCache("gemini-2.0-flash-001")
+        assert cache.model_for(PREFIX) is None
+        entry = next(iter(cache._entries.values()))
+        assert entry == {"skipped": True}
+        StubCachedContent.error = None
+        assert cache.model_for(PREFIX) is None, "rejected prefix retried"
+        
+        StubCachedContent.error = RuntimeError("quota exceeded")
+        cache = PromptPrefixCache("gemini-2.0-flash-001")
+        assert cache.model_for(PREFIX) is None
+        StubCachedContent.error = None
+        assert cache.model_for(PREFIX) is None, "retried before RETRY_SECONDS"
+        next(iter(cache._entries.values()))["failed_until"] = time.time() - 1
+        assert cache.model_for(PREFIX) is not None
+        assert cache.status()["failures"] == 1
+    finally:
+        restore_caching(original)
+    print("✓ Rejected prefixes are not retried")
+
+
+def test_deleted_cache_falls_back_to_full_prompt():
+    """A cache deleted upstream (NotFound) is invalidated and the full prompt is sent"""
+    original = stub_caching()
+    previous = os.environ.get("GEMINI_PROMPT_CACHE_MODEL")
+    os.environ["GEMINI_PROMPT_CACHE_MODEL"] = "gemini-2.0-flash-001"
+    prompt_cache._prefix_cache = None
+    try:
+        backend = PaperSearchBackend("test-key")
+        backend.rate_limiter = backend.key_pool = backend.guard = None
+        backend.model = StubModel("full answer")
+        
+        assert backend._generate("Text: coral reefs", PREFIX).text == "cached answer"
+        cached_model = next(iter(prompt_cache._prefix_cache._entries.values()))["model"]
+        assert cached_model.prompts == ["Text: coral reefs"], "prefix sent with the cached model"
+        
+        cached_model.answer = NotFound("CachedContent not found")
+        assert backend._generate("Text: coral reefs", PREFIX).text == "full answer"
+        assert backend.model.prompts == [f"{PREFIX}\n\nText: coral reefs"]
+        assert not prompt_cache._prefix_cache._entries, "deleted cache not invalidated"
+    finally:
+        prompt_cache._prefix_cache = None
+        if previous is None:
+            os.environ.pop("GEMINI_PROMPT_CACHE_MODEL", None)
+        else:
+            os.environ["GEMINI_PROMPT_CACHE_MODEL"] = previous
+        restore_caching(original)
+    print("✓ Deleted caches fall back to the full prompt")
+
+
+def test_relevant_keywords_compact_context():
+    """Only reference keywords sharing at least half their words with the text are sent, best first"""
+    keywords = [
+        "machine learning", "deep learning", "computer vision", "neural networks",
+        "graph neural networks", "reinforcement learning", "data mining",
+    ]
+    relevant = PaperSearchBackend.relevant_keywords
+    
+    # Abbreviations are expanded and plurals match their singular
+    assert relevant("ML for CV", keywords) == ["machine learning", "computer vision", "deep learning",
+                                              "reinforcement learning"]
+    assert relevant("a neural network", keywords) == ["neural networks", "graph neural networks"]
+    # Full matches rank before half matches, ties keep the format.json order; a third is too little
+    assert relevant("deep learning on graph data", keywords) == ["deep learning", "machine learning",
+                                                                 "reinforcement learning", "data mining"]
+    assert relevant("ML for CV", keywords, limit=2) == ["machine learning", "computer vision"]
+    assert relevant("Protein folding", keywords) == []
+    assert relevant("", keywords) == []
+    print("✓ Context keywords are compacted to the relevant ones")
+
+
+def run_all_tests():
+    """Run all prompt cache tests"""
+    test_hit_extend_and_invalidate()
+    test_small_prefix_is_never_cached()
+    test_rejected_prefix_is_not_retried()
+    test_deleted_cache_falls_back_to_full_prompt()
+    test_relevant_keywords_compact_context()
+    print("\n[PASS] Prompt cache tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
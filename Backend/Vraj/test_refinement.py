@@ -0,0 +1,131 @@
+"""
+Tests for refinement routing and chunking in main.py
+Runs without calling Gemini (_complete is stubbed per test)
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add this directory and Aadi's shared modules to path
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Aadi"))
+
+from main import CHUNK_WORDS, LONG_FIELD_WORDS, SHORT_FIELD_WORDS, PaperSearchBackend
+
+FORMAT = {"subjectArea": "artificial intelligence", "keywords": ["machine learning", "transfer learning"]}
+
+
+def words(count: int) -> str:
+    return " ".join(f"word{i}" for i in range(count))
+
+
+def test_routing_thresholds():
+    """Short known fields stay local, other short ones go light, long ones are chunked"""
+    choose = PaperSearchBackend.choose_strategy
+    assert choose("ML", FORMAT) == "local"
+    assert choose("AI and CV", FORMAT) == "local"
+    assert choose("transfer learning for NLP", FORMAT) == "local", "format.json words not known"
+    assert choose("Transformr", FORMAT) == "light"
+    assert choose("ML for protein folding", FORMAT) == "light"
+    
+    assert choose(words(SHORT_FIELD_WORDS), FORMAT) == "light"
+    assert choose(words(SHORT_FIELD_WORDS + 1), FORMAT) == "standard"
+    assert choose("ML and AI and CV", FORMAT) == "standard", "known words above the short limit kept local"
+    assert choose(words(LONG_FIELD_WORDS), FORMAT) == "standard"
+    assert choose(words(LONG_FIELD_WORDS + 1), FORMAT) == "chunked"
+    print("✓ Fields are routed by size and vocabulary")
+
+
+def test_split_sentences_keeps_abbreviations_and_decimals():
+    """Periods in abbreviations, initials and decimals do not end a sentence"""
+    text = ("We compare GNNs, e.g. Graph attention networks, to CNNs. Accuracy rose from 91.5% to 98.2 "
+            "on 3.5 M images. Results follow Smith et al. (2020) and J. Doe. See Fig. 3 for details! "
+            "Is it robust? Yes.")
+    sentences = PaperSearchBackend.split_sentences(text, chunk_words=1)
+    assert sentences == [
+        "We compare GNNs, e.g. Graph attention networks, to CNNs.",
+        "Accuracy rose from 91.5% to 98.2 on 3.5 M images.",
+        "Results follow Smith et al. (2020) and J. Doe.",
+        "See Fig. 3 for details!",
+        "Is it robust?",
+        "Yes.",
+    ], sentences
+    assert " ".join(sentences) == text
+    print("✓ Sentences are split at real boundaries only")
+
+
+def test_split_sentences_packs_chunks():
+    """Sentences are packed into chunks of about chunk_words; a longer sentence stays whole"""
+    sentence = "This sentence has exactly six words."
+    text = " ".join([sentence] * 5)
+    assert PaperSearchBackend.split_sentences(text, chunk_words=12) == [
+        f"{sentence} {sentence}", f"{sentence} {sentence}", sentence
+    ]
+    
+    long_sentence = "Then " + words(CHUNK_WORDS + 10) + "."
+    chunks = PaperSearchBackend.split_sentences(f"Short one. {long_sentence} Short two.")
+    assert chunks == ["Short one.", long_sentence, "Short two."], chunks
+    assert PaperSearchBackend.split_sentences("  One sentence only  ") == ["One sentence only"]
+    print("✓ Sentences are packed into chunks")
+
+
+def recording_backend(delays: dict = None) -> PaperSearchBackend:
+    """A backend whose _complete answers with the upper-cased text, after delays[text] seconds"""
+    backend = PaperSearchBackend("test-key")
+    backend.jobs = []
+    lock = threading.Lock()
+    
+    def complete(prefix, prompt, job, light=False):
+        with lock:
+            backend.jobs.append(dict(job, light=light))
+        time.sleep((delays or {}).get(job["text"], 0))
+        return job["text"].upper()
+    
+    backend._complete = complete
+    return backend
+
+
+def test_chunks_reassembled_in_order():
+    """Chunks finishing out of order are stitched back in text order, each with its part label"""
+    sentences = [f"Sentence {i} " + words(CHUNK_WORDS - 2) + "." for i in range(6)]
+    text = " ".join(sentences)
+    # Earlier chunks answer last
+    backend = recording_backend({sentence: 0.05 * (len(sentences) - i) for i, sentence in enumerate(sentences)})
+    
+    refined = backend.refine_text_with_gemini(text, "abstract", FORMAT)
+    assert refined == " ".join(sentence.upper() for sentence in sentences)
+    assert sorted(job["field"] for job in backend.jobs) == sorted(
+        f"abstract (part {i} of 6)" for i in range(1, 7))
+    assert not any(job["light"] for job in backend.jobs)
+    print("✓ Chunks are reassembled in order")
+
+
+def test_long_single_sentence_is_not_chunked():
+    """A chunked field that is one sentence is refined with a single call"""
+    backend = recording_backend()
+    text = words(LONG_FIELD_WORDS + 5)
+    assert backend.refine_text_with_gemini(text, "abstract", FORMAT) == text.upper()
+    assert [job["field"] for job in backend.jobs] == ["abstract"]
+    
+    backend = recording_backend()
+    assert backend.refine_text_with_gemini("ML and CV", "title", FORMAT) == "machine learning and computer vision"
+    assert backend.jobs == [], "local field sent to Gemini"
+    assert backend.refine_text_with_gemini("Transformr", "title", FORMAT) == "TRANSFORMR"
+    assert backend.jobs[0]["light"] is True
+    print("✓ Routed fields make the expected calls")
+
+
+def run_all_tests():
+    """Run all refinement routing tests"""
+    test_routing_thresholds()
+    test_split_sentences_keeps_abbreviations_and_decimals()
+    test_split_sentences_packs_chunks()
+    test_chunks_reassembled_in_order()
+    test_long_single_sentence_is_not_chunked()
+    print("\n[PASS] Refinement routing tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -5,23 +5,34 @@ Connects Next.js frontend with Python backend (Vraj + Aadi integration)
 
 API Endpoints:
 - POST /api/recommend - Get journal recommendations
+- GET /api/recommend/{requestId} - Final result of a provisional recommendation
+- GET /api/subjects/suggest - Autocomplete subject areas
 
 Author: Vraj + Aadi + Kunj (Full Integration)
 Date: October 3, 2025
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import asyncio
+import hashlib
+import math
 import json
 import subprocess
 import sys
 import os
 from pathlib import Path
 import logging
+import re
 import tempfile
+import threading
 import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(
@@ -55,7 +66,50 @@ BASE_DIR = Path(__file__).parent.absolute()
 VRAJ_DIR = BASE_DIR / "Vraj"
 AADI_DIR = BASE_DIR / "Aadi"
 REFINED_OUTPUT = BASE_DIR / "refined_output.json"
-JOURNAL_RESULTS = AADI_DIR / "journal_results.json"
+# Journal search script, run once per request with its own criteria and results files
+FETCHER_SCRIPT = AADI_DIR / "fetch_journals.py"
+
+# Aadi's modules run in-process (fetcher, leaderboards, request cancellation)
+sys.path.insert(0, str(AADI_DIR))
+from cancellation import RequestCancelled, cancellation_scope, is_cancelled, submit_in_context
+
+# Speculative search: query OpenAlex from the raw input while Gemini refines it
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "").lower() in ("1", "true", "yes")
+# Minimum term overlap (Jaccard) for the speculative query to stand in for the refined one
+SPECULATION_MIN_OVERLAP = float(os.getenv("SPECULATION_MIN_OVERLAP", "0.5"))
+
+# Provisional results: answer from the subject leaderboard when the pipeline
+# takes longer than this many seconds (0 = always wait for the pipeline)
+RECOMMEND_DEADLINE = float(os.getenv("RECOMMEND_DEADLINE", "0"))
+# Background leaderboard refresh interval in hours (0 = off) and subjects always kept fresh
+LEADERBOARD_REFRESH_HOURS = float(os.getenv("LEADERBOARD_REFRESH_HOURS", "0"))
+LEADERBOARD_SUBJECTS = [s.strip() for s in os.getenv("LEADERBOARD_SUBJECTS", "").split(",") if s.strip()]
+# Cache warm-up after startup: number of top subjects warmed (0 = off), subjects
+# always warmed first (default: LEADERBOARD_SUBJECTS), OpenAlex request budget for
+# warm-up across all workers, and delay after startup (seconds)
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "0"))
+WARMUP_SUBJECTS = [s.strip() for s in os.getenv("WARMUP_SUBJECTS", "").split(",") if s.strip()] or LEADERBOARD_SUBJECTS
+WARMUP_REQUESTS_PER_MINUTE = float(os.getenv("WARMUP_REQUESTS_PER_MINUTE", "30"))
+WARMUP_DELAY = float(os.getenv("WARMUP_DELAY", "5"))
+# How long final results of provisional responses stay retrievable (seconds)
+PENDING_RESULT_TTL = 600
+
+# Admission control for /api/recommend: pipelines run at once, queued requests
+# per lane (frontend = interactive, X-API-Key = batch) and per client, and the
+# longest wait in the queue (seconds). Requests beyond the queue get 429.
+MAX_CONCURRENT_PIPELINES = int(os.getenv("MAX_CONCURRENT_PIPELINES", "4"))
+ADMISSION_QUEUE_INTERACTIVE = int(os.getenv("ADMISSION_QUEUE_INTERACTIVE", "16"))
+ADMISSION_QUEUE_BATCH = int(os.getenv("ADMISSION_QUEUE_BATCH", "8"))
+ADMISSION_QUEUE_PER_CLIENT = int(os.getenv("ADMISSION_QUEUE_PER_CLIENT", "4"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# How often a running request checks whether its client has disconnected (seconds)
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# Words ignored when extracting keywords locally
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+              'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'be',
+              'this', 'that', 'these', 'those', 'we', 'our', 'using', 'paper'}
 
 
 # Request/Response Models
@@ -90,6 +144,8 @@ class RecommendationResponse(BaseModel):
     inputData: dict
     recommendations: List[JournalRecommendation]
     processingTime: float
+    provisional: bool = False  # True for subject leaderboard results
+    requestId: Optional[str] = None  # Poll GET /api/recommend/{requestId} for the final result
 
 
 class FormatConverter:
@@ -255,67 +311,125 @@ class FormatConverter:
 class PipelineRunner:
     """Run the integrated pipeline and return results"""
     
+    _fetcher = None
+    _fetcher_lock = threading.Lock()
+    _speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+    _pipeline_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_PIPELINES, thread_name_prefix="pipeline")
+    _leaderboards = None
+    _leaderboard_refresher = None
+    _cache_warmer = None
+    
+    @staticmethod
+    def run_cancellable(input_data: dict, cancel_event: threading.Event) -> List[dict]:
+        """
+        Run the pipeline so that setting cancel_event (client disconnected)
+        stops its remaining Gemini and OpenAlex calls.
+        
+        Raises:
+            RequestCancelled: if cancelled before the pipeline finished
+        """
+        with cancellation_scope(cancel_event):
+            try:
+                return PipelineRunner.run_pipeline(input_data)
+            except Exception:
+                if cancel_event.is_set():
+                    raise RequestCancelled("Client disconnected")
+                raise
+    
     @staticmethod
     def run_pipeline(input_data: dict) -> List[dict]:
         """
         Run the integrated pipeline with given input data.
         
         Steps:
-        1. Write input to refined_output.json (bypass Vraj's interactive input)
-        2. Convert to format.json for Aadi
-        3. Run Aadi's journal search
-        4. Read and return results
+        1. Refine the input with Vraj (bypassing its interactive input)
+        2. Write the refined criteria to a per-request format.json
+        3. Run Aadi's journal search on it
+        4. Read and return the per-request results
+        
+        Each run works in its own temporary directory, so concurrent
+        pipelines never read each other's criteria or results.
+        
+        With SPECULATIVE_SEARCH enabled the pipeline runs in-process instead
+        (see _run_speculative_pipeline).
         """
+        if SPECULATIVE_SEARCH:
+            return PipelineRunner._run_speculative_pipeline(input_data)
+        
         try:
-            # Step 1: Convert openAccess from "yes"/"any" to 1/0 for backend
-            backend_data = {
-                "subjectArea": input_data["subjectArea"],
-                "keywords": [input_data["subjectArea"]],  # Will be refined by Vraj
-                "openAccess": 1 if input_data["openAccess"] == "yes" else 0,
-                "acceptancePercentFrom": input_data["accPercentFrom"],
-                "acceptancePercentTo": input_data["accPercentTo"]
-            }
-            
-            # Step 2: Write to refined_output.json (skip Vraj's interactive part)
-            # We'll call Vraj's refinement programmatically
+            # Step 1: Refine the input programmatically (skip Vraj's interactive part)
             refined_data = PipelineRunner._run_vraj_refinement(input_data)
             
-            # Step 3: Write to Aadi's format.json
-            format_file = AADI_DIR / "format.json"
-            with open(format_file, 'w', encoding='utf-8') as f:
-                json.dump(refined_data, f, indent=2, ensure_ascii=False)
+            with tempfile.TemporaryDirectory(prefix="pipeline-") as work_dir:
+                # Step 2: Write this request's format.json
+                format_file = Path(work_dir) / "format.json"
+                results_file = Path(work_dir) / "journal_results.json"
+                with open(format_file, 'w', encoding='utf-8') as f:
+                    json.dump(refined_data, f, indent=2, ensure_ascii=False)
+                
+                logger.info(f"Wrote format.json with {len(refined_data.get('keywords', []))} keywords")
+                
+                # Step 3: Run Aadi's journal search
+                PipelineRunner._run_aadi_search(format_file, results_file)
+                
+                # Step 4: Read results
+                if not results_file.exists():
+                    raise FileNotFoundError("journal_results.json not found after search")
+                
+                with open(results_file, 'r', encoding='utf-8') as f:
+                    results = json.load(f)
             
-            logger.info(f"Wrote format.json with {len(refined_data.get('keywords', []))} keywords")
+            logger.info(f"Found {len(results)} journal recommendations")
+            return results
             
-            # Step 3.5: Clear old cached results to prevent stale data
-            logger.info("Clearing old cached results...")
-            cache_files = [
-                AADI_DIR / "journal_results.json",
-                AADI_DIR / "__pycache__"
-            ]
-            for cache_file in cache_files:
-                try:
-                    if cache_file.exists():
-                        if cache_file.is_dir():
-                            import shutil
-                            shutil.rmtree(cache_file)
-                            logger.debug(f"Removed cache directory: {cache_file}")
-                        else:
-                            cache_file.unlink()
-                            logger.debug(f"Removed cache file: {cache_file}")
-                except Exception as e:
-                    logger.warning(f"Could not remove {cache_file}: {e}")
+        except Exception as e:
+            logger.error(f"Pipeline execution failed: {e}")
+            raise HTTPException(status_code=500, detail=f"Pipeline execution failed: {str(e)}")
+    
+    @staticmethod
+    def _run_speculative_pipeline(input_data: dict) -> List[dict]:
+        """
+        Run refinement and a speculative OpenAlex search concurrently.
+        
+        The works + sources fetch starts immediately from the raw subject and
+        title (abbreviations expanded locally) while Gemini refines the input.
+        If the refined query is close enough to the speculative one, the
+        speculative candidates are ranked and returned; otherwise the
+        speculative search is cancelled and the refined query is fetched.
+        """
+        try:
+            fetcher = PipelineRunner._get_fetcher()
+            speculative_criteria = PipelineRunner._build_speculative_criteria(input_data)
+            cancel_event = threading.Event()
+            
+            logger.info("Starting speculative OpenAlex search on raw input...")
+            speculative_future = submit_in_context(
+                PipelineRunner._speculation_pool, fetcher.gather_candidates, speculative_criteria, cancel_event
+            )
+            
+            refined_data = PipelineRunner._run_vraj_refinement(input_data)
             
-            # Step 4: Run Aadi's journal search
-            PipelineRunner._run_aadi_search()
+            is_valid, errors = fetcher.validate_criteria(refined_data)
+            if not is_valid:
+                cancel_event.set()
+                raise ValueError(f"Invalid search criteria: {'; '.join(errors)}")
             
-            # Step 5: Read results
-            if not JOURNAL_RESULTS.exists():
-                raise FileNotFoundError("journal_results.json not found after search")
+            overlap = PipelineRunner._query_overlap(fetcher, speculative_criteria, refined_data)
+            candidates = None
+            if overlap >= SPECULATION_MIN_OVERLAP:
+                candidates = speculative_future.result()
+                logger.info(f"Speculative search kept (query overlap {overlap:.2f})")
+            else:
+                cancel_event.set()
+                speculative_future.cancel()
+                logger.info(f"Speculative search discarded (query overlap {overlap:.2f}), refetching")
             
-            with open(JOURNAL_RESULTS, 'r', encoding='utf-8') as f:
-                results = json.load(f)
+            if not candidates:
+                candidates = fetcher.gather_candidates(refined_data)
+            if not candidates:
+                raise ValueError("No journals found for the refined criteria")
             
+            results = fetcher.rank_candidates(candidates)
             logger.info(f"Found {len(results)} journal recommendations")
             return results
             
@@ -323,6 +437,182 @@ class PipelineRunner:
             logger.error(f"Pipeline execution failed: {e}")
             raise HTTPException(status_code=500, detail=f"Pipeline execution failed: {str(e)}")
     
+    @staticmethod
+    def _get_fetcher():
+        """Return the shared in-process OpenAlexJournalFetcher"""
+        with PipelineRunner._fetcher_lock:
+            if PipelineRunner._fetcher is None:
+                sys.path.insert(0, str(AADI_DIR))
+                from fetch_journals import OpenAlexJournalFetcher
+                PipelineRunner._fetcher = OpenAlexJournalFetcher()
+            return PipelineRunner._fetcher
+    
+    @staticmethod
+    def data_version() -> Optional[int]:
+        """
+        Version of the local journal store data, for cache invalidation.
+        
+        The in-process fetcher's store handle follows delta updates
+        (Aadi/delta_update.py) without blocking lookups.
+        
+        Returns:
+            Data version, or None when no local store is available
+        """
+        try:
+            store = PipelineRunner._get_fetcher().journal_store
+        except Exception as e:
+            logger.warning(f"Could not load journal fetcher: {e}")
+            return None
+        return store.data_version if store is not None else None
+    
+    @staticmethod
+    def leaderboards():
+        """
+        The shared subject leaderboard store (Aadi/leaderboards.py).
+        
+        Returns:
+            LeaderboardStore, or None when the fetcher cannot be loaded
+        """
+        with PipelineRunner._fetcher_lock:
+            if PipelineRunner._leaderboards is not None:
+                return PipelineRunner._leaderboards
+        try:
+            fetcher = PipelineRunner._get_fetcher()
+            from leaderboards import LeaderboardStore
+        except Exception as e:
+            logger.warning(f"Could not load leaderboards: {e}")
+            return None
+        with PipelineRunner._fetcher_lock:
+            if PipelineRunner._leaderboards is None:
+                PipelineRunner._leaderboards = LeaderboardStore(subject_index=fetcher.subject_index)
+            return PipelineRunner._leaderboards
+    
+    @staticmethod
+    def start_leaderboard_refresh(interval_hours: float):
+        """Refresh subject leaderboards in the background every interval_hours"""
+        store = PipelineRunner.leaderboards()
+        if store is None:
+            return
+        from leaderboards import LeaderboardRefresher
+        refresher = LeaderboardRefresher(PipelineRunner._get_fetcher(), store, LEADERBOARD_SUBJECTS)
+        refresher.start(interval_hours * 3600)
+        PipelineRunner._leaderboard_refresher = refresher
+        logger.info(f"Leaderboard refresh every {interval_hours:g}h started")
+    
+    @staticmethod
+    def start_cache_warmup(top_n: int):
+        """
+        Warm what live requests share with this process (state files, page cache,
+        leaderboards) for the top_n popular subjects in the background, yielding to live traffic
+        """
+        store = PipelineRunner.leaderboards()
+        if store is None:
+            return
+        from cache_warmer import CacheWarmer
+        warmer = CacheWarmer(
+            PipelineRunner._get_fetcher(), store, WARMUP_SUBJECTS,
+            top_n=top_n,
+            requests_per_minute=WARMUP_REQUESTS_PER_MINUTE,
+            is_busy=admission_control.busy,
+        )
+        warmer.start(WARMUP_DELAY)
+        PipelineRunner._cache_warmer = warmer
+        logger.info(f"Cache warm-up of the top {top_n} subjects scheduled in {WARMUP_DELAY:g}s")
+    
+    @staticmethod
+    def warmup_status() -> dict:
+        """Progress of the startup cache warm-up (empty when it is off)"""
+        warmer = PipelineRunner._cache_warmer
+        return warmer.status() if warmer is not None else {}
+    
+    @staticmethod
+    def subject_index():
+        """
+        The in-process fetcher's subject index (Aadi/subject_index.py).
+        
+        Returns:
+            SubjectIndex, or None when it has not been built
+        """
+        try:
+            return PipelineRunner._get_fetcher().subject_index
+        except Exception as e:
+            logger.warning(f"Could not load journal fetcher: {e}")
+            return None
+    
+    @staticmethod
+    def upstream_status() -> dict:
+        """
+        Circuit breaker and hedging state of the upstream APIs (Aadi/upstream_guard.py).
+        
+        Returns:
+            Upstream name -> status, empty when the fetcher cannot be loaded
+        """
+        try:
+            PipelineRunner._get_fetcher()
+            from upstream_guard import guard_status
+        except Exception as e:
+            logger.warning(f"Could not load journal fetcher: {e}")
+            return {}
+        return guard_status()
+    
+    @staticmethod
+    def gemini_key_status() -> dict:
+        """
+        Usage per Gemini API key (Vraj/key_pool.py).
+        
+        Returns:
+            Key id -> usage, empty unless GEMINI_API_KEYS lists several keys
+        """
+        try:
+            sys.path.insert(0, str(VRAJ_DIR))
+            from key_pool import get_key_pool
+            from rate_limiter import shared_limiter
+            pool = get_key_pool(shared_limiter())
+        except Exception as e:
+            logger.warning(f"Could not load Gemini key pool: {e}")
+            return {}
+        return pool.status() if pool else {}
+    
+    @staticmethod
+    def _build_speculative_criteria(input_data: dict) -> dict:
+        """
+        Build provisional search criteria from the raw subject and title.
+        
+        Abbreviations are expanded with Vraj's local map ("CV and DL" ->
+        "computer vision and deep learning") and the title's content words
+        stand in for Gemini's keywords.
+        """
+        sys.path.insert(0, str(VRAJ_DIR))
+        from main import PaperSearchBackend
+        
+        subject = PaperSearchBackend.expand_abbreviations(input_data["subjectArea"]).lower()
+        title = PaperSearchBackend.expand_abbreviations(input_data["title"]).lower()
+        
+        subject_words = set(re.findall(r'[a-z0-9-]+', subject))
+        keywords = []
+        for word in re.findall(r'\b[a-z][a-z-]{2,}\b', title):
+            if word not in STOP_WORDS and word not in keywords and word not in subject_words:
+                keywords.append(word)
+        
+        return {
+            "subjectArea": subject,
+            "keywords": keywords,
+            "openAccess": 1 if input_data["openAccess"] == "yes" else 0
+        }
+    
+    @staticmethod
+    def _query_overlap(fetcher, speculative_criteria: dict, refined_criteria: dict) -> float:
+        """Jaccard overlap of the content terms of two criteria's search queries"""
+        def terms(criteria: dict) -> set:
+            query = fetcher.build_search_query(criteria).lower()
+            return set(re.findall(r'[a-z0-9-]+', query)) - STOP_WORDS
+        
+        speculative_terms = terms(speculative_criteria)
+        refined_terms = terms(refined_criteria)
+        if not speculative_terms or not refined_terms:
+            return 0.0
+        return len(speculative_terms & refined_terms) / len(speculative_terms | refined_terms)
+    
     @staticmethod
     def _run_vraj_refinement(input_data: dict) -> dict:
         """Run Vraj's refinement system programmatically"""
@@ -336,7 +626,7 @@ class PipelineRunner:
             if vraj_env.exists():
                 from dotenv import load_dotenv
                 load_dotenv(vraj_env)
-                api_key = os.getenv("GEMINI_API_KEY")
+                api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEYS", "").split(",")[0].strip()
             else:
                 api_key = None
             
@@ -364,6 +654,8 @@ class PipelineRunner:
             
             return refined
             
+        except RequestCancelled:
+            raise
         except Exception as e:
             logger.warning(f"Vraj refinement failed: {e}. Using intelligent fallback.")
             # Intelligent Fallback: Extract keywords from input text
@@ -373,9 +665,7 @@ class PipelineRunner:
             all_text = f"{input_data['subjectArea']} {input_data['title']} {input_data['abstract']}"
             
             # Remove common words and extract meaningful keywords
-            stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-                         'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'be',
-                         'this', 'that', 'these', 'those', 'we', 'our', 'using', 'paper'}
+            stop_words = STOP_WORDS
             
             # Extract words (lowercase, remove punctuation)
             words = re.findall(r'\b[a-zA-Z]{3,}\b', all_text.lower())
@@ -405,33 +695,299 @@ class PipelineRunner:
             }
     
     @staticmethod
-    def _run_aadi_search():
-        """Run Aadi's journal search system"""
+    def _run_aadi_search(format_file: Path, results_file: Path):
+        """
+        Run Aadi's journal search system
+        
+        Args:
+            format_file: Search criteria for this request
+            results_file: Where the search writes this request's results
+        """
         try:
             logger.info("Running Aadi's journal search...")
             
-            # Run Aadi's fetch_journals.py
-            result = subprocess.run(
-                [sys.executable, str(AADI_DIR / "fetch_journals.py")],
+            # Run Aadi's fetch_journals.py (killed if the request is cancelled)
+            process = subprocess.Popen(
+                [sys.executable, str(FETCHER_SCRIPT), "--input", str(format_file), "--output", str(results_file)],
                 cwd=str(AADI_DIR),
-                capture_output=True,
-                text=True,
-                timeout=60  # 60 second timeout
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
             )
+            deadline = time.time() + 60  # 60 second timeout
+            while True:
+                try:
+                    _, stderr = process.communicate(timeout=0.5)
+                    break
+                except subprocess.TimeoutExpired:
+                    if is_cancelled() or time.time() > deadline:
+                        process.kill()
+                        process.communicate()
+                        if is_cancelled():
+                            raise RequestCancelled("Journal search cancelled")
+                        raise
             
-            if result.returncode != 0:
-                logger.error(f"Aadi search failed: {result.stderr}")
-                raise Exception(f"Journal search failed: {result.stderr}")
+            if process.returncode != 0:
+                logger.error(f"Aadi search failed: {stderr}")
+                raise Exception(f"Journal search failed: {stderr}")
             
             logger.info("Aadi search completed successfully")
             
+        except RequestCancelled:
+            raise
         except subprocess.TimeoutExpired:
             raise Exception("Journal search timed out after 60 seconds")
         except Exception as e:
             raise Exception(f"Journal search execution failed: {str(e)}")
 
 
+class PendingResults:
+    """Final results of requests answered provisionally, kept for PENDING_RESULT_TTL"""
+    
+    _results = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def track(future: Future, request: "RecommendationRequest", start_time: float) -> str:
+        """
+        Store the pipeline's result under a new request ID when it finishes.
+        
+        Returns:
+            Request ID for GET /api/recommend/{requestId}
+        """
+        request_id = uuid.uuid4().hex
+        with PendingResults._lock:
+            now = time.time()
+            for key in [k for k, v in PendingResults._results.items() if v["expires"] < now]:
+                del PendingResults._results[key]
+            PendingResults._results[request_id] = {"status": "pending", "expires": now + PENDING_RESULT_TTL}
+        
+        def finished(done: Future):
+            try:
+                entry = {"status": "done", "result": build_response(request, done.result(), start_time)}
+            except Exception as e:
+                entry = {"status": "failed", "error": str(getattr(e, "detail", e))}
+            entry["expires"] = time.time() + PENDING_RESULT_TTL
+            with PendingResults._lock:
+                PendingResults._results[request_id] = entry
+            logger.info(f"Final result for provisional request {request_id}: {entry['status']}")
+        
+        future.add_done_callback(finished)
+        return request_id
+    
+    @staticmethod
+    def get(request_id: str) -> Optional[dict]:
+        with PendingResults._lock:
+            entry = PendingResults._results.get(request_id)
+        if entry is None or entry["expires"] < time.time():
+            return None
+        return entry
+
+
+class AdmissionController:
+    """
+    Bounded admission for pipeline runs.
+    
+    At most `slots` pipelines run at once. Further requests wait in one of
+    two lanes, interactive (frontend) and batch (X-API-Key); a lane is full
+    at its queue depth and a client at per_client queued requests, and
+    anything beyond is rejected at once with 429 and a Retry-After estimate.
+    Within a lane, clients are served round-robin, so one busy client cannot
+    starve the others; the interactive lane goes first, but every
+    BATCH_SHARE-th free slot goes to a waiting batch request.
+    
+    Runs on the event loop only (release from threads goes through
+    call_soon_threadsafe), so no locking is needed.
+    """
+    
+    BATCH_SHARE = 4
+    
+    def __init__(self, slots: int, queue_depths: dict, per_client: int, queue_timeout: float):
+        """
+        Args:
+            slots: Pipelines allowed to run at once
+            queue_depths: Lane -> maximum queued requests
+            per_client: Maximum queued requests of one client per lane
+            queue_timeout: Longest wait in the queue (seconds)
+        """
+        self.slots = slots
+        self.queue_depths = queue_depths
+        self.per_client = per_client
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queues = {lane: OrderedDict() for lane in queue_depths}  # lane -> client -> waiters
+        self.queued = {lane: 0 for lane in queue_depths}
+        self.granted = 0
+        self.rejected = 0
+        self.service_time = 10.0  # Moving average of pipeline run time (seconds)
+    
+    @staticmethod
+    def classify(request: Request) -> Tuple[str, str]:
+        """
+        Lane and client identity of a request.
+        
+        Returns:
+            ("batch", hashed API key) for X-API-Key traffic, else
+            ("interactive", client address from X-Forwarded-For or the socket)
+        """
+        api_key = request.headers.get("x-api-key")
+        if api_key:
+            return "batch", "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        forwarded = request.headers.get("x-forwarded-for", "").split(",")[0].strip()
+        return "interactive", forwarded or (request.client.host if request.client else "unknown")
+    
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained."""
+        backlog = self.active + sum(self.queued.values())
+        return max(1, math.ceil(backlog * self.service_time / self.slots))
+    
+    def _reject(self, status_code: int, detail: str):
+        self.rejected += 1
+        raise HTTPException(status_code=status_code, detail=detail,
+                            headers={"Retry-After": str(self.retry_after())})
+    
+    async def acquire(self, lane: str, client: str):
+        """
+        Wait for a pipeline slot.
+        
+        Raises:
+            HTTPException: 429 when the lane or the client's queue is full,
+                503 when no slot freed up within queue_timeout
+        """
+        if self.active < self.slots and not any(self.queued.values()):
+            self.active += 1
+            return
+        
+        waiters = self.queues[lane].get(client)
+        if self.queued[lane] >= self.queue_depths[lane] or (waiters and len(waiters) >= self.per_client):
+            self._reject(429, "Server busy, please retry later")
+        
+        future = asyncio.get_running_loop().create_future()
+        self.queues[lane].setdefault(client, deque()).append(future)
+        self.queued[lane] += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self.release()  # Granted just as the wait ended
+            else:
+                self._remove(lane, client, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(503, "Timed out waiting for a free slot, please retry later")
+    
+    def _remove(self, lane: str, client: str, future: asyncio.Future):
+        waiters = self.queues[lane].get(client)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self.queued[lane] -= 1
+            if not waiters:
+                del self.queues[lane][client]
+    
+    def _next_lane(self) -> Optional[str]:
+        interactive, batch = self.queued["interactive"], self.queued["batch"]
+        if batch and (not interactive or self.granted % self.BATCH_SHARE == self.BATCH_SHARE - 1):
+            return "batch"
+        return "interactive" if interactive else None
+    
+    def release(self, seconds: Optional[float] = None):
+        """Free a slot and hand it to the next waiting request."""
+        if seconds is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * seconds
+        self.active -= 1
+        while self.active < self.slots:
+            lane = self._next_lane()
+            if lane is None:
+                return
+            # Round-robin: serve the first client, then move it to the back
+            client, waiters = next(iter(self.queues[lane].items()))
+            future = waiters.popleft()
+            self.queued[lane] -= 1
+            del self.queues[lane][client]
+            if waiters:
+                self.queues[lane][client] = waiters
+            if future.done():
+                continue
+            self.active += 1
+            self.granted += 1
+            future.set_result(None)
+    
+    def submit(self, pool: ThreadPoolExecutor, fn, *args) -> Future:
+        """Run fn in pool on an acquired slot; the slot is released when fn finishes."""
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        try:
+            future = pool.submit(fn, *args)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.release, time.time() - started))
+        return future
+    
+    def busy(self) -> bool:
+        """Whether live traffic uses half the pipeline slots or more, or is queueing"""
+        return self.active * 2 >= self.slots or any(self.queued.values())
+    
+    def status(self) -> dict:
+        return {
+            "active": self.active,
+            "slots": self.slots,
+            "queued": dict(self.queued),
+            "rejected": self.rejected,
+            "retry_after": self.retry_after(),
+        }
+
+
+admission_control = AdmissionController(
+    MAX_CONCURRENT_PIPELINES,
+    {"interactive": ADMISSION_QUEUE_INTERACTIVE, "batch": ADMISSION_QUEUE_BATCH},
+    ADMISSION_QUEUE_PER_CLIENT,
+    ADMISSION_QUEUE_TIMEOUT,
+)
+
+
+async def watch_disconnect(http_request: Request, cancel_event: threading.Event, handler: asyncio.Task):
+    """Cancel a request's pipeline and handler as soon as its client disconnects"""
+    while not cancel_event.is_set():
+        if await http_request.is_disconnected():
+            logger.info("Client disconnected, cancelling its pipeline")
+            cancel_event.set()
+            handler.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+def build_response(request: RecommendationRequest, journal_results: List[dict], start_time: float,
+                   provisional: bool = False, request_id: Optional[str] = None) -> RecommendationResponse:
+    """Convert backend journals into the top 3 frontend recommendations"""
+    all_recommendations = FormatConverter.backend_to_frontend(
+        journal_results,
+        acceptance_range=(request.accPercentFrom, request.accPercentTo)
+    )
+    
+    # Return only top 3 recommendations
+    recommendations = all_recommendations[:3]
+    
+    return RecommendationResponse(
+        success=True,
+        inputData=request.model_dump(),
+        recommendations=recommendations,
+        processingTime=round(time.time() - start_time, 2),
+        provisional=provisional,
+        requestId=request_id
+    )
+
+
 # API Endpoints
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start the subject leaderboard refresh and the cache warm-up when configured"""
+    if LEADERBOARD_REFRESH_HOURS > 0:
+        PipelineRunner.start_leaderboard_refresh(LEADERBOARD_REFRESH_HOURS)
+    if WARMUP_TOP_N > 0:
+        PipelineRunner.start_cache_warmup(WARMUP_TOP_N)
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -440,7 +996,9 @@ async def root():
         "service": "Research Journal Recommendation API",
         "version": "1.0.0",
         "endpoints": {
-            "POST /api/recommend": "Get journal recommendations"
+            "POST /api/recommend": "Get journal recommendations",
+            "GET /api/recommend/{requestId}": "Final result of a provisional recommendation",
+            "GET /api/subjects/suggest?q=": "Autocomplete subject areas"
         }
     }
 
@@ -452,12 +1010,59 @@ async def health_check():
         "status": "healthy",
         "vraj_available": VRAJ_DIR.exists(),
         "aadi_available": AADI_DIR.exists(),
+        "data_version": PipelineRunner.data_version(),
+        "upstreams": PipelineRunner.upstream_status(),
+        "gemini_keys": PipelineRunner.gemini_key_status(),
+        "admission": admission_control.status(),
+        "warmup": PipelineRunner.warmup_status(),
         "timestamp": time.time()
     }
 
 
+@app.get("/api/recommend/{request_id}")
+async def get_final_recommendations(request_id: str):
+    """
+    Final result of a request that was answered provisionally.
+    
+    Returns:
+    - status: "pending", "done" (with result) or "failed" (with error)
+    """
+    entry = PendingResults.get(request_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired request ID")
+    
+    body = {"requestId": request_id, "status": entry["status"]}
+    if "result" in entry:
+        body["result"] = entry["result"]
+    if "error" in entry:
+        body["error"] = entry["error"]
+    return body
+
+
+@app.get("/api/subjects/suggest")
+async def suggest_subjects(
+    q: str = Query(..., min_length=1, description="Typed subject text"),
+    limit: int = Query(10, ge=1, le=25, description="Maximum suggestions")
+):
+    """
+    Autocomplete subject areas with OpenAlex domains, fields, subfields and topics.
+    
+    Returns:
+    - Suggestions (id, name, level), broadest and largest subjects first;
+      fuzzy matches when nothing starts with the typed text
+    """
+    index = PipelineRunner.subject_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Subject index not available")
+    
+    return {
+        "query": q,
+        "suggestions": index.suggest(q, limit)
+    }
+
+
 @app.post("/api/recommend", response_model=RecommendationResponse)
-async def get_recommendations(request: RecommendationRequest):
+async def get_recommendations(request: RecommendationRequest, http_request: Request):
     """
     Get journal recommendations based on paper details.
     
@@ -471,8 +1076,21 @@ async def get_recommendations(request: RecommendationRequest):
     
     Returns:
     - List of top 5 journal recommendations with scores and explanations
+    
+    When the pipeline misses RECOMMEND_DEADLINE or fails, the subject's
+    leaderboard is returned instead with provisional=true; if the pipeline
+    is still running, requestId names its final result.
+    
+    Under overload requests queue for a pipeline slot (see
+    AdmissionController) or are rejected with 429/503 and Retry-After.
+    
+    If the client disconnects, the request leaves the queue or its pipeline
+    is cancelled: remaining Gemini/OpenAlex calls are skipped, in-flight
+    waits end and the fetcher subprocess is killed.
     """
     start_time = time.time()
+    cancel_event = threading.Event()
+    watcher = asyncio.create_task(watch_disconnect(http_request, cancel_event, asyncio.current_task()))
     
     try:
         logger.info(f"Received recommendation request for: {request.subjectArea}")
@@ -480,35 +1098,75 @@ async def get_recommendations(request: RecommendationRequest):
         # Convert frontend format to backend format
         backend_input = FormatConverter.frontend_to_backend(request)
         
+        leaderboards = PipelineRunner.leaderboards()
+        if leaderboards is not None:
+            leaderboards.record_request(request.subjectArea)
+        
+        def provisional(request_id: Optional[str] = None) -> Optional[RecommendationResponse]:
+            board = leaderboards.get(request.subjectArea, request.openAccess) if leaderboards else None
+            if board is None:
+                return None
+            logger.info(f"Returning provisional leaderboard results for: {request.subjectArea}")
+            return build_response(request, board["journals"], start_time, provisional=True, request_id=request_id)
+        
+        # Wait for a pipeline slot (429/503 under overload)
+        await admission_control.acquire(*AdmissionController.classify(http_request))
+        
         # Run the integrated pipeline
-        journal_results = PipelineRunner.run_pipeline(backend_input)
+        try:
+            future = admission_control.submit(
+                PipelineRunner._pipeline_pool, PipelineRunner.run_cancellable, backend_input, cancel_event
+            )
+            if RECOMMEND_DEADLINE > 0:
+                try:
+                    journal_results = await asyncio.wait_for(
+                        asyncio.shield(asyncio.wrap_future(future)), RECOMMEND_DEADLINE
+                    )
+                except asyncio.TimeoutError:
+                    response = provisional(PendingResults.track(future, request, start_time))
+                    if response is not None:
+                        return response
+                    journal_results = await asyncio.wrap_future(future)
+            else:
+                journal_results = await asyncio.wrap_future(future)
+        except Exception:
+            # Upstream failure: fall back to the leaderboard if there is one
+            response = provisional()
+            if response is not None:
+                return response
+            raise
         
         # Convert backend results to frontend format (TOP 3 ONLY)
-        all_recommendations = FormatConverter.backend_to_frontend(
-            journal_results,
-            acceptance_range=(request.accPercentFrom, request.accPercentTo)
-        )
-        
-        # Return only top 3 recommendations
-        recommendations = all_recommendations[:3]
+        response = build_response(request, journal_results, start_time)
         
-        processing_time = time.time() - start_time
+        logger.info(f"Request processed in {response.processingTime:.2f}s, "
+                    f"returning top {len(response.recommendations)} recommendations")
         
-        logger.info(f"Request processed in {processing_time:.2f}s, returning top {len(recommendations)} recommendations")
+        return response
         
-        return RecommendationResponse(
-            success=True,
-            inputData=request.model_dump(),
-            recommendations=recommendations,
-            processingTime=round(processing_time, 2)
+    except asyncio.CancelledError:
+        if not cancel_event.is_set():
+            raise
+        logger.info(f"Request for '{request.subjectArea}' abandoned by the client after "
+                    f"{time.time() - start_time:.2f}s")
+        return JSONResponse(status_code=499, content={"detail": "Client closed request"})
+    except HTTPException as e:
+        if e.status_code in (429, 503):
+            logger.warning(f"Request rejected ({e.status_code}): {e.detail}")
+            raise
+        logger.error(f"Error processing request: {e.detail}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate recommendations: {e.detail}"
         )
-        
     except Exception as e:
         logger.error(f"Error processing request: {e}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate recommendations: {str(e)}"
         )
+    finally:
+        watcher.cancel()
 
 
 if __name__ == "__main__":
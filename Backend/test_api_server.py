@@ -0,0 +1,286 @@
+"""
+Tests for api_server.py pipeline helpers
+Runs without calling OpenAlex or Gemini
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import HTTPException
+
+import api_server
+from api_server import AdmissionController, PipelineRunner
+from cancellation import RequestCancelled, raise_if_cancelled
+
+sys.path.insert(0, str(api_server.VRAJ_DIR))  # Vraj's main, imported the way the pipeline does
+from main import PaperSearchBackend
+
+# Stands in for fetch_journals.py: echoes its criteria's subject after a pause
+STUB_FETCHER = """
+import argparse, json, time
+parser = argparse.ArgumentParser()
+parser.add_argument("--input")
+parser.add_argument("--output")
+args = parser.parse_args()
+with open(args.input) as f:
+    criteria = json.load(f)
+time.sleep(0.3)
+with open(args.output, "w") as f:
+    json.dump([{"display_name": criteria["subjectArea"]}], f)
+"""
+
+# Stands in for a slow fetch_journals.py: reports its PID in PID_FILE, then never finishes
+SLOW_FETCHER = """
+import os, time
+with open(PID_FILE + ".tmp", "w") as f:
+    f.write(str(os.getpid()))
+os.replace(PID_FILE + ".tmp", PID_FILE)
+time.sleep(60)
+"""
+
+PAPER = {
+    "subjectArea": "Marine biology",
+    "title": "Coral reef bleaching under marine heatwaves",
+    "abstract": "We track bleaching of coral reefs across three heatwaves and model recovery.",
+    "accPercentFrom": 0,
+    "accPercentTo": 100,
+    "openAccess": "any",
+}
+
+
+def test_speculative_keywords_compare_whole_words():
+    """Title words are dropped only when they are whole words of the subject"""
+    criteria = PipelineRunner._build_speculative_criteria({
+        "subjectArea": "Network security",
+        "title": "Detecting botnet traffic in net neutrality disputes",
+        "abstract": "",
+        "openAccess": "yes",
+    })
+    
+    assert "net" in criteria["keywords"], f"'net' dropped as part of 'network': {criteria['keywords']}"
+    assert "botnet" in criteria["keywords"]
+    assert "security" not in criteria["keywords"]
+    assert criteria["openAccess"] == 1
+    print("✓ Speculative keywords compare against subject words")
+
+
+def test_concurrent_pipelines_keep_their_own_files():
+    """Pipelines running at once each get the results of their own criteria"""
+    real_script, real_refinement = api_server.FETCHER_SCRIPT, PipelineRunner.__dict__["_run_vraj_refinement"]
+    with tempfile.TemporaryDirectory() as tmp:
+        api_server.FETCHER_SCRIPT = Path(tmp) / "stub_fetcher.py"
+        api_server.FETCHER_SCRIPT.write_text(STUB_FETCHER, encoding="utf-8")
+        PipelineRunner._run_vraj_refinement = staticmethod(
+            lambda input_data: {"subjectArea": input_data["subjectArea"], "keywords": []})
+        try:
+            subjects = [f"Subject {i}" for i in range(6)]
+            futures = [PipelineRunner._pipeline_pool.submit(PipelineRunner.run_pipeline, {"subjectArea": subject})
+                       for subject in subjects]
+            results = [future.result(timeout=30) for future in futures]
+        finally:
+            api_server.FETCHER_SCRIPT, PipelineRunner._run_vraj_refinement = real_script, real_refinement
+    
+    assert [result[0]["display_name"] for result in results] == subjects, results
+    print("✓ Concurrent pipelines read their own results")
+
+
+def admission(slots: int = 1, interactive: int = 10, batch: int = 10, per_client: int = 10,
+              queue_timeout: float = 5.0) -> AdmissionController:
+    return AdmissionController(slots, {"interactive": interactive, "batch": batch}, per_client, queue_timeout)
+
+
+async def queue_requests(controller: AdmissionController, requests: list, granted: list) -> list:
+    """Queue (lane, client) requests in order; each appends its client to granted once admitted"""
+    async def wait_for_slot(lane, client):
+        await controller.acquire(lane, client)
+        granted.append(client)
+    
+    tasks = [asyncio.ensure_future(wait_for_slot(lane, client)) for lane, client in requests]
+    await asyncio.sleep(0)
+    return tasks
+
+
+async def drain(controller: AdmissionController, tasks: list):
+    """Finish the running pipeline again and again until every queued request was admitted"""
+    for _ in tasks:
+        controller.release(1.0)
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+def test_admission_lanes_share_slots():
+    """Interactive requests go first, but every BATCH_SHARE-th free slot goes to batch"""
+    async def scenario():
+        controller = admission()
+        await controller.acquire("interactive", "running")
+        granted = []
+        requests = [("batch", f"b{i}") for i in range(2)] + [("interactive", f"i{i}") for i in range(6)]
+        tasks = await queue_requests(controller, requests, granted)
+        await drain(controller, tasks)
+        return controller, granted
+    
+    controller, granted = asyncio.run(scenario())
+    assert AdmissionController.BATCH_SHARE == 4
+    assert granted == ["i0", "i1", "i2", "b0", "i3", "i4", "i5", "b1"], granted
+    assert controller.active == 1 and not any(controller.queued.values())
+    print("✓ Admission lanes share slots")
+
+
+def test_admission_round_robin_per_client():
+    """A client with many queued requests does not starve the others"""
+    async def scenario():
+        controller = admission()
+        await controller.acquire("interactive", "running")
+        granted = []
+        requests = [("interactive", client) for client in ["a", "a", "a", "b", "c"]]
+        tasks = await queue_requests(controller, requests, granted)
+        await drain(controller, tasks)
+        return granted
+    
+    granted = asyncio.run(scenario())
+    assert granted == ["a", "b", "c", "a", "a"], granted
+    print("✓ Clients are served round-robin")
+
+
+def test_admission_rejects_when_queue_full():
+    """A full lane or client queue is rejected at once with 429 and Retry-After"""
+    async def fill_then_reject():
+        controller = admission(interactive=2, per_client=1)
+        await controller.acquire("interactive", "running")
+        waiting = await queue_requests(controller, [("interactive", "x"), ("interactive", "y")], [])
+        codes = []
+        for client in ["x", "z"]:  # x is at its per-client limit; the lane is full for z
+            try:
+                await controller.acquire("interactive", client)
+            except HTTPException as e:
+                codes.append((client, e.status_code, e.headers["Retry-After"]))
+        retry_after = controller.retry_after()
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        return controller, codes, retry_after
+    
+    controller, codes, retry_after = asyncio.run(fill_then_reject())
+    assert codes == [("x", 429, str(retry_after)), ("z", 429, str(retry_after))], codes
+    assert retry_after == 30  # (1 running + 2 queued) x 10s average run time / 1 slot
+    assert controller.rejected == 2
+    assert not any(controller.queued.values()), "cancelled waiters left in the queue"
+    print("✓ Full queues are rejected with 429")
+
+
+def test_admission_times_out_with_503():
+    """A request that waited queue_timeout without a slot gets 503 and leaves the queue"""
+    async def scenario():
+        controller = admission(queue_timeout=0.05)
+        await controller.acquire("batch", "running")
+        try:
+            await controller.acquire("batch", "key:abc")
+        except HTTPException as e:
+            return controller, e
+        raise AssertionError("admitted with no free slot")
+    
+    controller, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+    assert controller.queued == {"interactive": 0, "batch": 0} and not controller.queues["batch"]
+    assert controller.active == 1 and controller.rejected == 1
+    print("✓ Queue timeouts are rejected with 503")
+
+
+def run_cancellable_pipeline(fetcher_script: str, complete, cancel_event: threading.Event) -> list:
+    """
+    Run a pipeline whose Gemini answers come from complete(job) and whose search runs fetcher_script.
+    
+    Returns:
+        Tasks of the Gemini jobs that were sent
+    """
+    jobs = []
+    backend = PaperSearchBackend("test-key")
+    backend._complete = lambda prefix, prompt, job, light=False: jobs.append(job["task"]) or complete(job)
+    real_script, real_refinement = api_server.FETCHER_SCRIPT, PipelineRunner._run_vraj_refinement
+    with tempfile.TemporaryDirectory() as tmp:
+        api_server.FETCHER_SCRIPT = Path(tmp) / "fetcher.py"
+        api_server.FETCHER_SCRIPT.write_text(fetcher_script, encoding="utf-8")
+        PipelineRunner._run_vraj_refinement = staticmethod(backend.process_input)
+        try:
+            PipelineRunner.run_cancellable(dict(PAPER), cancel_event)
+            raise AssertionError("pipeline finished despite the cancellation")
+        except RequestCancelled:
+            pass
+        finally:
+            api_server.FETCHER_SCRIPT, PipelineRunner._run_vraj_refinement = real_script, real_refinement
+    return jobs
+
+
+def test_cancel_during_keywords_skips_search():
+    """A cancellation inside the keyword call is not swallowed by its fallback; no search starts"""
+    cancel_event = threading.Event()
+    
+    def complete(job):
+        if job["task"] == "keywords":
+            cancel_event.set()  # Client disconnects while Gemini is answering
+            raise_if_cancelled()
+        return job["text"]
+    
+    started = []
+    real_search = PipelineRunner._run_aadi_search
+    PipelineRunner._run_aadi_search = staticmethod(lambda *args: started.append(args))
+    try:
+        jobs = run_cancellable_pipeline(STUB_FETCHER, complete, cancel_event)
+    finally:
+        PipelineRunner._run_aadi_search = real_search
+    
+    assert jobs[-1] == "keywords" and jobs.count("keywords") == 1, jobs
+    assert not started, "journal search started after the request was cancelled"
+    print("✓ Cancelled keyword extraction skips the search")
+
+
+def test_cancel_kills_fetcher_subprocess():
+    """A cancellation while the search runs kills the fetcher subprocess"""
+    cancel_event = threading.Event()
+    with tempfile.TemporaryDirectory() as tmp:
+        pid_file = Path(tmp) / "fetcher.pid"
+        
+        def cancel_once_searching():
+            deadline = time.time() + 30
+            while not pid_file.exists() and time.time() < deadline:
+                time.sleep(0.05)
+            cancel_event.set()
+        
+        threading.Thread(target=cancel_once_searching, daemon=True).start()
+        started = time.time()
+        run_cancellable_pipeline(SLOW_FETCHER.replace("PID_FILE", repr(str(pid_file))),
+                                 lambda job: job["text"], cancel_event)
+        assert time.time() - started < 10, "pipeline waited for the fetcher"
+        
+        pid = int(pid_file.read_text())
+        try:
+            os.kill(pid, 0)
+            raise AssertionError("fetcher subprocess still running")
+        except ProcessLookupError:
+            pass
+    print("✓ Cancellation kills the fetcher subprocess")
+
+def run_all_tests():
+    """Run all API server tests"""
+    test_speculative_keywords_compare_whole_words()
+    test_concurrent_pipelines_keep_their_own_files()
+    test_admission_lanes_share_slots()
+    test_admission_round_robin_per_client()
+    test_admission_rejects_when_queue_full()
+    test_admission_times_out_with_503()
+    test_cancel_during_keywords_skips_search()
+    test_cancel_kills_fetcher_subprocess()
+    print("\n[PASS] API server tests passed ✓")
+
+
+if __name__ == "__main__":
+    run_all_tests()
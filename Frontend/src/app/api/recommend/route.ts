@@ -26,15 +26,27 @@ export async function POST(request: NextRequest) {
 
     console.log("Sending to backend:", JSON.stringify(backendRequest, null, 2))
 
-    // Call Python FastAPI backend
+    // Call Python FastAPI backend (forwarding the client address for per-client fair queuing)
+    const clientAddress = request.headers.get("x-forwarded-for") || request.headers.get("x-real-ip") || ""
     const backendResponse = await fetch(`${BACKEND_API_URL}/api/recommend`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        ...(clientAddress ? { "X-Forwarded-For": clientAddress } : {}),
       },
       body: JSON.stringify(backendRequest),
     })
 
+    // Backend overloaded: pass the rejection and its Retry-After through
+    if (backendResponse.status === 429 || backendResponse.status === 503) {
+      const errorData = await backendResponse.json().catch(() => ({ detail: "Server busy" }))
+      const retryAfter = backendResponse.headers.get("Retry-After")
+      return NextResponse.json(
+        { error: "Server busy", details: errorData.detail, retryAfter: retryAfter ? Number(retryAfter) : undefined },
+        { status: backendResponse.status, headers: retryAfter ? { "Retry-After": retryAfter } : undefined }
+      )
+    }
+
     if (!backendResponse.ok) {
       const errorData = await backendResponse.json().catch(() => ({ detail: "Unknown error" }))
       console.error("Backend error:", errorData)